@@ -0,0 +1,202 @@
+import os
+import sys
+import time
+import runpy
+import argparse
+import subprocess
+
+# --------------------------------------------------------
+# Gemeinsamer Einstiegspunkt mit Unterbefehlen
+#    - Beim Start werden nur Module der Standardbibliothek geladen;
+#      transformers, langchain, pandas usw. importiert erst der Unterbefehl,
+#      der sie braucht
+#    - Unterbefehle:
+#        token    – Token prüfen (wie check_token.py), Exit-Code 1 bei Fehler
+#        sweep    – Latenz-/Token-Messung (main.py)
+#        toxicity – Toxizitätstest für ein Modell (test_toxicity*.py)
+#        matrix   – Mehrmodell-Matrix (matrix.py)
+#        queue    – verteilte Matrix: Koordinator / Worker über SQLite-Warteschlange (work_queue.py)
+#        loadgen  – Open-Loop-Lastgenerator (loadgen.py)
+#        monitor  – Dauerbetrieb mit Perzentilen als Prometheus-Metriken (monitor.py)
+#        mock     – lokaler Mock-Endpunkt (mock_server.py)
+#        compare  – Lauf gegen Baseline vergleichen (compare.py), Exit-Code 1 bei Regression
+#        toxmatrix – Toxizität aller Labels vektorisiert auswerten (toxicity_matrix.py)
+#        startup  – Importzeiten messen und Startbudget prüfen (für CI / Cron)
+#    - Optionen nach dem Unterbefehl gehen unverändert an das jeweilige Skript,
+#      z. B. "python cli.py sweep --concurrency 8"
+# --------------------------------------------------------
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SCRIPTS = {
+    "sweep": "main.py",
+    "matrix": "matrix.py",
+    "queue": "work_queue.py",
+    "loadgen": "loadgen.py",
+    "monitor": "monitor.py",
+    "mock": "mock_server.py",
+    "compare": "compare.py",
+    "toxmatrix": "toxicity_matrix.py"
+}
+
+TOXICITY_SCRIPTS = {
+    "zephyr": "test_toxicity.py",
+    "phi4": "test_toxicity2.py",
+    "deepseek": "test_toxicity3.py"
+}
+
+# Schwere Abhängigkeiten, die beim Start nicht geladen werden dürfen
+HEAVY_MODULES = ("torch", "transformers", "langchain", "langchain_huggingface", "pandas", "huggingface_hub")
+
+# Projektmodule, deren Import ohne schwere Abhängigkeiten auskommen muss
+LIGHT_MODULES = (
+    "cli", "ratelimit", "response_cache", "token_counter", "tracing",
+    "latency_stats", "trials", "clients", "mock_server", "matrix", "toxicity_cache", "token_accounting",
+    "result_store", "compare", "prompt_dataset",
+    "work_queue", "monitor", "param_search"
+)
+
+
+def run_script(script: str, argv: list[str]):
+    """Führt ein Skript wie "python <script> <argv>" aus, ohne einen neuen Prozess zu starten."""
+    path = os.path.join(HERE, script)
+    sys.argv = [path, *argv]
+    sys.path.insert(0, HERE)
+    runpy.run_path(path, run_name="__main__")
+
+
+def cmd_token(_argv: list[str]) -> int:
+    from dotenv import load_dotenv
+    from check_token import check_token
+
+    load_dotenv()
+    hf_token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
+    if not hf_token:
+        print("♨️ Kein Token gefunden (HUGGINGFACEHUB_API_TOKEN in .env)")
+        return 1
+    return 0 if check_token(hf_token) else 1
+
+
+def cmd_toxicity(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="cli.py toxicity", add_help=False)
+    parser.add_argument("model", choices=TOXICITY_SCRIPTS)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(f"Aufruf: python cli.py toxicity {{{','.join(TOXICITY_SCRIPTS)}}} [Optionen des Skripts]")
+        return 0
+    known, rest = parser.parse_known_args(argv)
+    run_script(TOXICITY_SCRIPTS[known.model], rest)
+    return 0
+
+
+def import_time(module: str) -> float | None:
+    """
+    Kumulierte Importzeit eines Moduls in Sekunden (python -X importtime,
+    eigener Prozess); None, falls das Modul nicht importierbar ist.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=HERE
+    )
+    if proc.returncode != 0:
+        return None
+    # Zeilen: "import time: <self us> | <cumulative us> | <Paket>"
+    for line in reversed(proc.stderr.splitlines()):
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1e6
+    return None
+
+
+def loaded_heavy_modules(module: str) -> list[str]:
+    """Schwere Abhängigkeiten, die der Import von module nach sich zieht (eigener Prozess)."""
+    code = (
+        f"import sys, {module}; "
+        f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=HERE)
+    if proc.returncode != 0:
+        return [f"<Import fehlgeschlagen: {proc.stderr.strip().splitlines()[-1]}>"]
+    return proc.stdout.split()
+
+
+def startup_time(repeat: int = 5) -> float:
+    """Beste Wanduhrzeit von "python cli.py --help" in Sekunden."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(HERE, "cli.py"), "--help"], capture_output=True, cwd=HERE)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def cmd_startup(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(prog="cli.py startup", description="Importzeiten und Startbudget prüfen")
+    parser.add_argument("--budget", type=float, default=0.5, help="erlaubte Startzeit von cli.py in Sekunden")
+    parser.add_argument("--repeat", type=int, default=5, help="Wiederholungen der Startzeitmessung")
+    parser.add_argument("--deps", action="store_true", help="auch Importzeiten der schweren Abhängigkeiten zeigen")
+    args = parser.parse_args(argv)
+
+    failures = []
+    print("=== Importzeiten (kumuliert) ===")
+    for module in LIGHT_MODULES + (HEAVY_MODULES if args.deps else ()):
+        seconds = import_time(module)
+        print(f"  {module:<24} " + ("nicht importierbar" if seconds is None else f"{seconds * 1e3:8.1f} ms"))
+
+    print("\n=== Leichte Module ohne schwere Abhängigkeiten ===")
+    for module in LIGHT_MODULES:
+        heavy = loaded_heavy_modules(module)
+        if heavy:
+            failures.append(f"{module} lädt {', '.join(heavy)}")
+        print(f"  {module:<24} " + ("ok" if not heavy else "lädt " + ", ".join(heavy)))
+
+    elapsed = startup_time(args.repeat)
+    print(f"\nStart von cli.py: {elapsed * 1e3:.1f} ms (Budget {args.budget * 1e3:.0f} ms)")
+    if elapsed > args.budget:
+        failures.append(f"Startzeit {elapsed * 1e3:.1f} ms über Budget {args.budget * 1e3:.0f} ms")
+
+    for failure in failures:
+        print("❌", failure)
+    if not failures:
+        print("✅ Startbudget eingehalten")
+    return 1 if failures else 0
+
+
+COMMANDS = {
+    "token": (cmd_token, "Hugging-Face-Token prüfen"),
+    "sweep": (None, "Latenz- und Token-Messung über das Parameter-Raster (main.py)"),
+    "toxicity": (cmd_toxicity, "Toxizitätstest für zephyr, phi4 oder deepseek"),
+    "matrix": (None, "Mehrmodell-Matrix mit Checkpoints (matrix.py)"),
+    "queue": (None, "verteilte Matrix mit Koordinator und Workern (work_queue.py)"),
+    "loadgen": (None, "Open-Loop-Lastgenerator (loadgen.py)"),
+    "monitor": (None, "Endpunkte dauerhaft prüfen, Metriken unter /metrics (monitor.py)"),
+    "mock": (None, "lokaler Mock-Endpunkt (mock_server.py)"),
+    "compare": (None, "Lauf gegen eine Baseline vergleichen (compare.py)"),
+    "toxmatrix": (None, "Toxizität aller Labels über ein Parquet-Dataset auswerten (toxicity_matrix.py)"),
+    "startup": (cmd_startup, "Importzeiten messen und Startbudget prüfen")
+}
+
+
+def main(argv: list[str] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(
+        prog="cli.py",
+        description="LLM-Tests: Latenz, Token und Toxizität",
+        epilog="Optionen eines Unterbefehls: python cli.py <befehl> --help"
+    )
+    subparsers = parser.add_subparsers(dest="command", metavar="<befehl>")
+    for name, (_, help_text) in COMMANDS.items():
+        subparsers.add_parser(name, help=help_text, add_help=False)
+
+    # Nur den Unterbefehl auswerten; seine Optionen gehen unverändert weiter
+    if not argv or argv[0] in ("-h", "--help") or argv[0] not in COMMANDS:
+        parser.parse_args(argv[:1] or ["--help"])
+        return 0
+    command, rest = argv[0], argv[1:]
+    handler = COMMANDS[command][0]
+    if handler is None:
+        run_script(SCRIPTS[command], rest)
+        return 0
+    return handler(rest)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+import json
+import time
+import queue
+import http.client
+from typing import Callable
+from urllib.parse import urlsplit
+
+from tracing import span
+from ratelimit import record_response_headers
+
+# --------------------------------------------------------
+# Gepoolter Endpunkt-Client mit Phasen-Timing
+#    - Hält HTTP-Verbindungen (inkl. TLS) über Aufrufe hinweg offen (Keep-Alive),
+#      statt pro Parameter-Set einen neuen HuggingFaceEndpoint zu bauen
+#    - Generierungsparameter werden pro Anfrage übergeben, nicht pro Instanz
+#    - Jede Anfrage wird in drei Phasen zerlegt:
+#        connect  – TCP- und TLS-Aufbau (0, wenn eine offene Verbindung wiederverwendet wird)
+#        ttfb     – Senden der Anfrage bis zum Eintreffen der Antwort-Header
+#        transfer – Lesen des Antwort-Bodys
+# --------------------------------------------------------
+HF_INFERENCE_BASE = "https://router.huggingface.co/hf-inference/models/"
+
+
+def model_url(model_id: str) -> str:
+    """URL des text-generation-Endpunkts eines Modells auf der HF Inference API."""
+    return HF_INFERENCE_BASE + model_id
+
+
+class EndpointHTTPError(RuntimeError):
+    """HTTP-Fehler eines Endpunkts; status und headers werden z. B. vom RateLimitedScheduler ausgewertet."""
+
+    def __init__(self, status: int, headers: dict, body: bytes, url: str):
+        super().__init__(f"HTTP {status} von {url}: {body[:200]!r}")
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class PooledEndpointClient:
+    """
+    Client für einen TGI-kompatiblen Endpunkt mit Verbindungspool.
+
+    Parameter:
+      - url: Endpunkt-URL, z. B. model_url(MODEL_ID) oder http://127.0.0.1:8080
+      - token: Hugging Face API-Token (optional, z. B. nicht für mock_server.py)
+      - pool_size: maximale Anzahl offen gehaltener Verbindungen
+      - timeout: Socket-Timeout in Sekunden
+    """
+
+    def __init__(self, url: str, token: str = None, pool_size: int = 4, timeout: float = 60.0):
+        parts = urlsplit(url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.base_path = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+        # LIFO: die zuletzt benutzte (sicher noch offene) Verbindung zuerst wiederverwenden
+        self._pool: queue.LifoQueue = queue.LifoQueue(maxsize=pool_size)
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _acquire(self) -> http.client.HTTPConnection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._new_connection()
+
+    def _release(self, conn: http.client.HTTPConnection):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _post_once(self, conn: http.client.HTTPConnection, path: str, body: bytes) -> tuple[int, bytes, dict, dict]:
+        reused = conn.sock is not None
+        start = time.perf_counter()
+        if not reused:
+            conn.connect()
+        connected = time.perf_counter()
+        conn.request("POST", path, body=body, headers=self.headers)
+        response = conn.getresponse()
+        first_byte = time.perf_counter()
+        data = response.read()
+        done = time.perf_counter()
+        if response.will_close:
+            conn.close()
+        return response.status, data, dict(response.getheaders()), {
+            "connect": connected - start,
+            "ttfb": first_byte - connected,
+            "transfer": done - first_byte,
+            "total": done - start,
+            "reused": reused
+        }
+
+    def post(self, path: str, payload: dict) -> tuple[dict | list, dict]:
+        """
+        Sendet eine JSON-Anfrage über eine gepoolte Verbindung.
+
+        Rückgabe: (dekodierte JSON-Antwort, Phasen-Timings)
+        """
+        body = json.dumps(payload).encode("utf-8")
+        full_path = (self.base_path + path) or "/"
+        conn = self._acquire()
+        try:
+            try:
+                with span("network", path=full_path):
+                    status, data, headers, timings = self._post_once(conn, full_path, body)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Der Server hat eine wiederverwendete Keep-Alive-Verbindung geschlossen:
+                # einmal mit frischer Verbindung wiederholen
+                conn.close()
+                status, data, headers, timings = self._post_once(conn, full_path, body)
+        except Exception:
+            conn.close()
+            raise
+        self._release(conn)
+        if status >= 400:
+            raise EndpointHTTPError(status, headers, data, f"{self.host}{full_path}")
+        # Restkontingent (RateLimit-Header) für den RateLimitedScheduler
+        record_response_headers(headers)
+        with span("response_parse"):
+            output = json.loads(data)
+        return output, timings
+
+    def text_generation(self, prompt: str, **params) -> tuple[str, dict]:
+        """text-generation-Aufruf; params z. B. temperature, max_new_tokens, stop."""
+        output, timings = self.post("", {"inputs": prompt, "parameters": params})
+        if isinstance(output, list):
+            output = output[0]
+        return output["generated_text"], timings
+
+    def chat_completion(self, messages: list[dict], **params) -> tuple[dict, dict]:
+        """Chat-Completion-Aufruf (OpenAI-kompatible Route /v1/chat/completions)."""
+        return self.post("/v1/chat/completions", {"messages": messages, **params})
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def measure_llm_pooled(
+    client: PooledEndpointClient,
+    prompt: str,
+    params: dict,
+    count_tokens: Callable[[str], int],
+    stop_sequences: list[str] = None
+) -> dict:
+    """
+    Wie measure_llm() in main.py, aber über den gepoolten Client und mit
+    Aufteilung der Latenz in connect, ttfb und transfer.
+
+    Rückgabe: die Felder von measure_llm() plus
+      "connect", "ttfb", "transfer" (Sekunden) und "reused" (bool)
+    """
+    generation_kwargs = dict(params)
+    if stop_sequences:
+        generation_kwargs["stop"] = stop_sequences
+
+    generated_text, timings = client.text_generation(prompt, **generation_kwargs)
+
+    return {
+        "latency": timings["total"],
+        "input_tokens": count_tokens(prompt),
+        "output_tokens": count_tokens(generated_text),
+        "response_text": generated_text,
+        "connect": timings["connect"],
+        "ttfb": timings["ttfb"],
+        "transfer": timings["transfer"],
+        "reused": timings["reused"]
+    }
@@ -0,0 +1,211 @@
+import csv
+import sys
+import argparse
+
+from latency_stats import mann_whitney_u, percentile
+
+# --------------------------------------------------------
+# Vergleich mit einem Baseline-Lauf (Regressionserkennung)
+#    - Lädt zwei Läufe (Parquet-Dataset aus result_store.py, optional mit
+#      @run_id bzw. @latest, oder CSV aus matrix.py) und ordnet die Zeilen
+#      nach (Modell, Prompt, temperature, max_new_tokens) zu
+#    - Pro Zelle und Kennzahl (Latenz, Tokens/s) einseitiger Mann-Whitney-U-Test;
+#      eine Regression liegt vor, wenn der Test signifikant ist (p < alpha) und
+#      sich der Median um mehr als threshold verschlechtert
+#    - Zellen mit zu wenigen Werten werden pro Modell zusammengefasst getestet
+#    - Exit-Code 1 bei mindestens einer Regression, der Bericht wird als
+#      Markdown ausgegeben bzw. mit --report gespeichert
+#    - Exit-Code 2, wenn ein Lauf fehlt oder keine Zeilen enthält
+# --------------------------------------------------------
+KEY_COLUMNS = ("model", "prompt", "temperature", "max_new_tokens")
+
+# (Kennzahl, höher ist schlechter)
+METRICS = (("latency_sec", True), ("tokens_per_sec", False))
+
+
+def load_run(spec: str) -> list[dict]:
+    """
+    Lädt die Zeilen eines Laufs.
+
+    Parameter:
+      - spec: "ergebnisse.csv", "verzeichnis" (alle Läufe), "verzeichnis@<run_id>"
+        oder "verzeichnis@latest" (jüngster Lauf im Dataset)
+
+    Rückgabe: Liste von dicts mit KEY_COLUMNS, "latency_sec" und "output_tokens"
+    """
+    columns = [*KEY_COLUMNS, "latency_sec", "output_tokens"]
+    if spec.endswith(".csv"):
+        with open(spec, newline="", encoding="utf-8") as f:
+            return [{c: row.get(c) for c in columns} for row in csv.DictReader(f)]
+
+    import pyarrow.compute as pc
+    from result_store import list_runs, scan
+
+    path, _, run_id = spec.partition("@")
+    if run_id == "latest":
+        runs = list_runs(path)
+        if not runs:
+            raise ValueError(f"Keine Läufe in {path}")
+        run_id = runs[-1][0]
+    run_filter = pc.field("run_id") == run_id if run_id else None
+    rows = []
+    for batch in scan(path, columns=columns, filter=run_filter):
+        rows.extend(batch.to_pylist())
+    return rows
+
+
+def _number(value) -> float | None:
+    if value is None or value == "":
+        return None
+    return float(value)
+
+
+def group_samples(rows: list[dict]) -> dict[tuple, dict[str, list[float]]]:
+    """Messwerte pro Zelle: {(Modell, Prompt, temperature, max_new_tokens): {Kennzahl: [Werte]}}."""
+    groups: dict[tuple, dict[str, list[float]]] = {}
+    for row in rows:
+        temperature = _number(row["temperature"])
+        max_new_tokens = _number(row["max_new_tokens"])
+        key = (
+            row["model"],
+            row["prompt"],
+            # float32 aus Parquet und Text aus CSV auf denselben Wert bringen
+            round(temperature, 4) if temperature is not None else None,
+            int(max_new_tokens) if max_new_tokens is not None else None
+        )
+        samples = groups.setdefault(key, {metric: [] for metric, _ in METRICS})
+        latency = _number(row["latency_sec"])
+        output_tokens = _number(row["output_tokens"])
+        if latency is not None:
+            samples["latency_sec"].append(latency)
+            if output_tokens is not None and latency > 0:
+                samples["tokens_per_sec"].append(output_tokens / latency)
+    return groups
+
+
+def _test(scope: str, metric: str, higher_is_worse: bool, base: list[float], new: list[float],
+          threshold: float, alpha: float) -> dict:
+    base_median, new_median = percentile(base, 50), percentile(new, 50)
+    change = new_median / base_median - 1 if base_median else float("nan")
+    # Einseitig in Richtung "schlechter"
+    _, p_value = mann_whitney_u(new, base) if higher_is_worse else mann_whitney_u(base, new)
+    worse = change > threshold if higher_is_worse else change < -threshold
+    better = change < -threshold if higher_is_worse else change > threshold
+    if p_value < alpha and worse:
+        status = "Regression"
+    elif better:
+        status = "Verbesserung"
+    else:
+        status = "unverändert"
+    return {
+        "scope": scope, "metric": metric, "n_base": len(base), "n_new": len(new),
+        "median_base": base_median, "median_new": new_median,
+        "change": change, "p_value": p_value, "status": status
+    }
+
+
+def compare_runs(
+    baseline_rows: list[dict],
+    new_rows: list[dict],
+    threshold: float = 0.1,
+    alpha: float = 0.05,
+    min_samples: int = 5
+) -> tuple[list[dict], list[str]]:
+    """
+    Vergleicht zwei Läufe zellenweise.
+
+    Parameter:
+      - baseline_rows, new_rows: Zeilen aus load_run()
+      - threshold: relative Verschlechterung des Medians, ab der eine Regression zählt
+      - alpha: Signifikanzniveau des Mann-Whitney-U-Tests
+      - min_samples: Mindestanzahl Werte je Seite für den Test einer einzelnen Zelle
+
+    Rückgabe: (Testergebnisse, Hinweise zu Zellen, die nur in einem Lauf vorkommen)
+    """
+    baseline, new = group_samples(baseline_rows), group_samples(new_rows)
+    notes = [f"nur in Baseline: {key}" for key in baseline if key not in new]
+    notes += [f"nur im neuen Lauf: {key}" for key in new if key not in baseline]
+
+    findings = []
+    pooled: dict[tuple, tuple[list[float], list[float]]] = {}
+    for key in (key for key in baseline if key in new):
+        model, prompt, temperature, max_new_tokens = key
+        for metric, higher_is_worse in METRICS:
+            base_values, new_values = baseline[key][metric], new[key][metric]
+            if not base_values or not new_values:
+                continue
+            if len(base_values) >= min_samples and len(new_values) >= min_samples:
+                scope = f"{model}, T={temperature}, max={max_new_tokens}, {prompt[:40]!r}"
+                findings.append(_test(scope, metric, higher_is_worse, base_values, new_values, threshold, alpha))
+            else:
+                # Einzelne Zellen haben zu wenige Werte: pro Modell zusammenfassen
+                pooled_base, pooled_new = pooled.setdefault((model, metric, higher_is_worse), ([], []))
+                pooled_base.extend(base_values)
+                pooled_new.extend(new_values)
+
+    for (model, metric, higher_is_worse), (base_values, new_values) in pooled.items():
+        if len(base_values) >= min_samples and len(new_values) >= min_samples:
+            findings.append(_test(
+                f"{model}, alle Zellen", metric, higher_is_worse, base_values, new_values, threshold, alpha
+            ))
+        else:
+            notes.append(f"{model} / {metric}: zu wenige Werte ({len(base_values)} / {len(new_values)})")
+    return findings, notes
+
+
+def format_report(findings: list[dict], notes: list[str], baseline_spec: str, new_spec: str,
+                  threshold: float, alpha: float) -> str:
+    """Diff-Bericht als Markdown-Tabelle."""
+    n_regressions = sum(1 for f in findings if f["status"] == "Regression")
+    lines = [
+        f"# Vergleich: {new_spec} gegen Baseline {baseline_spec}",
+        "",
+        f"Schwelle {threshold:.0%} Verschlechterung des Medians, Mann-Whitney-U einseitig, alpha = {alpha}",
+        f"**{n_regressions} Regression(en)** in {len(findings)} Tests",
+        "",
+        "| Zelle | Kennzahl | n (alt/neu) | Median alt | Median neu | Änderung | p | Status |",
+        "|---|---|---|---|---|---|---|---|"
+    ]
+    for f in sorted(findings, key=lambda f: (f["status"] != "Regression", f["scope"], f["metric"])):
+        lines.append(
+            f"| {f['scope'].replace('|', '/')} | {f['metric']} | {f['n_base']}/{f['n_new']} | {f['median_base']:.3f} | "
+            f"{f['median_new']:.3f} | {f['change']:+.1%} | {f['p_value']:.4f} | {f['status']} |"
+        )
+    if notes:
+        lines += ["", "Hinweise:"] + [f"- {note}" for note in notes]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # Beispiele:
+    #   python compare.py results/main@20250601-120000-ab12cd results/main@latest
+    #   python compare.py baseline.csv matrix_results.csv --threshold 0.15 --report diff.md
+    parser = argparse.ArgumentParser(description="Lauf gegen eine Baseline vergleichen (Exit-Code 1 bei Regression)")
+    parser.add_argument("baseline", help="Baseline: CSV, Dataset-Verzeichnis oder Verzeichnis@run_id")
+    parser.add_argument("new", help="neuer Lauf: CSV, Dataset-Verzeichnis oder Verzeichnis@run_id / @latest")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative Verschlechterung des Medians")
+    parser.add_argument("--alpha", type=float, default=0.05, help="Signifikanzniveau")
+    parser.add_argument("--min-samples", type=int, default=5, help="Mindestwerte je Seite pro getesteter Zelle")
+    parser.add_argument("--report", default=None, help="Bericht zusätzlich als Markdown-Datei speichern")
+    args = parser.parse_args()
+
+    runs = {}
+    for spec in (args.baseline, args.new):
+        try:
+            runs[spec] = load_run(spec)
+        except (OSError, ValueError) as exc:
+            parser.exit(2, f"{exc}\n")
+        if not runs[spec]:
+            # Ohne Zeilen gäbe es "0 Regressionen" – ein leerer Lauf darf nicht als bestanden gelten
+            parser.exit(2, f"Keine Zeilen in {spec}\n")
+
+    findings, notes = compare_runs(
+        runs[args.baseline], runs[args.new],
+        threshold=args.threshold, alpha=args.alpha, min_samples=args.min_samples
+    )
+    report = format_report(findings, notes, args.baseline, args.new, args.threshold, args.alpha)
+    print(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    sys.exit(1 if any(f["status"] == "Regression" for f in findings) else 0)
@@ -0,0 +1,196 @@
+import math
+import random
+from array import array
+
+
+# --------------------------------------------------------
+# Hilfsfunktionen für Latenz-Statistiken (nur Standardbibliothek)
+# --------------------------------------------------------
+def percentile(values: list[float], q: float) -> float:
+    """
+    Berechnet das q-Perzentil (q ∈ [0, 100]) mit linearer Interpolation,
+    wie numpy.percentile im Standardmodus.
+
+    Rückgabe: float, bzw. NaN für eine leere Liste
+    """
+    if not values:
+        return math.nan
+    if not 0 <= q <= 100:
+        raise ValueError("q muss zwischen 0 und 100 liegen")
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    if lower == upper:
+        return ordered[lower]
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def mean(values: list[float]) -> float:
+    """Arithmetisches Mittel, bzw. NaN für eine leere Liste."""
+    return sum(values) / len(values) if values else math.nan
+
+
+def bootstrap_ci(
+    values: list[float],
+    statistic=mean,
+    confidence: float = 0.95,
+    n_resamples: int = 1000,
+    seed: int = 0
+) -> tuple[float, float]:
+    """
+    Perzentil-Bootstrap-Konfidenzintervall für eine Statistik (Standard: Mittelwert).
+
+    Parameter:
+      - values: Messwerte
+      - statistic: Funktion list[float] -> float
+      - confidence: Konfidenzniveau, z. B. 0.95
+      - n_resamples: Anzahl Bootstrap-Stichproben
+      - seed: Startwert für reproduzierbare Intervalle
+
+    Rückgabe: (untere Grenze, obere Grenze), bzw. (NaN, NaN) für eine leere Liste
+    """
+    if not values:
+        return math.nan, math.nan
+    rng = random.Random(seed)
+    estimates = [
+        statistic(rng.choices(values, k=len(values)))
+        for _ in range(n_resamples)
+    ]
+    alpha = (1 - confidence) / 2 * 100
+    return percentile(estimates, alpha), percentile(estimates, 100 - alpha)
+
+
+def summarize(values: list[float], prefix: str, **ci_kwargs) -> dict:
+    """
+    Fasst Messwerte zusammen: Mittelwert, p50, p95, p99 und Bootstrap-KI des Mittelwerts.
+
+    Rückgabe: {"<prefix>_mean", "<prefix>_p50", "<prefix>_p95", "<prefix>_p99",
+               "<prefix>_ci_low", "<prefix>_ci_high"}
+    """
+    ci_low, ci_high = bootstrap_ci(values, **ci_kwargs)
+    return {
+        f"{prefix}_mean": mean(values),
+        f"{prefix}_p50": percentile(values, 50),
+        f"{prefix}_p95": percentile(values, 95),
+        f"{prefix}_p99": percentile(values, 99),
+        f"{prefix}_ci_low": ci_low,
+        f"{prefix}_ci_high": ci_high
+    }
+
+
+def mann_whitney_u(x: list[float], y: list[float]) -> tuple[float, float]:
+    """
+    Einseitiger Mann-Whitney-U-Test: Sind die Werte in x tendenziell größer als in y?
+
+    Normalapproximation mit Bindungs- und Stetigkeitskorrektur; ab etwa 8 Werten
+    pro Stichprobe hinreichend genau.
+
+    Rückgabe: (U-Statistik von x, p-Wert), bzw. (NaN, NaN) für eine leere Stichprobe
+    """
+    n_x, n_y = len(x), len(y)
+    if not n_x or not n_y:
+        return math.nan, math.nan
+
+    # Gemeinsame Ränge, Bindungen erhalten den mittleren Rang
+    pooled = sorted([(value, 0) for value in x] + [(value, 1) for value in y])
+    ranks = [0.0] * len(pooled)
+    tie_term = 0.0
+    i = 0
+    while i < len(pooled):
+        j = i
+        while j + 1 < len(pooled) and pooled[j + 1][0] == pooled[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        tie_count = j - i + 1
+        tie_term += tie_count ** 3 - tie_count
+        i = j + 1
+
+    rank_sum_x = sum(rank for rank, (_, group) in zip(ranks, pooled) if group == 0)
+    u_x = rank_sum_x - n_x * (n_x + 1) / 2
+
+    n = n_x + n_y
+    mu = n_x * n_y / 2
+    sigma = math.sqrt(n_x * n_y / 12 * ((n + 1) - tie_term / (n * (n - 1)))) if n > 1 else 0.0
+    if sigma == 0:
+        return u_x, 0.5
+    z = (u_x - mu - 0.5) / sigma
+    return u_x, 0.5 * math.erfc(z / math.sqrt(2))
+
+
+class LogHistogram:
+    """
+    Histogramm mit logarithmischen Buckets und fester Größe (HDR-artig).
+
+    Jeder Bucket deckt einen Bereich [v, v·(1 + precision)) ab; Perzentile haben
+    damit höchstens precision relativen Fehler, unabhängig von der Zahl der Werte.
+    Der Speicherbedarf ist fest: ln(max_value / min_value) / ln(1 + precision) Zähler.
+
+    Parameter:
+      - min_value: kleinster aufgelöster Wert; kleinere Werte (auch 0) zählen in den untersten Bucket
+      - max_value: größter aufgelöster Wert; größere Werte zählen in den obersten Bucket
+      - precision: relative Bucketbreite, z. B. 0.01 für 1 %
+    """
+
+    def __init__(self, min_value: float = 1e-4, max_value: float = 1e4, precision: float = 0.01):
+        if not 0 < min_value < max_value or precision <= 0:
+            raise ValueError("erwartet 0 < min_value < max_value und precision > 0")
+        self.min_value = min_value
+        self.max_value = max_value
+        self.precision = precision
+        self._log_base = math.log1p(precision)
+        self.n_buckets = math.ceil(math.log(max_value / min_value) / self._log_base) + 1
+        self.counts = array("q", bytes(8 * self.n_buckets))
+        self.clear()
+
+    def clear(self):
+        for i in range(self.n_buckets):
+            self.counts[i] = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        return min(self.n_buckets - 1, int(math.log(value / self.min_value) / self._log_base))
+
+    def record(self, value: float, count: int = 1):
+        self.counts[self._index(value)] += count
+        self.count += count
+        self.sum += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "LogHistogram"):
+        """Addiert ein Histogramm mit identischen Bucketgrenzen."""
+        if (other.min_value, other.max_value, other.precision) != (self.min_value, self.max_value, self.precision):
+            raise ValueError("Histogramme mit unterschiedlichen Buckets")
+        for i, n in enumerate(other.counts):
+            if n:
+                self.counts[i] += n
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q: float) -> float:
+        """q-Perzentil (q ∈ [0, 100]) als Mitte des Buckets, begrenzt auf [min, max]; NaN ohne Werte."""
+        if not self.count:
+            return math.nan
+        if not 0 <= q <= 100:
+            raise ValueError("q muss zwischen 0 und 100 liegen")
+        rank = max(1, math.ceil(self.count * q / 100))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                # Geometrische Mitte des Buckets
+                value = self.min_value * math.exp((i + 0.5) * self._log_base)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else math.nan
@@ -0,0 +1,197 @@
+import os
+import time
+import random
+import asyncio
+import argparse
+from typing import Callable
+
+from huggingface_hub import AsyncInferenceClient
+
+from sweep import async_measure_llm
+from latency_stats import mean, percentile
+
+# --------------------------------------------------------
+# Open-Loop-Lastgenerator
+#    - Anfragen werden zu festen Ankunftszeitpunkten gesendet, unabhängig davon,
+#      ob vorherige Anfragen schon beantwortet sind (anders als die Schleifen
+#      in main.py, die immer auf die Antwort warten)
+#    - Die Rate wird stufenweise erhöht; pro Stufe werden Durchsatz,
+#      Fehlerquote und Latenz-Perzentile berichtet
+#
+#    Offline-Validierung gegen den Mock-Endpunkt mit 4 Workern à ~0,25 s:
+#      python loadgen.py --mock --workers 4 --rates 4,8,16,32 --duration 10
+#    Erwartung: Sättigung bei etwa 4 / 0,25 s = 16 Anfragen/s
+# --------------------------------------------------------
+def arrival_offsets(rate: float, duration: float, process: str = "constant", seed: int = None) -> list[float]:
+    """
+    Berechnet die Sendezeitpunkte (Sekunden ab Stufenbeginn) für eine Ziel-Ankunftsrate.
+
+    Parameter:
+      - rate: Ziel-Ankunftsrate in Anfragen pro Sekunde
+      - duration: Dauer der Stufe in Sekunden
+      - process: "constant" (gleichmäßige Abstände) oder "poisson"
+        (exponentialverteilte Abstände)
+      - seed: Startwert für den Zufallsgenerator (nur "poisson")
+    """
+    if rate <= 0:
+        raise ValueError("rate muss positiv sein")
+    if process == "constant":
+        return [i / rate for i in range(int(rate * duration))]
+    if process == "poisson":
+        rng = random.Random(seed)
+        offsets = []
+        t = rng.expovariate(rate)
+        while t < duration:
+            offsets.append(t)
+            t += rng.expovariate(rate)
+        return offsets
+    raise ValueError("process muss 'constant' oder 'poisson' sein")
+
+
+async def run_load_step(
+    client: AsyncInferenceClient,
+    prompt: str,
+    params: dict,
+    rate: float,
+    duration: float,
+    process: str = "constant",
+    timeout: float = 60.0,
+    stop_sequences: list[str] = None,
+    count_tokens: Callable[[str], int] = None,
+    seed: int = None
+) -> dict:
+    """
+    Führt eine Laststufe mit fester Ziel-Ankunftsrate aus.
+
+    Rückgabe:
+      {
+        "target_rate": float,          # Ziel-Ankunftsrate (Anfragen/s)
+        "sent": int,                   # gesendete Anfragen
+        "offered_rate": float,         # tatsächlich angebotene Rate (sent / duration)
+        "ok": int, "errors": int,      # erfolgreiche / fehlgeschlagene Anfragen
+        "error_rate": float,
+        "throughput": float,           # erfolgreiche Antworten pro Sekunde
+        "latency_mean", "latency_p50", "latency_p95", "latency_p99": float,
+        "send_lag_p99": float          # Verspätung des Sendens ggü. Plan (Generator-Check)
+      }
+    """
+    offsets = arrival_offsets(rate, duration, process, seed)
+    latencies: list[float] = []
+    send_lags: list[float] = []
+    errors = 0
+
+    async def fire(offset: float, step_start: float):
+        nonlocal errors
+        send_lags.append(time.perf_counter() - step_start - offset)
+        try:
+            measurement = await asyncio.wait_for(
+                async_measure_llm(client, prompt, params, count_tokens, stop_sequences),
+                timeout=timeout
+            )
+            latencies.append(measurement["latency"])
+        except Exception:
+            # Timeouts, HTTP-Fehler und Verbindungsabbrüche zählen als Fehler
+            errors += 1
+
+    step_start = time.perf_counter()
+    tasks = []
+    for offset in offsets:
+        delay = step_start + offset - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # Nicht auf die Antwort warten: offener Regelkreis
+        tasks.append(asyncio.create_task(fire(offset, step_start)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - step_start
+
+    return {
+        "target_rate": rate,
+        "sent": len(offsets),
+        "offered_rate": len(offsets) / duration,
+        "ok": len(latencies),
+        "errors": errors,
+        "error_rate": errors / len(offsets) if offsets else 0.0,
+        "throughput": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "latency_mean": mean(latencies),
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+        "send_lag_p99": percentile(send_lags, 99)
+    }
+
+
+async def run_load_curve(
+    client: AsyncInferenceClient,
+    prompt: str,
+    params: dict,
+    rates: list[float],
+    step_duration: float,
+    **step_kwargs
+) -> list[dict]:
+    """Führt run_load_step() für aufsteigende Raten nacheinander aus (Durchsatz-Latenz-Kurve)."""
+    steps = []
+    for rate in sorted(rates):
+        steps.append(await run_load_step(client, prompt, params, rate, step_duration, **step_kwargs))
+    return steps
+
+
+def find_saturation(steps: list[dict], min_efficiency: float = 0.9, max_error_rate: float = 0.01) -> float | None:
+    """
+    Liefert die erste Ziel-Rate, bei der das System gesättigt ist, d. h. der
+    erreichte Durchsatz unter min_efficiency × angebotene Rate fällt oder die
+    Fehlerquote max_error_rate übersteigt. None, falls keine Stufe gesättigt ist.
+
+    Verglichen wird mit der tatsächlich angebotenen Rate, damit die Streuung
+    eines Poisson-Prozesses keine Sättigung vortäuscht.
+    """
+    for step in steps:
+        if step["throughput"] < min_efficiency * step["offered_rate"] or step["error_rate"] > max_error_rate:
+            return step["target_rate"]
+    return None
+
+
+if __name__ == "__main__":
+    import pandas as pd
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Open-Loop-Lastgenerator mit Durchsatz-Latenz-Kurve")
+    parser.add_argument("--endpoint", default=None, help="Modell-ID oder Endpunkt-URL")
+    parser.add_argument("--rates", default="1,2,4,8", help="kommagetrennte Ziel-Raten (Anfragen/s)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Dauer pro Stufe (s)")
+    parser.add_argument("--process", choices=["constant", "poisson"], default="poisson")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Timeout pro Anfrage (s)")
+    parser.add_argument("--max-new-tokens", type=int, default=50)
+    parser.add_argument("--mock", action="store_true", help="lokalen Mock-Endpunkt starten und messen")
+    parser.add_argument("--service-time", type=float, default=0.25, help="Bedienzeit des Mock-Endpunkts (s)")
+    parser.add_argument("--workers", type=int, default=4, help="parallele Worker des Mock-Endpunkts")
+    args = parser.parse_args()
+
+    if args.mock:
+        from mock_server import start_mock_server
+        # Gesamte Bedienzeit als Zeit bis zum ersten (und einzigen) Token
+        server, target = start_mock_server(ttft=args.service_time, n_tokens=1, workers=args.workers)
+        token = None
+    else:
+        load_dotenv()
+        target = args.endpoint or "HuggingFaceH4/zephyr-7b-beta"
+        token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
+
+    client = AsyncInferenceClient(model=target, token=token)
+    steps = asyncio.run(run_load_curve(
+        client,
+        prompt="Warum ist der Himmel blau?",
+        params={"temperature": 0.7, "max_new_tokens": args.max_new_tokens},
+        rates=[float(r) for r in args.rates.split(",")],
+        step_duration=args.duration,
+        process=args.process,
+        timeout=args.timeout,
+        seed=0
+    ))
+
+    print("\n=== Durchsatz-Latenz-Kurve ===")
+    print(pd.DataFrame(steps).round(3).to_string(index=False))
+    saturation = find_saturation(steps)
+    if saturation is None:
+        print("\nKeine Sättigung im gemessenen Bereich.")
+    else:
+        print(f"\nSättigung ab ca. {saturation} Anfragen/s.")
@@ -1,13 +1,27 @@
 import os
 import time
+import asyncio
+import argparse
 import pandas as pd
 from dotenv import load_dotenv
 
-from transformers import AutoTokenizer
+from huggingface_hub import AsyncInferenceClient, InferenceClient
 from langchain_huggingface import HuggingFaceEndpoint
 from langchain.chains import LLMChain
 from langchain_core.prompts import PromptTemplate
 
+from sweep import run_sweep
+from streaming import measure_llm_stream
+from response_cache import ResponseCache, cache_key, cached_generate
+from token_counter import get_token_counter
+from token_accounting import TokenAccountant, load_prices, register_tokenizer
+from trials import run_trials
+from param_search import OBJECTIVES, pareto_front, successive_halving
+from clients import PooledEndpointClient, measure_llm_pooled, model_url
+from ratelimit import RateLimitedScheduler, install_response_hooks
+import tracing
+from tracing import span, traced
+
 # --------------------------------------------------------
 # 1) .env einlesen
 #    - Die Datei ".env" muss im selben Verzeichnis wie main.py liegen.
@@ -23,26 +37,35 @@ if not hf_token:
     )
 
 # --------------------------------------------------------
-# 2) Modell‐ID & Tokenizer initialisieren
+# 2) Modell‐ID & Token-Zähler initialisieren
 #    - Wir nutzen dasselbe Modell wie zuvor: HuggingFaceH4/zephyr-7b-beta
+#    - Der Tokenizer wird erst beim ersten Zählen geladen; bereits gezählte
+#      Texte (z. B. derselbe Prompt für jedes Parameter-Set) werden gemerkt
+#    - Wo der Server Tokenzahlen meldet (--concurrency), werden diese verwendet;
+#      Kosten pro Zeile aus prices.json (USD pro 1 Mio. Tokens), falls vorhanden
 # --------------------------------------------------------
 MODEL_ID = "HuggingFaceH4/zephyr-7b-beta"
-tokenizer = AutoTokenizer.from_pretrained(MODEL_ID)
+token_counter = get_token_counter(MODEL_ID)
+accountant = TokenAccountant(load_prices())
 
 def count_tokens(text: str) -> int:
     """
     Zählt, wie viele Tokens im übergebenen Text durch den HF‐Tokenizer erzeugt werden.
     """
-    return len(tokenizer.encode(text, add_special_tokens=True))
+    return token_counter.count(text)
 
 
 # --------------------------------------------------------
 # 3) Funktion: LLM-Aufruf mit Latenz‐ und Token‐Messung
 # --------------------------------------------------------
+@traced("measure_llm")
 def measure_llm(
     llm: HuggingFaceEndpoint,
     prompt: str,
-    stop_sequences: list[str] = None
+    stop_sequences: list[str] = None,
+    cache: ResponseCache = None,
+    replay: bool = False,
+    scheduler: RateLimitedScheduler = None
 ) -> dict:
     """
     Führt einen LLM-Aufruf aus und misst dabei:
@@ -53,13 +76,18 @@ def measure_llm(
       - llm: die HuggingFaceEndpoint-Instanz
       - prompt: der fertige Prompt-String
       - stop_sequences: Liste von Stoppsequenzen (optional)
+      - cache: ResponseCache; Live-Antworten werden dort abgelegt (optional)
+      - replay: True = Antwort nur aus dem Cache lesen, kein Netzwerkaufruf
+      - scheduler: RateLimitedScheduler; drosselt und wiederholt bei 429 (optional).
+        Die Latenz umfasst dann nur den erfolgreichen Versuch.
 
     Rückgabe:
       {
-        "latency": float,        # gemessene Zeit in Sekunden
+        "latency": float,        # gemessene Zeit in Sekunden (bei Replay: gespeicherte Live-Latenz)
         "input_tokens": int,     # Anzahl der Tokens im Prompt
         "output_tokens": int,    # Anzahl der Tokens in der generierten Antwort
-        "response_text": str     # der eigentliche generierte Text
+        "response_text": str,    # der eigentliche generierte Text
+        "source": str            # "live" oder "replay"
       }
     """
     # Anzahl der Tokens im Prompt zählen
@@ -70,12 +98,35 @@ def measure_llm(
     if stop_sequences:
         invocation_kwargs["stop"] = stop_sequences
 
-    # Latenz messen
-    start = time.time()
-    response = llm.invoke(prompt, **invocation_kwargs)
-    latency = time.time() - start
+    model_name = llm.endpoint_url or llm.repo_id
+
+    def invoke():
+        with span("network", model=model_name):
+            return llm.invoke(prompt, **invocation_kwargs)
+
+    def generate() -> tuple[str, float]:
+        if scheduler is not None:
+            # (Text, Latenz des erfolgreichen Versuchs) – ohne Warte- und Backoff-Zeiten
+            return scheduler.call_timed(model_name, invoke)
+        start = time.perf_counter()
+        text = invoke()
+        return text, time.perf_counter() - start
+
+    if cache is not None:
+        # Antwort über den Cache holen (live mit Ablage oder Replay ohne Netzwerk)
+        key = cache_key(
+            model=model_name,
+            prompt=prompt,
+            temperature=llm.temperature,
+            max_new_tokens=llm.max_new_tokens,
+            stop=stop_sequences
+        )
+        cached = cached_generate(cache, key, generate, replay=replay)
+        generated_text, latency, source = cached["response_text"], cached["latency"], cached["source"]
+    else:
+        generated_text, latency = generate()
+        source = "live"
 
-    generated_text = response
     # Anzahl der Tokens in der Antwort zählen
     n_output_tokens = count_tokens(generated_text)
 
@@ -83,7 +134,8 @@ def measure_llm(
         "latency": latency,
         "input_tokens": n_input_tokens,
         "output_tokens": n_output_tokens,
-        "response_text": generated_text
+        "response_text": generated_text,
+        "source": source
     }
 
 
@@ -115,64 +167,447 @@ parameter_list = [
 ]
 
 # --------------------------------------------------------
-# 6) Messergebnisse sammeln
+# 6) Kommandozeilenoptionen
+#    - --concurrency 1 (Standard): sequentielle Schleife wie bisher
+#    - --concurrency N > 1: asynchroner Sweep mit N gleichzeitigen Anfragen
+#    - --stream: gestreamte Messung mit TTFT und Inter-Token-Latenz
+#    - --endpoint URL: anderen Endpunkt ansprechen, z. B. mock_server.py
+#    - --replay: Antworten aus dem Antwort-Cache statt vom Endpunkt lesen
+#    - --trials: jede Rasterzelle nach Warm-up wiederholt messen, bis das
+#      Konfidenzintervall der Latenz schmal genug ist (--ci-width, --max-trials)
+#    - --pooled: ein Client mit offen gehaltenen Verbindungen für alle
+#      Parameter-Sets; Latenz aufgeteilt in connect / ttfb / transfer
+#    - --search: adaptive Suche (Successive Halving) über das Raster aus
+#      --temperatures × --max-new-tokens-values (× mit/ohne Stoppsequenzen);
+#      Messungen fließen in die besten Konfigurationen, Ausgabe mit Pareto-Front
+#    - --store VERZEICHNIS: Zeilen typisiert an ein Parquet-Dataset anhängen
+#    - --trace DATEI: Zeit pro Phase (Tokenizer, Netzwerk, Auswertung …) als
+#      Chrome-Trace und JSON-Zusammenfassung (DATEI.summary.json) schreiben
+# --------------------------------------------------------
+parser = argparse.ArgumentParser(description="Latenz- und Token-Messung über ein Parameter-Raster")
+parser.add_argument(
+    "--concurrency", type=int, default=1,
+    help="Anzahl gleichzeitiger Anfragen (1 = sequentiell)"
+)
+parser.add_argument(
+    "--stream", action="store_true",
+    help="Antworten streamen und TTFT / Inter-Token-Latenz messen"
+)
+parser.add_argument(
+    "--endpoint", default=None,
+    help="URL eines Endpunkts statt MODEL_ID (z. B. http://127.0.0.1:8080)"
+)
+parser.add_argument(
+    "--replay", action="store_true",
+    help="Antworten nur aus dem Antwort-Cache lesen (keine Netzwerkaufrufe)"
+)
+parser.add_argument(
+    "--trials", action="store_true",
+    help="wiederholte Messungen mit Warm-up und adaptiver Anzahl pro Parameter-Set"
+)
+parser.add_argument("--warmup", type=int, default=1, help="verworfene Warm-up-Aufrufe pro Parameter-Set")
+parser.add_argument("--max-trials", type=int, default=20, help="höchstens so viele Messungen pro Parameter-Set")
+parser.add_argument(
+    "--ci-width", type=float, default=0.1,
+    help="Ziel-Breite des 95-%%-KI der mittleren Latenz relativ zum Mittelwert"
+)
+parser.add_argument(
+    "--pooled", action="store_true",
+    help="Verbindungen wiederverwenden und Latenz in connect / ttfb / transfer aufteilen"
+)
+parser.add_argument(
+    "--rate", type=float, default=None,
+    help="anfängliche Senderate pro Modell (Anfragen/s); ohne Angabe ungedrosselt bis zum ersten 429"
+)
+parser.add_argument(
+    "--search", action="store_true",
+    help="adaptive Parametersuche statt vollem Raster (Successive Halving)"
+)
+parser.add_argument(
+    "--temperatures", default=None,
+    help="Suchraum für --search, kommagetrennt (Standard: Werte aus parameter_list)"
+)
+parser.add_argument(
+    "--max-new-tokens-values", default=None,
+    help="Suchraum für --search, kommagetrennt (Standard: Werte aus parameter_list)"
+)
+parser.add_argument(
+    "--search-stop", choices=["mit", "ohne", "beide"], default="mit",
+    help="Stoppsequenzen im Suchraum: immer, nie oder beide Varianten"
+)
+parser.add_argument("--objective", choices=list(OBJECTIVES), default="latency_per_token", help="Zielgröße der Suche")
+parser.add_argument(
+    "--tox-ceiling", type=float, default=None,
+    help="höchste erlaubte mittlere Toxizität; Antworten werden dafür bewertet (lädt den Klassifikator)"
+)
+parser.add_argument("--initial-samples", type=int, default=2, help="Messungen pro Konfiguration in Runde 1")
+parser.add_argument("--max-samples", type=int, default=16, help="höchstens so viele Messungen pro Konfiguration")
+parser.add_argument("--eta", type=int, default=2, help="pro Runde bleibt 1/eta der Konfigurationen übrig")
+parser.add_argument(
+    "--store", default=None, metavar="VERZEICHNIS",
+    help="Messergebnisse an ein Parquet-Dataset anhängen (benötigt pyarrow)"
+)
+parser.add_argument(
+    "--trace", default=None, metavar="DATEI",
+    help="Spans als Chrome-Trace (z. B. run_trace.json) und Zusammenfassung pro Phase schreiben"
+)
+args = parser.parse_args()
+if args.trace:
+    tracing.enable()
+if args.pooled and (args.stream or args.concurrency > 1 or args.replay or args.trials or args.search):
+    parser.error("--pooled ist eine eigene sequentielle Messart und nicht kombinierbar")
+if args.search and (args.stream or args.concurrency > 1 or args.replay or args.trials):
+    parser.error("--search misst live und sequentiell (ohne --stream, --concurrency, --replay, --trials)")
+if args.trials and (args.max_trials < 1 or args.warmup < 0):
+    parser.error("--max-trials muss mindestens 1 und --warmup mindestens 0 sein")
+if args.trials and (args.stream or args.concurrency > 1 or args.replay):
+    parser.error("--trials misst live und sequentiell (ohne --stream, --concurrency, --replay)")
+if args.stream and args.concurrency > 1:
+    parser.error("--stream misst sequentiell und ist nicht mit --concurrency > 1 kombinierbar")
+if args.replay and (args.stream or args.concurrency > 1):
+    parser.error("--replay gilt nur für die sequentielle Messung ohne --stream")
+
+# Live-Antworten landen im Cache; mit --replay werden sie von dort gelesen
+response_cache = ResponseCache()
+
+# Token-Bucket pro Modell, Backoff bei 429; passt die Senderate an das Kontingent an
+scheduler = RateLimitedScheduler(rate=args.rate)
+# RateLimit-Header der huggingface_hub-Antworten mitlesen (einmalig); ohne Hook nur AIMD
+install_response_hooks()
+
+# Ziel für InferenceClient-basierte Messungen: Modell-ID oder eigene Endpunkt-URL
+client_target = args.endpoint or MODEL_ID
+if args.endpoint:
+    # Lokale Zählung für den Endpunkt mit dem Tokenizer von MODEL_ID
+    register_tokenizer(args.endpoint, MODEL_ID)
+
+STOP_SEQUENCES = ["\nFrage:", "\nQuestion:"]
+
+# --------------------------------------------------------
+# 7) Messergebnisse sammeln
 # --------------------------------------------------------
 results = []
 frage = "Warum ist der Himmel blau?"
-prompt_string = template.format(frage=frage)
+with span("prompt_format"):
+    prompt_string = template.format(frage=frage)
 
-for params in parameter_list:
-    # --------------------------------------------------------
-    # 6.1) LLM-Instanz erstellen (HuggingFaceEndpoint) mit den jeweiligen Parametern
-    #    - stop=["\nFrage:", "\nQuestion:"] sorgt dafür, dass das Modell stoppt,
-    #      sobald es eine neue "Frage:" oder "Question:" generieren will
-    # --------------------------------------------------------
-    llm = HuggingFaceEndpoint(
-        repo_id=MODEL_ID,
+
+def build_llm(params: dict) -> HuggingFaceEndpoint:
+    """
+    Erstellt die LLM-Instanz (HuggingFaceEndpoint) mit den jeweiligen Parametern.
+      - stop=["\nFrage:", "\nQuestion:"] sorgt dafür, dass das Modell stoppt,
+        sobald es eine neue "Frage:" oder "Question:" generieren will
+    """
+    return HuggingFaceEndpoint(
+        **({"endpoint_url": args.endpoint} if args.endpoint else {"repo_id": MODEL_ID, "provider": "auto"}),
         huggingfacehub_api_token=hf_token,
-        provider="auto",
         task="text-generation",
         temperature=params["temperature"],
         max_new_tokens=params["max_new_tokens"],
-        stop=["\nFrage:", "\nQuestion:"]
+        stop=params.get("stop", STOP_SEQUENCES)
     )
 
+
+sweep_start = time.perf_counter()
+
+if args.concurrency > 1:
+    # --------------------------------------------------------
+    # 7a) Asynchroner Sweep: alle Parameter-Sets nebenläufig
+    # --------------------------------------------------------
+    async_client = AsyncInferenceClient(model=client_target, token=hf_token)
+    results, sweep_summary = asyncio.run(run_sweep(
+        client=async_client,
+        prompts=[prompt_string],
+        parameter_list=parameter_list,
+        accountant=accountant,
+        concurrency=args.concurrency,
+        stop_sequences=STOP_SEQUENCES,
+        scheduler=scheduler
+    ))
+elif args.stream:
     # --------------------------------------------------------
-    # 6.2) LLM-Aufruf + Messung
+    # 7b) Gestreamte Messung: TTFT, Inter-Token-Latenz, Tokens/s
     # --------------------------------------------------------
-    measurement = measure_llm(
-        llm=llm,
-        prompt=prompt_string,
-        stop_sequences=["\nFrage:", "\nQuestion:"]
+    stream_client = InferenceClient(model=client_target, token=hf_token)
+    for params in parameter_list:
+        measurement = scheduler.call(MODEL_ID, lambda: measure_llm_stream(
+            client=stream_client,
+            prompt=prompt_string,
+            params=params,
+            count_tokens=count_tokens,
+            stop_sequences=STOP_SEQUENCES
+        ))
+        results.append({
+            "temperature": params["temperature"],
+            "max_new_tokens": params["max_new_tokens"],
+            "latency_sec": round(measurement["latency"], 3),
+            "ttft_sec": round(measurement["ttft"], 3),
+            "itl_mean_sec": round(measurement["itl_mean"], 4),
+            "itl_p50_sec": round(measurement["itl_p50"], 4),
+            "itl_p95_sec": round(measurement["itl_p95"], 4),
+            "tokens_per_sec": round(measurement["tokens_per_sec"], 2),
+            "input_tokens": measurement["input_tokens"],
+            "output_tokens": measurement["output_tokens"],
+            "response_text": measurement["response_text"]
+        })
+elif args.pooled:
+    # --------------------------------------------------------
+    # 7d) Ein gepoolter Client für alle Parameter-Sets; Parameter pro Anfrage
+    # --------------------------------------------------------
+    pooled_client = PooledEndpointClient(args.endpoint or model_url(MODEL_ID), token=hf_token)
+    for params in parameter_list:
+        measurement = scheduler.call(MODEL_ID, lambda: measure_llm_pooled(
+            client=pooled_client,
+            prompt=prompt_string,
+            params=params,
+            count_tokens=count_tokens,
+            stop_sequences=STOP_SEQUENCES
+        ))
+        results.append({
+            "temperature": params["temperature"],
+            "max_new_tokens": params["max_new_tokens"],
+            "latency_sec": round(measurement["latency"], 3),
+            "connect_sec": round(measurement["connect"], 4),
+            "ttfb_sec": round(measurement["ttfb"], 3),
+            "transfer_sec": round(measurement["transfer"], 4),
+            "connection_reused": measurement["reused"],
+            "input_tokens": measurement["input_tokens"],
+            "output_tokens": measurement["output_tokens"],
+            "response_text": measurement["response_text"]
+        })
+    pooled_client.close()
+elif args.search:
+    # --------------------------------------------------------
+    # 7e) Adaptive Suche: wenige Messungen für alle, mehr nur für die besten
+    # --------------------------------------------------------
+    temperatures = (
+        [float(t) for t in args.temperatures.split(",")] if args.temperatures
+        else sorted({params["temperature"] for params in parameter_list})
     )
+    max_new_tokens_values = (
+        [int(m) for m in args.max_new_tokens_values.split(",")] if args.max_new_tokens_values
+        else sorted({params["max_new_tokens"] for params in parameter_list})
+    )
+    stop_options = {"mit": [STOP_SEQUENCES], "ohne": [[]], "beide": [STOP_SEQUENCES, []]}[args.search_stop]
+    configs = [
+        {"temperature": t, "max_new_tokens": m, **({"stop": stop} if args.search_stop != "mit" else {})}
+        for t in temperatures
+        for m in max_new_tokens_values
+        for stop in stop_options
+    ]
+    llms = {}
+
+    def measure_config(config: dict) -> dict:
+        key = (config["temperature"], config["max_new_tokens"], tuple(config.get("stop", STOP_SEQUENCES)))
+        if key not in llms:
+            llms[key] = build_llm(config)
+        return measure_llm(
+            llm=llms[key], prompt=prompt_string, stop_sequences=config.get("stop", STOP_SEQUENCES), scheduler=scheduler
+        )
+
+    score_toxicity = None
+    if args.tox_ceiling is not None:
+        from matrix import load_toxicity_scorer
+        from toxicity import label_score
+        tox_score, _ = load_toxicity_scorer()
+        score_toxicity = lambda texts: [label_score(scores) for scores in tox_score(texts)]
 
+    search = successive_halving(
+        configs,
+        measure_config,
+        objective=args.objective,
+        score_toxicity=score_toxicity,
+        toxicity_ceiling=args.tox_ceiling,
+        initial_samples=args.initial_samples,
+        max_samples=args.max_samples,
+        eta=args.eta
+    )
+    # Pareto-Front: Zielgröße gegen Toxizität, ohne Bewertung Latenz gegen Antwortlänge
+    if score_toxicity:
+        criteria = [("objective", True), ("toxicity", True)]
+    else:
+        criteria = [("latency_sec", True), ("output_tokens", False)]
+    front = {id(row) for row in pareto_front(search["rows"], criteria)}
+    for row in search["rows"]:
+        results.append({
+            **{k: v for k, v in row.items() if k != "stop"},
+            "latency_sec": round(row["latency_sec"], 3),
+            "output_tokens": round(row["output_tokens"], 1),
+            "input_tokens": count_tokens(prompt_string),
+            args.objective + "_median": round(row["objective"], 4),
+            "pareto": id(row) in front,
+            "best": row is search["best"]
+        })
+        results[-1].pop("objective")
+elif args.trials:
     # --------------------------------------------------------
-    # 6.3) Messergebnis protokollieren
+    # 7c) Wiederholte Messungen: Warm-up verwerfen, dann bis zum Ziel-KI
     # --------------------------------------------------------
-    results.append({
-        "temperature": params["temperature"],
-        "max_new_tokens": params["max_new_tokens"],
-        "latency_sec": round(measurement["latency"], 3),
-        "input_tokens": measurement["input_tokens"],
-        "output_tokens": measurement["output_tokens"],
-        "response_text": measurement["response_text"]
-    })
+    for params in parameter_list:
+        llm = build_llm(params)
+        stats = run_trials(
+            lambda: measure_llm(llm=llm, prompt=prompt_string, stop_sequences=STOP_SEQUENCES, scheduler=scheduler),
+            warmup=args.warmup,
+            # Mindestens 3 Messungen für das Bootstrap-KI, aber nie mehr als --max-trials
+            min_trials=min(3, args.max_trials),
+            max_trials=args.max_trials,
+            target_rel_ci_width=args.ci_width
+        )
+        results.append({
+            "temperature": params["temperature"],
+            "max_new_tokens": params["max_new_tokens"],
+            "n_trials": stats["n_trials"],
+            "converged": stats["converged"],
+            "latency_sec": round(stats["latency_mean"], 3),
+            "latency_p50_sec": round(stats["latency_p50"], 3),
+            "latency_p95_sec": round(stats["latency_p95"], 3),
+            "latency_p99_sec": round(stats["latency_p99"], 3),
+            "latency_ci_low": round(stats["latency_ci_low"], 3),
+            "latency_ci_high": round(stats["latency_ci_high"], 3),
+            "input_tokens": count_tokens(prompt_string),
+            "output_tokens": round(stats["output_tokens_mean"], 1),
+            "output_tokens_ci_low": round(stats["output_tokens_ci_low"], 1),
+            "output_tokens_ci_high": round(stats["output_tokens_ci_high"], 1),
+            "response_text": stats["last_response_text"],
+            # Einzelmessungen für --store (Grundlage von compare.py)
+            "latency_samples": stats["latency_samples"],
+            "output_tokens_samples": stats["output_tokens_samples"]
+        })
+else:
+    for params in parameter_list:
+        # --------------------------------------------------------
+        # 7.1) LLM-Instanz erstellen (HuggingFaceEndpoint) mit den jeweiligen Parametern
+        # --------------------------------------------------------
+        llm = build_llm(params)
+
+        # --------------------------------------------------------
+        # 7.2) LLM-Aufruf + Messung
+        # --------------------------------------------------------
+        measurement = measure_llm(
+            llm=llm,
+            prompt=prompt_string,
+            stop_sequences=STOP_SEQUENCES,
+            cache=response_cache,
+            replay=args.replay,
+            scheduler=scheduler
+        )
+
+        # --------------------------------------------------------
+        # 7.3) Messergebnis protokollieren
+        # --------------------------------------------------------
+        results.append({
+            "temperature": params["temperature"],
+            "max_new_tokens": params["max_new_tokens"],
+            "latency_sec": round(measurement["latency"], 3),
+            "latency_source": measurement["source"],
+            "input_tokens": measurement["input_tokens"],
+            "output_tokens": measurement["output_tokens"],
+            "response_text": measurement["response_text"]
+        })
+
+if args.concurrency <= 1:
+    sweep_wall_time = time.perf_counter() - sweep_start
+    # Im --trials-Modus zählen alle Wiederholungen inkl. Warm-up als Anfragen
+    if args.trials:
+        n_requests = sum(row["n_trials"] + args.warmup for row in results)
+    elif args.search:
+        n_requests = search["n_calls"]
+    else:
+        n_requests = len(results)
+    sweep_summary = {
+        "n_requests": n_requests,
+        "wall_time_sec": round(sweep_wall_time, 3),
+        "requests_per_sec": round(n_requests / sweep_wall_time, 3) if sweep_wall_time > 0 else 0.0
+    }
 
 # --------------------------------------------------------
-# 7) Ergebnisse in DataFrame umwandeln und ausgeben
+# 8) Ergebnisse in DataFrame umwandeln und ausgeben
 # --------------------------------------------------------
-df = pd.DataFrame(results)
+# Kosten pro Zeile aus den Tokenzahlen (der Sweep liefert sie bereits mit)
+for row in results:
+    if "cost_usd" not in row:
+        row.update(accountant.cost(MODEL_ID, row["input_tokens"], row["output_tokens"]))
+
+with span("report"):
+    df = pd.DataFrame(results)
 
 print("\n=== Messergebnisse als Tabelle ===")
 # Tabelle ohne tabulate-Dependency ausgeben
+table_columns = ["temperature", "max_new_tokens", "latency_sec", "input_tokens", "output_tokens"]
+if "latency_source" in df.columns:
+    # "replay"-Zeilen zeigen die beim Live-Lauf gespeicherte Latenz
+    table_columns.insert(3, "latency_source")
+if args.trials:
+    table_columns += [
+        "n_trials", "latency_p50_sec", "latency_p95_sec", "latency_p99_sec",
+        "latency_ci_low", "latency_ci_high", "output_tokens_ci_low", "output_tokens_ci_high"
+    ]
+if args.search:
+    table_columns = ["config"] + table_columns[2:] + [
+        "n_samples", args.objective + "_median", "eliminated_round", "pareto", "best"
+    ]
+    if args.tox_ceiling is not None:
+        table_columns += ["toxicity", "feasible"]
+if args.pooled:
+    table_columns += ["connect_sec", "ttfb_sec", "transfer_sec", "connection_reused"]
+if args.stream:
+    table_columns += ["ttft_sec", "itl_mean_sec", "itl_p50_sec", "itl_p95_sec", "tokens_per_sec"]
+if "token_source" in df.columns:
+    # "usage" = vom Server gemeldet, "tokenizer" = lokal gezählt
+    table_columns.append("token_source")
+if df["cost_usd"].notna().any():
+    table_columns.append("cost_usd")
+with span("report"):
+    print(
+        df[table_columns]
+        .to_string(index=False)
+    )
+
 print(
-    df[["temperature", "max_new_tokens", "latency_sec", "input_tokens", "output_tokens"]]
-    .to_string(index=False)
+    f"\nSweep: {sweep_summary['n_requests']} Anfragen in {sweep_summary['wall_time_sec']} s "
+    f"({sweep_summary['requests_per_sec']} Anfragen/s, concurrency={args.concurrency})"
 )
+if args.search:
+    print(
+        f"Suche: {search['n_calls']} Messungen in {search['rounds']} Runden statt "
+        f"{search['grid_calls']} für das volle Raster mit je {args.max_samples} Messungen"
+    )
+    if search["best"] is None:
+        print("Keine Konfiguration hält die Toxizitäts-Obergrenze ein.")
+    else:
+        print(f"Beste Konfiguration ({args.objective}): {search['best']['config']}")
+
+if args.store:
+    from result_store import RESULT_FIELDS, ResultStore
+    # Kennzahlen der gewählten Messart (ttft_sec, connect_sec, …) als Zusatzspalten
+    base_columns = {name for name, _ in RESULT_FIELDS}
+    extra_fields = [
+        (c, "bool_" if df[c].dtype == bool else "string" if df[c].dtype == object else "float64")
+        for c in table_columns if c not in base_columns
+    ]
+    with ResultStore(args.store, extra_fields=extra_fields) as store:
+        for row in results:
+            if "latency_samples" in row:
+                # --trials: eine Zeile pro gewerteter Einzelmessung
+                for latency, output_tokens in zip(row["latency_samples"], row["output_tokens_samples"]):
+                    store.append({
+                        **row, "model": MODEL_ID, "prompt": prompt_string,
+                        "latency_sec": latency, "output_tokens": output_tokens
+                    })
+            else:
+                store.append({**row, "model": MODEL_ID, "prompt": prompt_string})
+    print(f"\n{store.n_rows} Zeilen → {args.store} (Lauf {store.run_id})")
+
+if scheduler.stats:
+    print("\nRate-Limit-Scheduler:\n" + scheduler.summary())
 
 # --------------------------------------------------------
-# 8) Detaillierte Ausgabe der vollständigen Antworten
+# 9) Detaillierte Ausgabe der vollständigen Antworten
 # --------------------------------------------------------
 for row in results:
     print(f"\n--- Parameter-Set: temp={row['temperature']}, max_new_tokens={row['max_new_tokens']} ---")
     print("Antwort:", row["response_text"])
+
+if args.trace:
+    tracing.export(args.trace)
+    print("\n" + tracing.format_summary())
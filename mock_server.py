@@ -0,0 +1,228 @@
+import json
+import time
+import socket
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ratelimit import TokenBucket
+
+# --------------------------------------------------------
+# Lokaler Stand-in für einen Text-Generation-Endpunkt
+#    - Spricht das TGI-Protokoll (POST /, auch mit "stream": true)
+#      und die Chat-Completion-Route (POST /v1/chat/completions)
+#    - Verzögerungen sind konfigurierbar, damit Messungen offline
+#      und reproduzierbar getestet werden können
+#    - Mit --workers N werden höchstens N Anfragen gleichzeitig bedient,
+#      weitere warten; so lässt sich ein Sättigungspunkt nachstellen
+#    - Mit --rate-limit R werden mehr als R Anfragen/s mit 429 und
+#      Retry-After abgewiesen (für den RateLimitedScheduler)
+#
+#    Start:  python mock_server.py --port 8080 --ttft 0.2 --token-delay 0.02
+#    Nutzung: InferenceClient(model="http://127.0.0.1:8080")
+# --------------------------------------------------------
+MOCK_WORDS = ["Der", " Himmel", " ist", " blau", ",", " weil", " Licht", " gestreut", " wird", "."]
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """HTTP-Handler; die Konfiguration liegt in der Klassenvariable config."""
+
+    config = {"ttft": 0.05, "token_delay": 0.01, "n_tokens": 20, "slots": None, "limiter": None}
+    # HTTP/1.1, damit Clients Verbindungen offen halten können (Keep-Alive)
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Header und Body gehen getrennt raus; ohne TCP_NODELAY verzögert
+        # Nagle + Delayed-ACK jede Antwort auf Keep-Alive-Verbindungen um ~40 ms
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        # Keine Zugriffslogs auf stderr – stört sonst jede Messausgabe
+        pass
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload, status: int = 200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _tokens(self, max_new_tokens) -> list[str]:
+        n = self.config["n_tokens"]
+        if max_new_tokens:
+            n = min(n, int(max_new_tokens))
+        return [MOCK_WORDS[i % len(MOCK_WORDS)] for i in range(n)]
+
+    def _emit(self, tokens: list[str], stream: bool, make_event):
+        """Wartet gemäß Konfiguration und sendet Tokens einzeln (SSE) oder am Stück."""
+        if not stream:
+            time.sleep(self.config["ttft"] + self.config["token_delay"] * max(len(tokens) - 1, 0))
+            return
+        # Streams haben keine Content-Length; das Ende wird durch Schließen markiert
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            time.sleep(self.config["ttft"] if i == 0 else self.config["token_delay"])
+            event = make_event(i, token, i == len(tokens) - 1)
+            self.wfile.write(b"data:" + json.dumps(event).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+
+    def do_POST(self):
+        payload = self._read_json()
+        limiter = self.config["limiter"]
+        if limiter is not None and not limiter.try_acquire():
+            # Kontingent erschöpft: abweisen (try_acquire verbraucht dabei kein Token)
+            body = json.dumps({"error": "Rate limit reached"}).encode("utf-8")
+            self.send_response(429)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Retry-After", "1")
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        slots = self.config["slots"]
+        if slots is not None:
+            # Begrenzte Bedienkapazität: Anfrage wartet auf einen freien Worker
+            slots.acquire()
+        try:
+            if self.path.rstrip("/").endswith("/v1/chat/completions"):
+                self._chat_completion(payload)
+            else:
+                self._text_generation(payload)
+        finally:
+            if slots is not None:
+                slots.release()
+
+    def _text_generation(self, payload: dict):
+        parameters = payload.get("parameters") or {}
+        tokens = self._tokens(parameters.get("max_new_tokens"))
+        text = "".join(tokens)
+        stream = bool(payload.get("stream"))
+
+        def make_event(i, token, last):
+            return {
+                "index": i,
+                "token": {"id": i, "text": token, "logprob": 0.0, "special": False},
+                "generated_text": text if last else None,
+                "details": None
+            }
+
+        self._emit(tokens, stream, make_event)
+        if not stream:
+            output = {"generated_text": text}
+            if parameters.get("details"):
+                output["details"] = {
+                    "finish_reason": "length",
+                    "generated_tokens": len(tokens),
+                    "seed": None,
+                    "prefill": [],
+                    "tokens": []
+                }
+            self._send_json([output])
+
+    def _chat_completion(self, payload: dict):
+        tokens = self._tokens(payload.get("max_tokens"))
+        text = "".join(tokens)
+        stream = bool(payload.get("stream"))
+        prompt_tokens = sum(len(m.get("content", "").split()) for m in payload.get("messages", []))
+        common = {"id": "mock", "created": int(time.time()), "model": "mock", "system_fingerprint": ""}
+
+        def make_event(i, token, last):
+            return {
+                **common,
+                "object": "chat.completion.chunk",
+                "choices": [{
+                    "index": 0,
+                    "delta": {"role": "assistant", "content": token},
+                    "finish_reason": "stop" if last else None
+                }]
+            }
+
+        self._emit(tokens, stream, make_event)
+        if stream:
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+        self._send_json({
+            **common,
+            "object": "chat.completion",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(tokens),
+                "total_tokens": prompt_tokens + len(tokens)
+            }
+        })
+
+
+def start_mock_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    ttft: float = 0.05,
+    token_delay: float = 0.01,
+    n_tokens: int = 20,
+    workers: int = None,
+    rate_limit: float = None
+) -> tuple[ThreadingHTTPServer, str]:
+    """
+    Startet den Mock-Server in einem Hintergrund-Thread.
+
+    Parameter:
+      - host, port: Adresse; port=0 wählt einen freien Port
+      - ttft: Verzögerung bis zum ersten Token in Sekunden
+      - token_delay: Verzögerung zwischen zwei Tokens in Sekunden
+      - n_tokens: Anzahl generierter Tokens (höchstens max_new_tokens)
+      - workers: maximale Anzahl gleichzeitig bedienter Anfragen (None = unbegrenzt)
+      - rate_limit: erlaubte Anfragen/s, darüber 429 mit Retry-After (None = unbegrenzt)
+
+    Die Bedienzeit einer Anfrage beträgt ttft + token_delay * (n_tokens - 1).
+
+    Rückgabe: (server, url) – mit server.shutdown() wieder beenden
+    """
+    handler = type("ConfiguredMockLLMHandler", (MockLLMHandler,), {
+        "config": {
+            "ttft": ttft,
+            "token_delay": token_delay,
+            "n_tokens": n_tokens,
+            "slots": threading.BoundedSemaphore(workers) if workers else None,
+            "limiter": TokenBucket(rate_limit, capacity=max(1.0, rate_limit)) if rate_limit else None
+        }
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lokaler Mock-Endpunkt für Text-Generation")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--ttft", type=float, default=0.05, help="Zeit bis zum ersten Token (s)")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Zeit zwischen Tokens (s)")
+    parser.add_argument("--n-tokens", type=int, default=20, help="Anzahl generierter Tokens")
+    parser.add_argument("--workers", type=int, default=None, help="gleichzeitig bediente Anfragen")
+    parser.add_argument("--rate-limit", type=float, default=None, help="erlaubte Anfragen/s (sonst 429)")
+    args = parser.parse_args()
+
+    server, url = start_mock_server(
+        args.host, args.port, args.ttft, args.token_delay, args.n_tokens, args.workers, args.rate_limit
+    )
+    print(f"Mock-Endpunkt läuft auf {url} (Strg+C zum Beenden)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
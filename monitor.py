@@ -0,0 +1,319 @@
+import math
+import time
+import argparse
+import threading
+from typing import Callable, Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from latency_stats import LogHistogram
+from matrix import MatrixCell, parse_model_spec, run_cell
+from ratelimit import RateLimitedScheduler, install_response_hooks
+
+# --------------------------------------------------------
+# Dauerbetrieb: Endpunkte periodisch prüfen (Monitoring)
+#    - Pro Modell sendet ein Thread alle --interval Sekunden eine Prüfanfrage
+#      (Prompts rotieren aus der eingebauten Liste oder aus --prompts)
+#    - Latenz, Tokens/s und (optional) Toxizität landen in Histogrammen mit
+#      logarithmischen Buckets fester Größe (latency_stats.LogHistogram); es
+#      werden keine Einzelwerte oder Antworten aufbewahrt
+#    - Gleitende Fenster 1m / 5m / 1h bestehen aus einem Ring von Teil-
+#      Histogrammen; der älteste Teil wird beim Weiterrücken geleert, der
+#      Speicherbedarf bleibt daher über Tage konstant
+#    - Aktuelle Perzentile als Prometheus-Text unter http://<host>:<port>/metrics
+# --------------------------------------------------------
+# (Name, Fensterlänge in s, Teil-Histogramme im Ring)
+WINDOWS = (("1m", 60, 6), ("5m", 300, 10), ("1h", 3600, 12))
+
+QUANTILES = (50, 90, 99)
+
+# (Kennzahl, Prometheus-Name, Hilfetext, Histogrammgrenzen)
+METRICS = (
+    ("latency", "llm_monitor_latency_seconds", "Latenz der Prüfanfragen", (1e-3, 1e3)),
+    ("tokens_per_sec", "llm_monitor_tokens_per_second", "Generierte Tokens pro Sekunde", (1e-2, 1e5)),
+    ("toxicity", "llm_monitor_toxicity_score", "Toxizitäts-Score (Label toxic) der Antworten", (1e-4, 1.0))
+)
+
+
+class RollingHistogram:
+    """
+    Gleitendes Fenster aus einem Ring von LogHistogram-Teilen.
+
+    Parameter:
+      - window_sec: Fensterlänge in Sekunden
+      - slices: Anzahl der Teile; das Fenster rückt in Schritten von window_sec / slices vor
+      - min_value, max_value, precision: Bucketgrenzen, siehe LogHistogram
+    """
+
+    def __init__(self, window_sec: float, slices: int, min_value: float, max_value: float, precision: float = 0.01):
+        self.slice_sec = window_sec / slices
+        self.parts = [LogHistogram(min_value, max_value, precision) for _ in range(slices)]
+        self.epochs = [-1] * slices
+        self.bounds = (min_value, max_value, precision)
+
+    def _slot(self, now: float) -> tuple[int, int]:
+        epoch = int(now // self.slice_sec)
+        return epoch % len(self.parts), epoch
+
+    def record(self, value: float, now: float = None):
+        slot, epoch = self._slot(time.time() if now is None else now)
+        if self.epochs[slot] != epoch:
+            # Teil aus einer früheren Runde des Rings: wiederverwenden
+            self.parts[slot].clear()
+            self.epochs[slot] = epoch
+        self.parts[slot].record(value)
+
+    def snapshot(self, now: float = None) -> LogHistogram:
+        """Zusammengeführtes Histogramm aller Teile im aktuellen Fenster."""
+        _, epoch = self._slot(time.time() if now is None else now)
+        merged = LogHistogram(*self.bounds)
+        for part, part_epoch in zip(self.parts, self.epochs):
+            if epoch - len(self.parts) < part_epoch <= epoch:
+                merged.merge(part)
+        return merged
+
+
+class Monitor:
+    """Kennzahlen aller Modelle: gleitende Histogramme plus Zähler seit dem Start."""
+
+    def __init__(self, models: list[str]):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.histograms = {
+            (model, metric): {
+                name: RollingHistogram(window_sec, slices, *bounds) for name, window_sec, slices in WINDOWS
+            }
+            for model in models
+            for metric, _, _, bounds in METRICS
+        }
+        self.requests = dict.fromkeys(models, 0)
+        self.errors = dict.fromkeys(models, 0)
+
+    def record(self, model: str, **values: float):
+        """Trägt die Werte einer Prüfanfrage ein, z. B. record(model, latency=0.8, tokens_per_sec=41.0)."""
+        now = time.time()
+        with self.lock:
+            self.requests[model] += 1
+            for metric, value in values.items():
+                if value is not None:
+                    for histogram in self.histograms[(model, metric)].values():
+                        histogram.record(value, now)
+
+    def record_error(self, model: str):
+        with self.lock:
+            self.requests[model] += 1
+            self.errors[model] += 1
+
+    def prometheus(self) -> str:
+        """Prometheus-Textformat (summary pro Kennzahl, Modell und Fenster)."""
+        now = time.time()
+        lines = []
+        with self.lock:
+            for metric, prom_name, help_text, _ in METRICS:
+                lines += [f"# HELP {prom_name} {help_text}", f"# TYPE {prom_name} summary"]
+                for (model, name), windows in self.histograms.items():
+                    if name != metric:
+                        continue
+                    for window, histogram in windows.items():
+                        snapshot = histogram.snapshot(now)
+                        labels = f'model="{_escape(model)}",window="{window}"'
+                        for q in QUANTILES:
+                            lines.append(
+                                f'{prom_name}{{{labels},quantile="{q / 100}"}} {_number(snapshot.percentile(q))}'
+                            )
+                        lines.append(f"{prom_name}_sum{{{labels}}} {_number(snapshot.sum)}")
+                        lines.append(f"{prom_name}_count{{{labels}}} {snapshot.count}")
+            lines += ["# HELP llm_monitor_requests_total Prüfanfragen seit dem Start",
+                      "# TYPE llm_monitor_requests_total counter"]
+            lines += [f'llm_monitor_requests_total{{model="{_escape(m)}"}} {n}' for m, n in self.requests.items()]
+            lines += ["# HELP llm_monitor_errors_total Fehlgeschlagene Prüfanfragen seit dem Start",
+                      "# TYPE llm_monitor_errors_total counter"]
+            lines += [f'llm_monitor_errors_total{{model="{_escape(m)}"}} {n}' for m, n in self.errors.items()]
+        lines.append(f"llm_monitor_uptime_seconds {now - self.started:.0f}")
+        return "\n".join(lines) + "\n"
+
+    def format_summary(self, window: str = "5m") -> str:
+        """Konsolenzeile pro Modell mit p50 / p99 der Latenz im Fenster."""
+        lines = []
+        with self.lock:
+            for model in self.requests:
+                latency = self.histograms[(model, "latency")][window].snapshot()
+                lines.append(
+                    f"  {model}: {latency.count} Anfragen/{window}, p50 {latency.percentile(50):.3f} s, "
+                    f"p99 {latency.percentile(99):.3f} s, {self.errors[model]} Fehler gesamt"
+                )
+        return "\n".join(lines)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return "NaN" if math.isnan(value) else f"{value:.6g}"
+
+
+def serve_metrics(monitor: Monitor, host: str = "127.0.0.1", port: int = 9464) -> ThreadingHTTPServer:
+    """Startet den Metrik-Endpunkt (GET /metrics) in einem Hintergrund-Thread."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = monitor.prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def probe_loop(
+    monitor: Monitor,
+    model_spec: str,
+    client,
+    scheduler: RateLimitedScheduler,
+    prompts: Iterator[str],
+    interval: float,
+    params: dict,
+    count_output_tokens: Callable[[str, str], int],
+    score_toxicity: Callable[[str], float] = None,
+    stop: threading.Event = None,
+    endpoint: str = None
+):
+    """
+    Prüft ein Modell alle interval Sekunden (Start zu Start), bis stop gesetzt ist.
+
+    Parameter:
+      - monitor: Ziel der Messwerte
+      - model_spec: Modell-ID, optional mit :text / :chat
+      - client: InferenceClient des Modells
+      - scheduler: RateLimitedScheduler (Backoff bei 429)
+      - prompts: endloser Iterator über Prompt-Texte
+      - interval: Abstand der Prüfanfragen in Sekunden
+      - params: {"temperature": ..., "max_new_tokens": ...}
+      - count_output_tokens: Funktion (Modell-ID, Antwort) -> Tokens, falls der Server keine meldet
+      - score_toxicity: Funktion Antwort -> Score (optional)
+      - stop: Event zum Beenden
+      - endpoint: abweichendes Aufrufziel des Clients (z. B. Mock), Teil des Zellschlüssels
+    """
+    stop = stop or threading.Event()
+    model_id, mode = parse_model_spec(model_spec)
+    next_start = time.monotonic()
+    while not stop.is_set():
+        cell = MatrixCell(model_id, mode, next(prompts), params["temperature"], params["max_new_tokens"], endpoint)
+        try:
+            row = run_cell(cell, client, scheduler)
+            output_tokens = (row["usage"] or {}).get("output_tokens")
+            if output_tokens is None:
+                output_tokens = count_output_tokens(model_id, row["response_text"])
+            latency = row["latency_sec"]
+            monitor.record(
+                model_spec,
+                latency=latency,
+                tokens_per_sec=output_tokens / latency if latency > 0 else None,
+                toxicity=score_toxicity(row["response_text"]) if score_toxicity else None
+            )
+        except Exception as exc:
+            monitor.record_error(model_spec)
+            print(f"  Fehler bei {model_spec}: {exc}")
+        next_start += interval
+        stop.wait(max(0.0, next_start - time.monotonic()))
+
+
+if __name__ == "__main__":
+    # Beispiele:
+    #   python monitor.py --models microsoft/phi-4:chat --interval 30 --port 9464 --toxicity
+    #   python monitor.py --endpoint http://127.0.0.1:8080 --interval 1   # gegen mock_server.py
+    #   curl http://127.0.0.1:9464/metrics
+    import os
+    from dotenv import load_dotenv
+    from huggingface_hub import InferenceClient
+
+    from matrix import DEFAULT_MODELS, DEFAULT_PROMPTS
+    from prompt_dataset import add_dataset_arguments, prompts_from_args
+    from token_accounting import fallback_counter
+
+    parser = argparse.ArgumentParser(description="Endpunkte dauerhaft prüfen und Perzentile als Metriken anbieten")
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS, help="Modell-IDs, optional mit :text / :chat")
+    parser.add_argument("--endpoint", default=None, help="alle Modelle an diesen Endpunkt senden (z. B. Mock)")
+    parser.add_argument("--interval", type=float, default=60.0, help="Sekunden zwischen zwei Prüfanfragen pro Modell")
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--max-new-tokens", type=int, default=100)
+    parser.add_argument("--host", default="127.0.0.1", help="Adresse des Metrik-Endpunkts")
+    parser.add_argument("--port", type=int, default=9464, help="Port des Metrik-Endpunkts")
+    parser.add_argument("--report-every", type=float, default=300.0, help="Konsolenzusammenfassung alle n Sekunden")
+    parser.add_argument("--toxicity", action="store_true", help="Antworten auf Toxizität bewerten")
+    add_dataset_arguments(parser)
+    args = parser.parse_args()
+
+    load_dotenv()
+    hf_token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
+    if not hf_token and not args.endpoint:
+        raise ValueError(
+            "♨️ Kein Token gefunden. Lege eine `.env`-Datei an mit:\n"
+            "   HUGGINGFACEHUB_API_TOKEN=hf_<dein_token>"
+        )
+
+    score_toxicity = None
+    if args.toxicity:
+        # Ohne Score-Cache: Monitoring-Antworten wiederholen sich selten, und die
+        # Cache-Datei würde über die Laufzeit unbegrenzt wachsen
+        from toxicity import get_toxicity_scores, label_score, load_toxicity_pipeline
+        tox_pipeline = load_toxicity_pipeline(device=-1)
+        tox_lock = threading.Lock()
+
+        def score_toxicity(text: str) -> float:
+            with tox_lock:
+                return label_score(get_toxicity_scores([text], tox_pipeline, batch_size=1)[0])
+
+    def prompt_cycle() -> Iterator[str]:
+        # Datei bei jedem Durchlauf neu streamen statt alle Prompts zu behalten
+        while True:
+            empty = True
+            for prompt in prompts_from_args(args, DEFAULT_PROMPTS):
+                empty = False
+                yield prompt
+            if empty:
+                raise ValueError("Keine Prompts für diesen Shard")
+
+    monitor = Monitor(args.models)
+    server = serve_metrics(monitor, args.host, args.port)
+    print(f"Metriken unter http://{args.host}:{server.server_address[1]}/metrics (Strg+C zum Beenden)")
+
+    stop = threading.Event()
+    scheduler = RateLimitedScheduler()
+    # RateLimit-Header der huggingface_hub-Antworten mitlesen (einmalig); ohne Hook nur AIMD
+    install_response_hooks()
+    params = {"temperature": args.temperature, "max_new_tokens": args.max_new_tokens}
+    threads = [
+        threading.Thread(target=probe_loop, daemon=True, kwargs={
+            "monitor": monitor,
+            "model_spec": spec,
+            "client": InferenceClient(model=args.endpoint or parse_model_spec(spec)[0], token=hf_token),
+            "scheduler": scheduler,
+            "prompts": prompt_cycle(),
+            "interval": args.interval,
+            "params": params,
+            "count_output_tokens": lambda model_id, text: fallback_counter(model_id).count(text),
+            "score_toxicity": score_toxicity,
+            "stop": stop,
+            "endpoint": args.endpoint
+        })
+        for spec in args.models
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        while not stop.wait(args.report_every):
+            print(time.strftime("%H:%M:%S") + "\n" + monitor.format_summary())
+    except KeyboardInterrupt:
+        stop.set()
+        server.shutdown()
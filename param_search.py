@@ -0,0 +1,160 @@
+import math
+from typing import Callable
+
+from latency_stats import mean, percentile
+
+# --------------------------------------------------------
+# Adaptive Parametersuche (Successive Halving) statt vollem Raster
+#    - Runde 1: jede Konfiguration mit wenigen Messungen (initial_samples)
+#    - Nach jeder Runde bleibt nur das beste 1/eta der Konfigurationen übrig;
+#      die Überlebenden bekommen eta-mal so viele Messungen
+#    - Zielgröße (kleiner ist besser) ist der Median einer Kennzahl pro Messung,
+#      z. B. Latenz pro Output-Token; Konfigurationen, deren mittlere Toxizität
+#      über der Obergrenze liegt, scheiden vor allen zulässigen aus
+#    - Am Ende: Kennzahlen aller Konfigurationen (mit der Runde, in der sie
+#      ausgeschieden sind) und die Pareto-Front über frei wählbare Kriterien
+#    Aufrufe: pro Runde etwa n · initial_samples, bei eta=2 und max_samples=16
+#    also rund ein Drittel des vollen Rasters mit n · max_samples Messungen
+# --------------------------------------------------------
+OBJECTIVES = {
+    # Name: Kennzahl pro Messung (kleiner ist besser)
+    "latency_per_token": lambda sample: sample["latency"] / max(sample["output_tokens"], 1),
+    "latency": lambda sample: sample["latency"]
+}
+
+
+def config_label(config: dict) -> str:
+    """Kurze Bezeichnung einer Konfiguration für Tabellen, z. B. "T=0.3 max=50 stop=ja"."""
+    parts = [f"T={config['temperature']}", f"max={config['max_new_tokens']}"]
+    if "stop" in config:
+        parts.append(f"stop={'ja' if config['stop'] else 'nein'}")
+    return " ".join(parts)
+
+
+def summarize_config(config: dict, samples: list[dict], objective: str) -> dict:
+    """Kennzahlen einer Konfiguration aus ihren bisherigen Messungen."""
+    values = [OBJECTIVES[objective](sample) for sample in samples]
+    toxicity = [sample["toxicity"] for sample in samples if sample.get("toxicity") is not None]
+    return {
+        **config,
+        "config": config_label(config),
+        "n_samples": len(samples),
+        "objective": percentile(values, 50),
+        "latency_sec": percentile([sample["latency"] for sample in samples], 50),
+        "output_tokens": percentile([sample["output_tokens"] for sample in samples], 50),
+        "toxicity": mean(toxicity) if toxicity else None,
+        "response_text": samples[-1]["response_text"] if samples else None
+    }
+
+
+def successive_halving(
+    configs: list[dict],
+    measure: Callable[[dict], dict],
+    objective: str = "latency_per_token",
+    score_toxicity: Callable[[list[str]], list[float]] = None,
+    toxicity_ceiling: float = None,
+    initial_samples: int = 2,
+    max_samples: int = 16,
+    eta: int = 2
+) -> dict:
+    """
+    Sucht die beste Konfiguration mit möglichst wenigen Aufrufen.
+
+    Parameter:
+      - configs: Parameter-Sets, z. B. {"temperature": 0.3, "max_new_tokens": 50}
+      - measure: Funktion Konfiguration -> Messung wie measure_llm()
+        (mindestens "latency", "output_tokens", "response_text")
+      - objective: Schlüssel aus OBJECTIVES
+      - score_toxicity: Funktion Antworttexte -> Scores; wird pro Runde einmal
+        für alle neuen Antworten aufgerufen (optional)
+      - toxicity_ceiling: höchste erlaubte mittlere Toxizität (nur mit score_toxicity)
+      - initial_samples: Messungen pro Konfiguration in der ersten Runde
+      - max_samples: höchstens so viele Messungen pro Konfiguration
+      - eta: Faktor, um den die Zahl der Konfigurationen pro Runde sinkt
+
+    Rückgabe:
+      {
+        "rows": [...],           # summarize_config() pro Konfiguration, plus
+                                 # "feasible", "eliminated_round" (None = bis zum Ende dabei)
+        "best": dict | None,     # beste zulässige Zeile
+        "n_calls": int,          # ausgeführte Messungen
+        "grid_calls": int,       # Messungen eines vollen Rasters mit max_samples
+        "rounds": int
+      }
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unbekannte Zielgröße '{objective}' (erwartet: {', '.join(OBJECTIVES)})")
+    if eta < 2 or not 1 <= initial_samples <= max_samples:
+        raise ValueError("Es muss eta >= 2 und 1 <= initial_samples <= max_samples gelten")
+
+    samples: list[list[dict]] = [[] for _ in configs]
+    eliminated: list[int | None] = [None] * len(configs)
+    survivors = list(range(len(configs)))
+    target = initial_samples
+    n_calls = 0
+    round_no = 0
+
+    def feasible(row: dict) -> bool:
+        return toxicity_ceiling is None or row["toxicity"] is None or row["toxicity"] <= toxicity_ceiling
+
+    while True:
+        round_no += 1
+        new_samples = []
+        for index in survivors:
+            while len(samples[index]) < target:
+                sample = dict(measure(configs[index]))
+                samples[index].append(sample)
+                new_samples.append(sample)
+                n_calls += 1
+        if score_toxicity is not None and new_samples:
+            for sample, score in zip(new_samples, score_toxicity([s["response_text"] for s in new_samples])):
+                sample["toxicity"] = score
+
+        if len(survivors) == 1 or target >= max_samples:
+            break
+        # Zulässige zuerst, dann nach Zielgröße
+        summaries = {i: summarize_config(configs[i], samples[i], objective) for i in survivors}
+        ranked = sorted(survivors, key=lambda i: (not feasible(summaries[i]), summaries[i]["objective"]))
+        keep = max(1, math.ceil(len(ranked) / eta))
+        for index in ranked[keep:]:
+            eliminated[index] = round_no
+        survivors = ranked[:keep]
+        target = min(max_samples, target * eta)
+
+    rows = []
+    for index, config in enumerate(configs):
+        row = summarize_config(config, samples[index], objective)
+        row["feasible"] = feasible(row)
+        row["eliminated_round"] = eliminated[index]
+        rows.append(row)
+    finalists = [row for row in rows if row["eliminated_round"] is None and row["feasible"]]
+    return {
+        "rows": rows,
+        "best": min(finalists, key=lambda row: row["objective"]) if finalists else None,
+        "n_calls": n_calls,
+        "grid_calls": len(configs) * max_samples,
+        "rounds": round_no
+    }
+
+
+def pareto_front(rows: list[dict], criteria: list[tuple[str, bool]]) -> list[dict]:
+    """
+    Nicht dominierte Zeilen.
+
+    Parameter:
+      - rows: Zeilen mit den Kriterien als Schlüssel (None-Werte werden übersprungen)
+      - criteria: [(Schlüssel, True = kleiner ist besser / False = größer ist besser)]
+
+    Eine Zeile dominiert eine andere, wenn sie in keinem Kriterium schlechter
+    und in mindestens einem besser ist.
+    """
+    candidates = [row for row in rows if all(row.get(key) is not None for key, _ in criteria)]
+    oriented = [tuple(row[key] if minimize else -row[key] for key, minimize in criteria) for row in candidates]
+
+    def dominates(a: tuple, b: tuple) -> bool:
+        return all(x <= y for x, y in zip(a, b)) and any(x < y for x, y in zip(a, b))
+
+    return [
+        row for row, point in zip(candidates, oriented)
+        if not any(dominates(other, point) for other in oriented)
+    ]
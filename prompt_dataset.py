@@ -0,0 +1,142 @@
+import os
+import csv
+import json
+import argparse
+from itertools import islice
+from typing import Iterable, Iterator
+
+# --------------------------------------------------------
+# Prompt-Datensätze streamen
+#    - Liest Prompts lazy aus .jsonl, .csv, .txt (ein Prompt pro Zeile) oder
+#      .parquet; im Speicher liegt immer nur der aktuelle Datensatz bzw. Batch
+#    - Deterministisches Sharding "Shard i von n": mehrere Prozesse oder Rechner
+#      bearbeiten disjunkte Teile derselben Datei, zusammen genau einmal alles;
+#      Datensatz Nr. k gehört zu Shard k % n (Parquet wird dabei Row-Group für
+#      Row-Group gelesen, im Speicher liegt höchstens eine Row-Group)
+#    - Optional wird ein Template (PromptTemplate oder str mit {Feldern}) beim
+#      Lesen auf jeden Datensatz angewendet
+#    Parquet benötigt pyarrow (pip install pyarrow).
+# --------------------------------------------------------
+FORMATS = (".jsonl", ".csv", ".txt", ".parquet")
+
+
+def parse_shard(spec: str) -> tuple[int, int]:
+    """"i/n" -> (i, n), z. B. "0/4" für den ersten von vier Shards."""
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard '{spec}' hat nicht die Form i/n") from None
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard '{spec}': erwartet 0 <= i < n")
+    return index, count
+
+
+def shard(records: Iterable, index: int = 0, count: int = 1) -> Iterator:
+    """Jeder count-te Datensatz ab Position index (Round-Robin)."""
+    return islice(records, index, None, count)
+
+
+def _read_jsonl(path: str, text_field: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                # Zeilen dürfen auch reine JSON-Strings sein
+                yield record if isinstance(record, dict) else {text_field: record}
+
+
+def _read_csv(path: str, text_field: str) -> Iterator[dict]:
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+def _read_txt(path: str, text_field: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield {text_field: line.rstrip("\n")}
+
+
+def _read_parquet_shard(path: str, index: int, count: int) -> Iterator[tuple[int, dict]]:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError(
+            "Für Parquet-Prompts wird pyarrow benötigt:\n"
+            "   pip install pyarrow"
+        ) from e
+    parquet_file = pq.ParquetFile(path)
+    offset = 0
+    for group in range(parquet_file.num_row_groups):
+        # Eine Row-Group nach der anderen lesen, aber wie bei den Text-Formaten nach
+        # globaler Zeilennummer verteilen: Dateien mit nur einer Row-Group sind häufig
+        table = parquet_file.read_row_group(group)
+        rows = range((index - offset) % count, table.num_rows, count)
+        if rows:
+            yield from zip((offset + row for row in rows), table.take(pa.array(rows)).to_pylist())
+        offset += table.num_rows
+
+
+def load_prompts(
+    path: str,
+    shard_index: int = 0,
+    shard_count: int = 1,
+    template=None,
+    text_field: str = "prompt",
+    limit: int = None
+) -> Iterator[dict]:
+    """
+    Streamt die Datensätze einer Prompt-Datei.
+
+    Parameter:
+      - path: .jsonl, .csv, .txt oder .parquet
+      - shard_index, shard_count: nur Shard shard_index von shard_count liefern
+      - template: PromptTemplate oder str; wird mit den Feldern des Datensatzes
+        formatiert (template.format(**datensatz)), das Ergebnis ist der Prompt
+      - text_field: Feld mit dem Prompt-Text (ohne Template)
+      - limit: höchstens so viele Prompts dieses Shards
+
+    Rückgabe: Iterator über dicts mit allen Feldern des Datensatzes sowie
+      "id" (Feld "id" der Datei, sonst Position in der Datei) und "prompt"
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unbekanntes Format '{extension}' (erwartet: {', '.join(FORMATS)})")
+
+    if extension == ".parquet":
+        records = _read_parquet_shard(path, shard_index, shard_count)
+    else:
+        reader = {".jsonl": _read_jsonl, ".csv": _read_csv, ".txt": _read_txt}[extension]
+        records = shard(enumerate(reader(path, text_field)), shard_index, shard_count)
+
+    def prompts() -> Iterator[dict]:
+        for position, record in records:
+            prompt = template.format(**record) if template is not None else record[text_field]
+            yield {**record, "id": record.get("id", position), "prompt": prompt}
+
+    return islice(prompts(), limit)
+
+
+def add_dataset_arguments(parser: argparse.ArgumentParser):
+    """Optionen --prompts, --shard, --limit und --text-field für die Skripte."""
+    parser.add_argument(
+        "--prompts", default=None, metavar="DATEI",
+        help="Prompts aus .jsonl/.csv/.txt/.parquet streamen statt der eingebauten Liste"
+    )
+    parser.add_argument(
+        "--shard", default="0/1", metavar="I/N",
+        help="nur Shard I von N bearbeiten (0-basiert), z. B. 2/8 für Prozess 3 von 8"
+    )
+    parser.add_argument("--limit", type=int, default=None, help="höchstens so viele Prompts")
+    parser.add_argument("--text-field", default="prompt", help="Feld mit dem Prompt-Text (JSONL/CSV/Parquet)")
+
+
+def prompts_from_args(args: argparse.Namespace, default_prompts: list[str], template=None) -> Iterator[str]:
+    """Prompt-Texte gemäß add_dataset_arguments(); ohne --prompts aus default_prompts."""
+    index, count = parse_shard(args.shard)
+    if args.prompts is not None:
+        records = load_prompts(args.prompts, index, count, template, args.text_field, args.limit)
+        return (record["prompt"] for record in records)
+    texts = islice(shard(default_prompts, index, count), args.limit)
+    return (template.format(**{args.text_field: text}) if template is not None else text for text in texts)
@@ -0,0 +1,376 @@
+import re
+import time
+import random
+import asyncio
+import threading
+from typing import Awaitable, Callable
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+
+# --------------------------------------------------------
+# Rate-Limit-bewusster Scheduler für Endpunkt-Aufrufe
+#    - Ein Token-Bucket pro Modell begrenzt die Senderate
+#    - 429 (und vorübergehende 5xx) werden mit exponentiellem Backoff und
+#      Jitter wiederholt; Retry-After wird dabei respektiert
+#    - Ohne Startrate (Standard) wird nicht gedrosselt, bis der Server
+#      drosselt: der erste 429 startet den Bucket mit der halben bisher
+#      gemessenen Senderate
+#    - Die Rate passt sich an (AIMD): bei Erfolg langsam hoch, bei 429
+#      halbieren; liefern RateLimit-Header Restkontingent und Reset-Zeit,
+#      wird die Rate knapp unter das verbleibende Kontingent gelegt
+#    - Header erfolgreicher Antworten kommen über record_response_headers():
+#      der PooledEndpointClient meldet sie selbst, für huggingface_hub-Clients
+#      installieren die Skripte einmalig install_response_hooks() (opt-in)
+# --------------------------------------------------------
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Header der letzten Antwort im aktuellen Thread bzw. asyncio-Task
+_response_headers: ContextVar[dict | None] = ContextVar("response_headers", default=None)
+_hooks_installed = False
+
+
+class TokenBucket:
+    """
+    Thread-sicherer Token-Bucket.
+
+    Parameter:
+      - rate: nachgefüllte Tokens pro Sekunde (= erlaubte Anfragen/s);
+        None = unbegrenzt, es wird nur die Senderate gemessen
+      - capacity: maximale Anzahl angesparter Tokens (Burst)
+    """
+
+    def __init__(self, rate: float | None, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.started = self.updated
+        self.reserved = 0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        if self.rate is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Reserviert ein Token und liefert die Wartezeit in Sekunden, bis es gilt."""
+        with self.lock:
+            self.reserved += 1
+            if self.rate is None:
+                return 0.0
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def try_acquire(self) -> bool:
+        """Nimmt ein Token, falls sofort eines verfügbar ist; sonst bleibt der Bucket unverändert."""
+        with self.lock:
+            if self.rate is None:
+                return True
+            self._refill(time.monotonic())
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def observed_rate(self) -> float:
+        """Bisherige mittlere Senderate (Reservierungen/s seit dem Anlegen)."""
+        with self.lock:
+            return self.reserved / max(time.monotonic() - self.started, 1e-3)
+
+    def drain(self):
+        """Verwirft angesparte Tokens, z. B. nach einer 429-Antwort."""
+        with self.lock:
+            self.tokens = min(self.tokens, 0.0)
+            self.updated = time.monotonic()
+
+
+def _status_and_headers(exc: Exception) -> tuple[int | None, dict]:
+    """Liest HTTP-Status und Header aus Ausnahmen von requests, httpx, huggingface_hub oder clients.py."""
+    response = getattr(exc, "response", None)
+    if response is not None:
+        status = getattr(response, "status_code", None) or getattr(response, "status", None)
+        return status, dict(getattr(response, "headers", None) or {})
+    return getattr(exc, "status", None), dict(getattr(exc, "headers", None) or {})
+
+
+def parse_retry_after(headers: dict) -> float | None:
+    """Retry-After als Sekunden oder HTTP-Datum; None, falls nicht vorhanden."""
+    value = {k.lower(): v for k, v in headers.items()}.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def parse_rate_limit(headers: dict) -> tuple[int, float] | None:
+    """
+    Liest verbleibendes Kontingent und Sekunden bis zum Reset aus
+    X-RateLimit-Remaining/-Reset, RateLimit-Remaining/-Reset oder dem
+    kombinierten Header "RateLimit: ...;r=<remaining>;t=<seconds>".
+    """
+    lowered = {k.lower(): v for k, v in headers.items()}
+    remaining = lowered.get("x-ratelimit-remaining", lowered.get("ratelimit-remaining"))
+    reset = lowered.get("x-ratelimit-reset", lowered.get("ratelimit-reset"))
+    if remaining is None and "ratelimit" in lowered:
+        r = re.search(r"\br=(\d+)", lowered["ratelimit"])
+        t = re.search(r"\bt=(\d+)", lowered["ratelimit"])
+        remaining, reset = (r.group(1) if r else None), (t.group(1) if t else None)
+    if remaining is None or reset is None:
+        return None
+    try:
+        remaining, reset = int(remaining), float(reset)
+    except ValueError:
+        return None
+    if reset > 1e9:
+        # Zeitstempel statt Sekunden bis zum Reset
+        reset = reset - time.time()
+    return remaining, max(reset, 1.0)
+
+
+def record_response_headers(headers) -> None:
+    """Merkt die Header einer erfolgreichen Antwort für den laufenden call_timed()-Aufruf."""
+    _response_headers.set(dict(headers or {}))
+
+
+def install_response_hooks() -> bool:
+    """
+    Meldet die Header aller Antworten von huggingface_hub (InferenceClient,
+    AsyncInferenceClient, HuggingFaceEndpoint) an record_response_headers().
+
+    Opt-in: ersetzt die prozessweiten Client-Factories von huggingface_hub und
+    wird deshalb einmal im Skript aufgerufen, nicht vom Scheduler. Die Factories
+    stammen aus dem privaten Modul huggingface_hub.utils._http; fehlt dort etwas
+    (andere Version), bleibt alles unverändert und der Scheduler arbeitet ohne
+    Header nur mit AIMD. Unterstützt die requests- (huggingface_hub < 1.0) und
+    httpx-Backends (>= 1.0); der aiohttp-Client von AsyncInferenceClient < 1.0
+    bietet keinen Hook.
+
+    Rückgabe: True, wenn ein Hook installiert ist
+    """
+    global _hooks_installed
+    if _hooks_installed:
+        return True
+    try:
+        import huggingface_hub
+        from huggingface_hub.utils import _http
+    except ImportError:
+        return False
+
+    def on_response(response, *args, **kwargs):
+        record_response_headers(getattr(response, "headers", None))
+
+    async def on_async_response(response):
+        record_response_headers(getattr(response, "headers", None))
+
+    def available(module, *names) -> bool:
+        return all(callable(getattr(module, name, None)) for name in names)
+
+    try:
+        if available(huggingface_hub, "set_client_factory", "set_async_client_factory") \
+                and available(_http, "default_client_factory", "default_async_client_factory"):
+            # huggingface_hub >= 1.0: httpx-Clients mit Event-Hooks
+            def client_factory():
+                client = _http.default_client_factory()
+                client.event_hooks["response"].append(on_response)
+                return client
+
+            def async_client_factory():
+                client = _http.default_async_client_factory()
+                client.event_hooks["response"].append(on_async_response)
+                return client
+
+            # Vorab prüfen, ob die Clients Event-Hooks haben, bevor global etwas ersetzt wird
+            client_factory().close()
+            huggingface_hub.set_client_factory(client_factory)
+            huggingface_hub.set_async_client_factory(async_client_factory)
+        elif available(huggingface_hub, "configure_http_backend") and available(_http, "_default_backend_factory"):
+            # huggingface_hub < 1.0: requests-Session pro Thread mit Response-Hook
+            def backend_factory():
+                session = _http._default_backend_factory()
+                session.hooks["response"].append(on_response)
+                return session
+
+            backend_factory().close()
+            huggingface_hub.configure_http_backend(backend_factory=backend_factory)
+        else:
+            return False
+    except (AttributeError, KeyError, TypeError):
+        # Unerwartete Struktur der Clients: ohne Hook weiter (nur AIMD)
+        return False
+    _hooks_installed = True
+    return True
+
+
+class RateLimitedScheduler:
+    """
+    Sendet Endpunkt-Aufrufe über je einen Token-Bucket pro Modell.
+
+    Parameter:
+      - rate: anfängliche Rate pro Modell (Anfragen/s); None = ungedrosselt bis
+        zum ersten 429 oder bis RateLimit-Header ein Kontingent melden
+      - burst: Größe des Token-Buckets
+      - min_rate, max_rate: Grenzen der adaptiven Rate
+      - max_retries: Wiederholungen bei 429 / vorübergehenden 5xx-Fehlern
+      - base_delay, max_delay: Grenzen des exponentiellen Backoffs (Sekunden)
+      - headroom: Anteil des gemeldeten Restkontingents, der genutzt wird (< 1)
+    """
+
+    def __init__(
+        self,
+        rate: float = None,
+        burst: float = 4.0,
+        min_rate: float = 0.1,
+        max_rate: float = 50.0,
+        max_retries: int = 6,
+        base_delay: float = 0.5,
+        max_delay: float = 60.0,
+        headroom: float = 0.9
+    ):
+        self.initial_rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.headroom = headroom
+        self.buckets: dict[str, TokenBucket] = {}
+        self.stats: dict[str, dict] = {}
+        # Schritt der additiven Erhöhung pro Modell (5 % der Startrate)
+        self.steps: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def _bucket(self, model: str) -> TokenBucket:
+        with self.lock:
+            if model not in self.buckets:
+                self.buckets[model] = TokenBucket(self.initial_rate, self.burst)
+                self.stats[model] = {"calls": 0, "retries": 0, "throttled": 0, "wait_sec": 0.0}
+                if self.initial_rate is not None:
+                    self.steps[model] = 0.05 * self.initial_rate
+            return self.buckets[model]
+
+    def _set_rate(self, model: str, rate: float):
+        bucket = self.buckets[model]
+        bucket.rate = min(self.max_rate, max(self.min_rate, rate))
+        self.steps.setdefault(model, 0.05 * bucket.rate)
+
+    def _on_success(self, model: str, headers: dict):
+        bucket = self.buckets[model]
+        quota = parse_rate_limit(headers)
+        if quota is not None:
+            remaining, reset = quota
+            self._set_rate(model, self.headroom * remaining / reset)
+        elif bucket.rate is not None:
+            # Additive Erhöhung: langsam an die Grenze des Kontingents herantasten
+            bucket.rate = min(self.max_rate, bucket.rate + self.steps[model])
+
+    def _on_failure(self, model: str, exc: Exception, attempt: int) -> float | None:
+        """Liefert die Backoff-Wartezeit oder None, wenn nicht wiederholt werden soll."""
+        status, headers = _status_and_headers(exc)
+        if status not in RETRYABLE_STATUS or attempt >= self.max_retries:
+            return None
+
+        bucket = self.buckets[model]
+        stats = self.stats[model]
+        stats["retries"] += 1
+        if status == 429:
+            # Rate an das gemeldete Kontingent anpassen, sonst multiplikativ senken;
+            # angesparte Tokens verwerfen
+            stats["throttled"] += 1
+            quota = parse_rate_limit(headers)
+            # Ungedrosselt bisher: von der gemessenen Senderate aus starten
+            current = bucket.rate if bucket.rate is not None else bucket.observed_rate()
+            if quota is not None:
+                remaining, reset = quota
+                self._set_rate(model, min(current, self.headroom * remaining / reset))
+            else:
+                self._set_rate(model, current / 2)
+            bucket.drain()
+
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = parse_retry_after(headers)
+        return max(backoff, retry_after) if retry_after is not None else backoff
+
+    def call_timed(self, model: str, fn: Callable[[], object]) -> tuple[object, float]:
+        """
+        Führt fn() über den Token-Bucket des Modells aus und wiederholt bei Drosselung.
+        Header der erfolgreichen Antwort (record_response_headers) passen die Rate an.
+
+        Rückgabe: (Ergebnis von fn, Latenz des erfolgreichen Versuchs in Sekunden)
+          – Wartezeiten im Bucket und im Backoff sind darin nicht enthalten.
+        """
+        bucket = self._bucket(model)
+        self.stats[model]["calls"] += 1
+        attempt = 0
+        while True:
+            wait = bucket.reserve()
+            if wait > 0:
+                self.stats[model]["wait_sec"] += wait
+                time.sleep(wait)
+            _response_headers.set(None)
+            start = time.perf_counter()
+            try:
+                result = fn()
+            except Exception as exc:
+                delay = self._on_failure(model, exc, attempt)
+                if delay is None:
+                    raise
+                self.stats[model]["wait_sec"] += delay
+                time.sleep(delay)
+                attempt += 1
+                continue
+            latency = time.perf_counter() - start
+            self._on_success(model, _response_headers.get() or {})
+            return result, latency
+
+    def call(self, model: str, fn: Callable[[], object]) -> object:
+        """Wie call_timed(), liefert aber nur das Ergebnis."""
+        return self.call_timed(model, fn)[0]
+
+    async def acall_timed(self, model: str, fn: Callable[[], Awaitable[object]]) -> tuple[object, float]:
+        """Asynchrone Variante von call_timed() für Koroutinen (z. B. AsyncInferenceClient)."""
+        bucket = self._bucket(model)
+        self.stats[model]["calls"] += 1
+        attempt = 0
+        while True:
+            wait = bucket.reserve()
+            if wait > 0:
+                self.stats[model]["wait_sec"] += wait
+                await asyncio.sleep(wait)
+            _response_headers.set(None)
+            start = time.perf_counter()
+            try:
+                result = await fn()
+            except Exception as exc:
+                delay = self._on_failure(model, exc, attempt)
+                if delay is None:
+                    raise
+                self.stats[model]["wait_sec"] += delay
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            latency = time.perf_counter() - start
+            self._on_success(model, _response_headers.get() or {})
+            return result, latency
+
+    def _rate_text(self, model: str) -> str:
+        rate = self.buckets[model].rate
+        return "ungedrosselt" if rate is None else f"{rate:.2f}/s"
+
+    def summary(self) -> str:
+        """Kurzer Bericht pro Modell: Aufrufe, Wiederholungen, 429, Wartezeit, aktuelle Rate."""
+        lines = []
+        for model, stats in self.stats.items():
+            lines.append(
+                f"{model}: {stats['calls']} Aufrufe, {stats['retries']} Wiederholungen, "
+                f"{stats['throttled']}x 429, {stats['wait_sec']:.1f} s gewartet, "
+                f"Rate jetzt {self._rate_text(model)}"
+            )
+        return "\n".join(lines)
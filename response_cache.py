@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from typing import Callable
+
+# --------------------------------------------------------
+# Persistenter Antwort-Cache (inhaltsadressiert, LRU-begrenzt)
+#    - Schlüssel: SHA-256 über (Modell, Prompt, temperature, max_new_tokens, stop)
+#    - Ablage in einer SQLite-Datei; bei Überschreiten von max_bytes werden
+#      die am längsten nicht genutzten Einträge entfernt
+#    - Im Replay-Modus werden Antworten ausschließlich aus dem Cache gelesen,
+#      sodass Token-Zählung und Toxizitätsmessung ohne Netzwerk laufen
+# --------------------------------------------------------
+DEFAULT_CACHE_PATH = os.path.join(".cache", "llm_responses.sqlite")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def cache_key(
+    model: str,
+    prompt: str,
+    temperature: float = None,
+    max_new_tokens: int = None,
+    stop: list[str] = None
+) -> str:
+    """Bildet den Cache-Schlüssel als SHA-256 über die kanonische JSON-Form der Eingaben."""
+    payload = json.dumps(
+        {
+            "model": model,
+            "prompt": prompt,
+            "temperature": temperature,
+            "max_new_tokens": max_new_tokens,
+            "stop": list(stop) if stop else None
+        },
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-basierter Cache für LLM-Antworten mit LRU-Verdrängung.
+
+    Parameter:
+      - path: Pfad zur SQLite-Datei (Verzeichnis wird bei Bedarf angelegt)
+      - max_bytes: Obergrenze für die Summe der gespeicherten Antworttexte
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response_text TEXT NOT NULL,
+                latency REAL NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self.conn.commit()
+
+    def get(self, key: str) -> dict | None:
+        """Liefert {"response_text", "latency"} oder None und markiert den Eintrag als benutzt."""
+        row = self.conn.execute(
+            "SELECT response_text, latency FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        self.conn.commit()
+        return {"response_text": row[0], "latency": row[1]}
+
+    def put(self, key: str, response_text: str, latency: float):
+        """Speichert eine Antwort samt gemessener Live-Latenz und verdrängt ggf. alte Einträge."""
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+            (key, response_text, latency, len(response_text.encode("utf-8")), now, now)
+        )
+        self._evict()
+        self.conn.commit()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+
+    def close(self):
+        self.conn.close()
+
+
+def cached_generate(
+    cache: ResponseCache,
+    key: str,
+    generate: Callable[[], tuple[str, float]],
+    replay: bool = False
+) -> dict:
+    """
+    Holt eine Antwort live (und legt sie im Cache ab) oder im Replay-Modus aus dem Cache.
+
+    Parameter:
+      - cache: ResponseCache-Instanz
+      - key: Schlüssel aus cache_key()
+      - generate: Funktion ohne Argumente, die den eigentlichen LLM-Aufruf ausführt
+        und (text, latency) liefert, z. B. RateLimitedScheduler.call_timed (Latenz
+        ohne Warte- und Backoff-Zeiten)
+      - replay: True = nur Cache lesen, kein Netzwerkaufruf
+
+    Rückgabe:
+      {
+        "response_text": str,
+        "latency": float,   # live gemessen bzw. beim Live-Lauf gespeicherte Latenz
+        "source": str       # "live" oder "replay"
+      }
+    """
+    if replay:
+        entry = cache.get(key)
+        if entry is None:
+            raise KeyError(f"Kein Cache-Eintrag für Schlüssel {key[:12]}… (Replay-Modus ohne Netzwerk)")
+        return {**entry, "source": "replay"}
+
+    response_text, latency = generate()
+    cache.put(key, response_text, latency)
+    return {"response_text": response_text, "latency": latency, "source": "live"}
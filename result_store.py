@@ -0,0 +1,211 @@
+import os
+import time
+import uuid
+from typing import Iterator
+
+# --------------------------------------------------------
+# Spaltenorientierter Ergebnisspeicher (Parquet-Dataset)
+#    - Zeilen werden gepuffert und alle row_group_size Zeilen als eigene
+#      Parquet-Datei (eine Row-Group) in das Dataset-Verzeichnis geschrieben;
+#      das Dataset wächst nur durch Anhängen
+#    - Bei einem Absturz geht höchstens der aktuelle Puffer verloren, alle
+#      geschriebenen Teile sind vollständige Parquet-Dateien
+#    - Festes, typisiertes Schema: Latenz, Tokenzahlen, Kosten und ein Score
+#      pro Toxizitäts-Label (Spalten tox_<label>)
+#    - Auswertung liest das Dataset lazy in Batches und nur die benötigten
+#      Spalten; der Speicherbedarf hängt nicht von der Zeilenzahl ab
+#    Benötigt pyarrow (pip install pyarrow).
+# --------------------------------------------------------
+DEFAULT_ROW_GROUP_SIZE = 1024
+
+# Labels von unitary/toxic-bert
+TOX_LABELS = ("toxic", "severe_toxic", "obscene", "threat", "insult", "identity_hate")
+
+# (Spaltenname, pyarrow-Typ); fehlende Werte werden als null gespeichert
+RESULT_FIELDS = [
+    ("run_id", "string"),
+    ("created_at", "float64"),
+    ("model", "string"),
+    ("prompt", "string"),
+    ("temperature", "float32"),
+    ("max_new_tokens", "int32"),
+    ("latency_sec", "float64"),
+    ("latency_source", "string"),
+    ("input_tokens", "int32"),
+    ("output_tokens", "int32"),
+    ("token_source", "string"),
+    ("cost_usd", "float64"),
+    ("response_text", "string"),
+    *[(f"tox_{label}", "float32") for label in TOX_LABELS]
+]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.dataset
+    except ImportError as e:
+        raise ImportError(
+            "Für den Ergebnisspeicher wird pyarrow benötigt:\n"
+            "   pip install pyarrow"
+        ) from e
+    return pyarrow
+
+
+def result_schema(extra_fields: list[tuple[str, str]] = None):
+    """pyarrow-Schema aus RESULT_FIELDS plus optionalen Zusatzspalten, z. B. [("ttft_sec", "float64")]."""
+    pa = _pyarrow()
+    return pa.schema([(name, getattr(pa, type_name)()) for name, type_name in RESULT_FIELDS + (extra_fields or [])])
+
+
+class ResultStore:
+    """
+    Schreibt Ergebniszeilen gepuffert in ein Parquet-Dataset.
+
+    Parameter:
+      - path: Verzeichnis des Datasets (wird bei Bedarf angelegt)
+      - row_group_size: Zeilen pro geschriebener Datei / Row-Group
+      - extra_fields: zusätzliche (Name, pyarrow-Typ)-Spalten des Skripts
+      - run_id: Kennung des Laufs (Standard: Zeitstempel + Zufallsanteil)
+
+    Zeilen sind dicts mit Schlüsseln aus dem Schema; Toxizitäts-Scores können als
+    "toxicity_scores": {label: score} übergeben werden. Unbekannte Schlüssel werden ignoriert.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+        extra_fields: list[tuple[str, str]] = None,
+        run_id: str = None
+    ):
+        self.pa = _pyarrow()
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.row_group_size = row_group_size
+        self.schema = result_schema(extra_fields)
+        self.run_id = run_id or time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:6]
+        self.n_rows = 0
+        self._parts = 0
+        self._buffer: dict[str, list] = {name: [] for name in self.schema.names}
+
+    def append(self, row: dict):
+        """Puffert eine Zeile; bei vollem Puffer wird eine Row-Group geschrieben."""
+        values = dict(row)
+        for label, score in (values.pop("toxicity_scores", None) or {}).items():
+            values[f"tox_{label}"] = score
+        values.setdefault("run_id", self.run_id)
+        values.setdefault("created_at", time.time())
+        for name, column in self._buffer.items():
+            column.append(values.get(name))
+        if len(self._buffer["run_id"]) >= self.row_group_size:
+            self.flush()
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def flush(self):
+        """Schreibt den Puffer als neue, vollständige Parquet-Datei."""
+        n = len(self._buffer["run_id"])
+        if n == 0:
+            return
+        table = self.pa.Table.from_pydict(self._buffer, schema=self.schema)
+        name = f"part-{self.run_id}-{self._parts:05d}.parquet"
+        part = os.path.join(self.path, name)
+        # Erst unter temporärem Namen schreiben: Dateien mit "_" am Anfang ignoriert
+        # der Dataset-Leser, er sieht also nie halbe Dateien
+        temporary = os.path.join(self.path, "_" + name + ".tmp")
+        self.pa.parquet.write_table(table, temporary, row_group_size=n)
+        os.replace(temporary, part)
+        self._parts += 1
+        self.n_rows += n
+        self._buffer = {name: [] for name in self.schema.names}
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def scan(path: str, columns: list[str] = None, filter=None, batch_size: int = 65_536) -> Iterator:
+    """
+    Liest das Dataset lazy als pyarrow.RecordBatch-Folge.
+
+    Parameter:
+      - path: Verzeichnis des Datasets
+      - columns: nur diese Spalten lesen (Projektion)
+      - filter: pyarrow.compute-Ausdruck, z. B. pc.field("model") == "microsoft/phi-4"
+      - batch_size: maximale Zeilen pro Batch
+
+    Ein fehlendes oder leeres Verzeichnis liefert keine Batches.
+    """
+    pa = _pyarrow()
+    if not os.path.isdir(path):
+        return
+    dataset = pa.dataset.dataset(path, format="parquet")
+    if not dataset.files:
+        # Ohne Part-Dateien hat das Dataset kein Schema, die Projektion würde fehlschlagen
+        return
+    yield from dataset.to_batches(columns=columns, filter=filter, batch_size=batch_size)
+
+
+def group_means(path: str, group_by: str, columns: list[str], filter=None) -> dict[str, dict[str, float]]:
+    """
+    Mittelwerte pro Gruppe, batchweise berechnet (nur Summen und Anzahlen im Speicher).
+
+    Rückgabe: {Gruppe: {"n": Zeilen, Spalte: Mittelwert, ...}}; null-Werte zählen nicht mit
+    """
+    pa = _pyarrow()
+    sums: dict[str, dict[str, float]] = {}
+    counts: dict[str, dict[str, int]] = {}
+    rows: dict[str, int] = {}
+    for batch in scan(path, columns=[group_by, *columns], filter=filter):
+        table = pa.Table.from_batches([batch])
+        aggregated = table.group_by(group_by).aggregate(
+            [([], "count_all")] + [(c, "sum") for c in columns] + [(c, "count") for c in columns]
+        ).to_pylist()
+        for entry in aggregated:
+            key = entry[group_by]
+            rows[key] = rows.get(key, 0) + entry["count_all"]
+            group_sums = sums.setdefault(key, dict.fromkeys(columns, 0.0))
+            group_counts = counts.setdefault(key, dict.fromkeys(columns, 0))
+            for c in columns:
+                group_sums[c] += entry[f"{c}_sum"] or 0.0
+                group_counts[c] += entry[f"{c}_count"]
+    return {
+        key: {"n": rows[key], **{c: sums[key][c] / counts[key][c] if counts[key][c] else None for c in columns}}
+        for key in rows
+    }
+
+
+def format_group_means(means: dict[str, dict[str, float]], group_by: str) -> str:
+    """Konsolentabelle zu group_means()."""
+    if not means:
+        return "(keine Zeilen)"
+    columns = list(next(iter(means.values())).keys())
+    width = max(len(group_by), *(len(str(key)) for key in means))
+    lines = [f"{group_by:<{width}}  " + "  ".join(f"{c:>14}" for c in columns)]
+    for key, values in means.items():
+        cells = [
+            f"{values[c]:>14.4f}" if isinstance(values[c], float) else f"{str(values[c]):>14}"
+            for c in columns
+        ]
+        lines.append(f"{str(key):<{width}}  " + "  ".join(cells))
+    return "\n".join(lines)
+
+
+def list_runs(path: str) -> list[tuple[str, int, float]]:
+    """Läufe im Dataset als (run_id, Zeilen, Startzeit), ältester zuerst."""
+    runs: dict[str, list] = {}
+    for batch in scan(path, columns=["run_id", "created_at"]):
+        for run_id, created_at in zip(batch.column("run_id").to_pylist(), batch.column("created_at").to_pylist()):
+            entry = runs.setdefault(run_id, [0, created_at])
+            entry[0] += 1
+            entry[1] = min(entry[1], created_at)
+    return sorted(((run_id, n, started) for run_id, (n, started) in runs.items()), key=lambda run: run[2])
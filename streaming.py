@@ -0,0 +1,67 @@
+import time
+from typing import Callable
+
+from huggingface_hub import InferenceClient
+
+from latency_stats import mean, percentile
+
+
+# --------------------------------------------------------
+# Streaming-Messung: Time-to-first-token und Inter-Token-Latenz
+#    - Nutzt text_generation(..., stream=True) des InferenceClient
+#    - Funktioniert gegen echte Endpunkte und gegen mock_server.py
+# --------------------------------------------------------
+def measure_llm_stream(
+    client: InferenceClient,
+    prompt: str,
+    params: dict,
+    count_tokens: Callable[[str], int],
+    stop_sequences: list[str] = None
+) -> dict:
+    """
+    Führt einen gestreamten LLM-Aufruf aus und misst dabei:
+      - die Gesamtlatenz in Sekunden
+      - die Zeit bis zum ersten Token (TTFT)
+      - die Abstände zwischen aufeinanderfolgenden Tokens (Mittel, p50, p95)
+      - die Decode-Rate in Tokens pro Sekunde (nach dem ersten Token)
+
+    Parameter:
+      - client: InferenceClient für das Modell bzw. die Endpunkt-URL
+      - prompt: der fertige Prompt-String
+      - params: Generierungsparameter, z. B. {"temperature": 0.1, "max_new_tokens": 50}
+      - count_tokens: Funktion zum Zählen der Tokens (z. B. main.count_tokens)
+      - stop_sequences: Liste von Stoppsequenzen (optional)
+
+    Rückgabe: die Felder von measure_llm() plus
+      "ttft", "itl_mean", "itl_p50", "itl_p95", "tokens_per_sec", "stream_tokens"
+    """
+    generation_kwargs = dict(params)
+    if stop_sequences:
+        generation_kwargs["stop"] = stop_sequences
+
+    chunks = []
+    arrival_times = []
+
+    start = time.perf_counter()
+    for chunk in client.text_generation(prompt, stream=True, **generation_kwargs):
+        arrival_times.append(time.perf_counter())
+        chunks.append(chunk)
+    latency = time.perf_counter() - start
+
+    generated_text = "".join(chunks)
+    gaps = [b - a for a, b in zip(arrival_times, arrival_times[1:])]
+    ttft = arrival_times[0] - start if arrival_times else latency
+    decode_time = arrival_times[-1] - arrival_times[0] if len(arrival_times) > 1 else 0.0
+
+    return {
+        "latency": latency,
+        "input_tokens": count_tokens(prompt),
+        "output_tokens": count_tokens(generated_text),
+        "response_text": generated_text,
+        "ttft": ttft,
+        "itl_mean": mean(gaps),
+        "itl_p50": percentile(gaps, 50),
+        "itl_p95": percentile(gaps, 95),
+        "tokens_per_sec": len(gaps) / decode_time if decode_time > 0 else 0.0,
+        "stream_tokens": len(chunks)
+    }
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from typing import Callable
+
+from huggingface_hub import AsyncInferenceClient
+
+from token_accounting import TokenAccountant, extract_usage
+from ratelimit import RateLimitedScheduler
+
+
+# --------------------------------------------------------
+# 1) Asynchroner LLM-Aufruf mit Latenz- und Token-Messung
+#    - Gegenstück zu measure_llm() in main.py, aber nicht blockierend
+# --------------------------------------------------------
+async def async_measure_llm(
+    client: AsyncInferenceClient,
+    prompt: str,
+    params: dict,
+    count_tokens: Callable[[str], int] = None,
+    stop_sequences: list[str] = None
+) -> dict:
+    """
+    Führt einen asynchronen text-generation-Aufruf aus und misst dabei
+    die Latenz sowie die Anzahl der Input- und Output-Tokens.
+
+    Parameter:
+      - client: AsyncInferenceClient für das zu testende Modell
+      - prompt: der fertige Prompt-String
+      - params: Generierungsparameter, z. B. {"temperature": 0.1, "max_new_tokens": 50}
+      - count_tokens: Funktion zum Zählen der Tokens (z. B. main.count_tokens);
+        ohne Funktion sind input_tokens/output_tokens None
+      - stop_sequences: Liste von Stoppsequenzen (optional)
+
+    Rückgabe: dasselbe Dict-Format wie measure_llm() in main.py
+    """
+    generation_kwargs = dict(params)
+    if stop_sequences:
+        generation_kwargs["stop"] = stop_sequences
+
+    # Latenz messen (perf_counter ist monoton und hochauflösend)
+    start = time.perf_counter()
+    generated_text = await client.text_generation(prompt, **generation_kwargs)
+    latency = time.perf_counter() - start
+
+    return {
+        "latency": latency,
+        "input_tokens": count_tokens(prompt) if count_tokens else None,
+        "output_tokens": count_tokens(generated_text) if count_tokens else None,
+        "response_text": generated_text
+    }
+
+
+# --------------------------------------------------------
+# 2) Sweep über das Raster Prompts × Parameter-Sets
+#    - Ein Semaphore begrenzt die Anzahl gleichzeitiger Anfragen
+# --------------------------------------------------------
+async def run_sweep(
+    client: AsyncInferenceClient,
+    prompts: list[str],
+    parameter_list: list[dict],
+    accountant: TokenAccountant,
+    concurrency: int = 8,
+    stop_sequences: list[str] = None,
+    scheduler: RateLimitedScheduler = None
+) -> tuple[list[dict], dict]:
+    """
+    Führt alle Kombinationen aus Prompts und Parameter-Sets nebenläufig aus.
+
+    Parameter:
+      - client: AsyncInferenceClient für das zu testende Modell
+      - prompts: Liste fertiger Prompt-Strings
+      - parameter_list: Liste von Generierungsparametern (wie in main.py)
+      - accountant: TokenAccountant; Tokenzahlen kommen aus den Server-Details,
+        fehlende werden nach dem Sweep in einem Batch gezählt, nicht pro Anfrage
+      - concurrency: maximale Anzahl gleichzeitig laufender Anfragen
+      - stop_sequences: Liste von Stoppsequenzen (optional)
+      - scheduler: RateLimitedScheduler für Drosselung und 429-Backoff (optional);
+        die Latenz umfasst dann nur den erfolgreichen Versuch
+
+    Rückgabe:
+      (results, summary)
+        - results: eine Zeile pro Rasterzelle, in Rasterreihenfolge
+        - summary: {"n_requests", "wall_time_sec", "requests_per_sec"}
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency muss mindestens 1 sein")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    generation_stop = {"stop": stop_sequences} if stop_sequences else {}
+    model_name = client.model or "default"
+
+    async def run_cell(prompt: str, params: dict) -> dict:
+        async with semaphore:
+            # details=True: der Server meldet die Anzahl generierter Tokens mit
+            if scheduler is not None:
+                output, latency = await scheduler.acall_timed(
+                    model_name,
+                    lambda: client.text_generation(prompt, details=True, **params, **generation_stop)
+                )
+            else:
+                start = time.perf_counter()
+                output = await client.text_generation(prompt, details=True, **params, **generation_stop)
+                latency = time.perf_counter() - start
+        # Ohne Details-Unterstützung liefert der Client nur den Text
+        generated_text = output if isinstance(output, str) else output.generated_text
+        return {
+            "prompt": prompt,
+            "temperature": params["temperature"],
+            "max_new_tokens": params["max_new_tokens"],
+            "latency_sec": round(latency, 3),
+            "response_text": generated_text,
+            "usage": extract_usage(output)
+        }
+
+    cells = [(prompt, params) for prompt in prompts for params in parameter_list]
+
+    # Gesamtdauer des Sweeps messen; gather() erhält die Rasterreihenfolge
+    start = time.perf_counter()
+    results = list(await asyncio.gather(*(run_cell(p, params) for p, params in cells)))
+    wall_time = time.perf_counter() - start
+
+    # Fehlende Tokenzahlen erst nach dem Sweep zählen: ein Batch-Aufruf statt einer Zählung pro Anfrage
+    accounting = accountant.account_many(
+        model_name,
+        [row["prompt"] for row in results],
+        [row["response_text"] for row in results],
+        [row.pop("usage") for row in results]
+    )
+    for row, entry in zip(results, accounting):
+        row.update(entry)
+
+    summary = {
+        "n_requests": len(results),
+        "wall_time_sec": round(wall_time, 3),
+        "requests_per_sec": round(len(results) / wall_time, 3) if wall_time > 0 else 0.0
+    }
+    return results, summary
@@ -1,17 +1,23 @@
 import os
-import time
+import argparse
 import pandas as pd
 from dotenv import load_dotenv
 
-from transformers import (
-    AutoTokenizer,
-    Pipeline,
-    TextClassificationPipeline,
-    AutoModelForSequenceClassification
-)
 from langchain_huggingface import HuggingFaceEndpoint
 from langchain_core.prompts import PromptTemplate
 
+from response_cache import ResponseCache, cache_key, cached_generate
+from ratelimit import RateLimitedScheduler, install_response_hooks
+from token_accounting import TokenAccountant, load_prices
+import tracing
+from tracing import span
+from toxicity_parallel import ParallelToxicityScorer
+from toxicity import TOX_BACKENDS, TOX_MODEL_NAME, load_toxicity_pipeline, get_toxicity_scores, label_score
+from toxicity_cache import ToxicityScoreCache, classifier_revision
+from prompt_dataset import add_dataset_arguments, prompts_from_args
+from toxicity_matrix import ToxicityMatrix, format_summary
+from toxicity_guard import format_guard_summary, guarded_stream, toxicity_scorer
+
 # --------------------------------------------------------
 # 1) Umgebung und Token laden
 # --------------------------------------------------------
@@ -21,6 +27,46 @@ if not hf_token:
     raise ValueError("♨️ Kein Token gefunden. Lege eine `.env`-Datei an mit:\n"
                      "   HUGGINGFACEHUB_API_TOKEN=hf_<dein_token>")
 
+# Optional: --replay liest die Antworten aus dem Antwort-Cache statt vom Endpunkt
+parser = argparse.ArgumentParser(description="Toxizitätstest für zephyr-7b-beta")
+parser.add_argument(
+    "--replay", action="store_true",
+    help="Antworten nur aus dem Antwort-Cache lesen (keine Netzwerkaufrufe)"
+)
+parser.add_argument(
+    "--tox-backend", choices=TOX_BACKENDS, default="pytorch",
+    help="Backend des Toxizitätsklassifikators (int8 / onnx beschleunigen die CPU-Auswertung)"
+)
+parser.add_argument(
+    "--tox-workers", type=int, default=1,
+    help="Anzahl Prozesse für das Toxizitäts-Scoring (1 = im Hauptprozess)"
+)
+parser.add_argument(
+    "--trace", default=None, metavar="DATEI",
+    help="Spans als Chrome-Trace und Zusammenfassung pro Phase (DATEI.summary.json) schreiben"
+)
+parser.add_argument(
+    "--store", default=None, metavar="VERZEICHNIS",
+    help="Ergebnisse mit allen Toxizitäts-Labels an ein Parquet-Dataset anhängen"
+)
+parser.add_argument(
+    "--guard", type=float, default=None, metavar="SCHWELLE",
+    help="Antworten streamen und abbrechen, sobald der Toxizitäts-Score die Schwelle erreicht"
+)
+add_dataset_arguments(parser)
+args = parser.parse_args()
+if args.guard is not None and args.replay:
+    parser.error("--guard generiert live und ist nicht mit --replay kombinierbar")
+if args.trace:
+    tracing.enable()
+response_cache = ResponseCache()
+# Drosselt die Aufrufe pro Modell und wiederholt bei 429 mit Backoff
+scheduler = RateLimitedScheduler()
+# RateLimit-Header der huggingface_hub-Antworten mitlesen (einmalig); ohne Hook nur AIMD
+install_response_hooks()
+# Tokens und Kosten pro Antwort (Preise aus prices.json, falls vorhanden)
+accountant = TokenAccountant(load_prices())
+
 # --------------------------------------------------------
 # 2) LLM‐Instanz erstellen (ggf. wie in main.py)
 # --------------------------------------------------------
@@ -39,20 +85,26 @@ llm = HuggingFaceEndpoint(
 # 3) Toxizitäts‐Erkennungspipeline laden
 #    Wir verwenden das vortrainierte Modell "unitary/toxic-bert"
 # --------------------------------------------------------
-tox_model_name = "unitary/toxic-bert"
-
-# Lade Tokenizer+Model
-tox_tokenizer = AutoTokenizer.from_pretrained(tox_model_name)
-tox_model = AutoModelForSequenceClassification.from_pretrained(tox_model_name)
-
-# Erzeuge eine HuggingFace‐Pipeline für „text-classification“
-tox_pipeline: TextClassificationPipeline = TextClassificationPipeline(
-    model=tox_model,
-    tokenizer=tox_tokenizer,
-    return_all_scores=True,         # alle Labels („toxicity“, “severe_toxicity“ etc.) zurückgeben
-    device=-1                       # CPU verwenden; falls CUDA verfügbar ist, nutze device=0
+TOX_BATCH_SIZE = 16
+
+tox_pipeline = load_toxicity_pipeline(device=-1, backend=args.tox_backend)  # CPU verwenden; falls CUDA verfügbar ist, nutze device=0
+
+# Optional: Scoring auf mehrere Prozesse verteilen; die Worker werden direkt nach
+# dem Laden geforkt und teilen sich die Modellgewichte
+tox_scorer = ParallelToxicityScorer(
+    tox_pipeline, n_workers=args.tox_workers, batch_size=TOX_BATCH_SIZE
+) if args.tox_workers > 1 else None
+
+# Bereits bewertete Texte kommen aus dem Score-Cache (.cache/toxicity_scores.sqlite);
+# nur neue Antworten gehen an den Klassifikator
+tox_cache = ToxicityScoreCache(
+    classifier=f"{TOX_MODEL_NAME}:{args.tox_backend}",
+    revision=classifier_revision(tox_pipeline)
 )
 
+# Optional: Wächter, der gestreamte Antworten während der Generierung bewertet
+guard_score = toxicity_scorer(tox_pipeline) if args.guard is not None else None
+
 # --------------------------------------------------------
 # 4) Liste toxischer Prompts definieren
 #    Hier sammeln wir ein paar Beispiele, die das LLM möglicherweise zu toxischen Antworten verleiten
@@ -66,65 +118,147 @@ toxic_prompts = [
 ]
 
 # --------------------------------------------------------
-# 5) Hilfsfunktion: Toxizitäts‐Score ermitteln
-# --------------------------------------------------------
-def get_toxicity_score(text: str) -> float:
-    """
-    Ermittelt den 'toxicity'-Score eines Textes (Wert ∈ [0,1]).
-    Wir nutzen 'unitary/toxic-bert', das mehrere Labels ausgibt.
-    Hier extrahieren wir nur die Kennzahl für 'toxicity'.
-    """
-    results = tox_pipeline(text)
-    # 'results' ist eine Liste von Listen von Dikt-Objekten, z. B.:
-    # [ [{'label': 'toxicity', 'score': 0.02}, {'label': 'severe_toxicity', ...}, ...] ]
-    # Da wir nur einen Text übergeben, liegt alles in results[0].
-    scores = { entry["label"]: entry["score"] for entry in results[0] }
-    # Gib den Score für 'toxicity' zurück; falls nicht vorhanden, 0.0
-    return float(scores.get("toxicity", 0.0))
-
-
-# --------------------------------------------------------
-# 6) PromptTemplate (falls du strukturierte Fragen möchtest)
+# 5) PromptTemplate (falls du strukturierte Fragen möchtest)
 #    → Für unsere toxischen Beispiele nutzen wir reinen Freitext, daher ist hier kein Template nötig.
 # --------------------------------------------------------
 # (Du kannst aber auch eine Vorlage wie in main.py nutzen. Für direkte Beleidigungsprompts ist das nicht nötig.)
 
 # --------------------------------------------------------
-# 7) Schleife: Für jeden toxischen Prompt
+# 6) Schleife: Für jeden toxischen Prompt
 #    1. Antwort vom LLM abholen
-#    2. Toxizitäts‐Score errechnen
+#    2. Toxizitäts‐Scores aller Antworten gemeinsam im Batch errechnen
 #    3. Ergebnisse sammeln
 # --------------------------------------------------------
+def invoke(prompt: str) -> str:
+    with span("network", model=MODEL_ID):
+        return llm.invoke(prompt)
+
+
 results = []
-for prompt_text in toxic_prompts:
-    start = time.time()
-    generated = llm.invoke(prompt_text)   # Antwort vom LLM
-    latency = time.time() - start
+# Ohne --prompts die eingebaute Liste; mit --prompts wird die Datei gestreamt (ggf. nur ein Shard)
+for prompt_text in prompts_from_args(args, toxic_prompts):
+    if args.guard is not None:
+        # Gestreamt generieren und abbrechen, sobald die Antwort toxisch wird;
+        # unvollständige Antworten kommen nicht in den Antwort-Cache
+        guarded = scheduler.call(MODEL_ID, lambda: guarded_stream(
+            llm.stream(prompt_text),
+            guard_score,
+            threshold=args.guard,
+            max_new_tokens=llm.max_new_tokens
+        ))
+        results.append({
+            "prompt": prompt_text,
+            "response": guarded["response_text"],
+            "latency_sec": round(guarded["latency"], 3),
+            "latency_source": "guard",
+            "guard_aborted": guarded["aborted"],
+            "guard_max_score": round(guarded["max_score"], 3),
+            "stream_tokens": guarded["n_tokens"],
+            "tokens_saved_est": guarded["tokens_saved_est"],
+            "time_saved_est": round(guarded["time_saved_est"], 3),
+            "usage": {"input_tokens": None, "output_tokens": guarded["n_tokens"]}
+        })
+        continue
 
-    # Toxizität der generierten Antwort messen
-    tox_score = get_toxicity_score(generated)
+    key = cache_key(
+        model=MODEL_ID,
+        prompt=prompt_text,
+        temperature=llm.temperature,
+        max_new_tokens=llm.max_new_tokens,
+        stop=llm.stop
+    )
+    # Antwort vom LLM (live, mit Ablage im Cache) bzw. aus dem Cache (--replay)
+    generated = cached_generate(
+        response_cache,
+        key,
+        lambda: scheduler.call_timed(MODEL_ID, lambda: invoke(prompt_text)),
+        replay=args.replay
+    )
 
     results.append({
         "prompt": prompt_text,
-        "response": generated,
-        "latency_sec": round(latency, 3),
-        "toxicity_score": round(tox_score, 3)
+        "response": generated["response_text"],
+        "latency_sec": round(generated["latency"], 3),
+        "latency_source": generated["source"]
     })
 
+# Tokens und Kosten: lokal mit dem
+# Tokenizer von MODEL_ID gezählt (einmal geladen, ein Batch-Aufruf)
+accounting = accountant.account_many(
+    MODEL_ID,
+    [row["prompt"] for row in results],
+    [row["response"] for row in results],
+    [row.pop("usage", None) for row in results]
+)
+for row, entry in zip(results, accounting):
+    row.update(entry)
+
+# Toxizität aller generierten Antworten in wenigen Forward-Passes messen
+responses = [row["response"] for row in results]
+tox_scores = tox_cache.scores(
+    responses,
+    tox_scorer.score if tox_scorer
+    else lambda texts: get_toxicity_scores(texts, tox_pipeline, batch_size=TOX_BATCH_SIZE)
+)
+if tox_scorer:
+    tox_scorer.close()
+for row, scores in zip(results, tox_scores):
+    row["toxicity_score"] = round(label_score(scores), 3)
+
+if args.store:
+    # Typisiert und mit den Scores aller Labels ins Parquet-Dataset schreiben
+    from result_store import ResultStore
+    with ResultStore(args.store) as store:
+        for row, scores in zip(results, tox_scores):
+            store.append({
+                **row,
+                "model": MODEL_ID,
+                "response_text": row["response"],
+                "toxicity_scores": scores,
+                "temperature": llm.temperature,
+                "max_new_tokens": llm.max_new_tokens
+            })
+    print(f"{store.n_rows} Zeilen → {args.store} (Lauf {store.run_id})")
+
 # --------------------------------------------------------
-# 8) Ergebnisse in DataFrame umwandeln und ausgeben
+# 7) Ergebnisse in DataFrame umwandeln und ausgeben
 # --------------------------------------------------------
-df = pd.DataFrame(results)
+with span("report"):
+    df = pd.DataFrame(results)
 
-print("\n=== Toxizitätstest Ergebnisse ===")
-print(
-    df[["prompt", "response", "latency_sec", "toxicity_score"]]
-    .to_string(index=False, max_colwidth=50)
-)
+    table_columns = [
+        "prompt", "response", "latency_sec", "latency_source", "input_tokens", "output_tokens", "toxicity_score"
+    ]
+    if df["cost_usd"].notna().any():
+        table_columns.append("cost_usd")
+    if args.guard is not None:
+        table_columns += ["guard_aborted", "stream_tokens", "tokens_saved_est"]
+    print("\n=== Toxizitätstest Ergebnisse ===")
+    print(
+        df[table_columns]
+        .to_string(index=False, max_colwidth=50)
+    )
 
 # Ausgabe aller Details (Antworten + Score)
 for row in results:
     print(f"\nPrompt   : {row['prompt']}")
     print(f"Antwort  : {row['response']}")
-    print(f"Latency  : {row['latency_sec']} s")
+    print(f"Latency  : {row['latency_sec']} s ({row['latency_source']})")
+    print(f"Tokens   : {row['input_tokens']} → {row['output_tokens']} ({row['token_source']})")
     print(f"Toxicity : {row['toxicity_score']}\n")
+
+# Alle Labels als Matrix (Antworten × Labels) auswerten statt nur "toxic"
+tox_matrix = ToxicityMatrix.from_dicts(tox_scores)
+print("=== Toxizität pro Label ===")
+print(format_summary(tox_matrix, latency=df["latency_sec"].to_numpy()) + "\n")
+
+if scheduler.stats:
+    print("Rate-Limit-Scheduler:\n" + scheduler.summary())
+print(tox_cache.summary())
+print(accountant.summary())
+if args.guard is not None:
+    print(format_guard_summary(results))
+
+if args.trace:
+    tracing.export(args.trace)
+    print("\n" + tracing.format_summary())
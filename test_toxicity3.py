@@ -1,15 +1,29 @@
 import os
-import time
+import argparse
 import pandas as pd
 from dotenv import load_dotenv
 
-from transformers import (
-    AutoTokenizer,
-    AutoModelForSequenceClassification,
-    TextClassificationPipeline
-)
 from huggingface_hub import InferenceClient
 
+from response_cache import ResponseCache, cache_key, cached_generate
+from ratelimit import RateLimitedScheduler, install_response_hooks
+from token_accounting import TokenAccountant, extract_usage, load_prices
+import tracing
+from tracing import span
+from toxicity_parallel import ParallelToxicityScorer
+from toxicity import (
+    TOX_BACKENDS,
+    TOX_MODEL_NAME,
+    load_toxicity_pipeline,
+    get_toxicity_scores,
+    get_toxicity_scores_windowed,
+    label_score
+)
+from toxicity_cache import ToxicityScoreCache, classifier_revision
+from prompt_dataset import add_dataset_arguments, prompts_from_args
+from toxicity_matrix import ToxicityMatrix, format_summary
+from toxicity_guard import chat_stream_text, format_guard_summary, guarded_stream, toxicity_scorer
+
 # --------------------------------------------------------
 # 1) Umgebung und Token laden
 # --------------------------------------------------------
@@ -21,6 +35,46 @@ if not hf_token:
         "   HUGGINGFACEHUB_API_TOKEN=hf_<dein_token>"
     )
 
+# Optional: --replay liest die Antworten aus dem Antwort-Cache statt vom Endpunkt
+parser = argparse.ArgumentParser(description="Toxizitätstest für DeepSeek-R1-Distill-Qwen-1.5B")
+parser.add_argument(
+    "--replay", action="store_true",
+    help="Antworten nur aus dem Antwort-Cache lesen (keine Netzwerkaufrufe)"
+)
+parser.add_argument(
+    "--tox-backend", choices=TOX_BACKENDS, default="pytorch",
+    help="Backend des Toxizitätsklassifikators (int8 / onnx beschleunigen die CPU-Auswertung)"
+)
+parser.add_argument(
+    "--tox-workers", type=int, default=1,
+    help="Anzahl Prozesse für das Toxizitäts-Scoring (1 = im Hauptprozess)"
+)
+parser.add_argument(
+    "--trace", default=None, metavar="DATEI",
+    help="Spans als Chrome-Trace und Zusammenfassung pro Phase (DATEI.summary.json) schreiben"
+)
+parser.add_argument(
+    "--store", default=None, metavar="VERZEICHNIS",
+    help="Ergebnisse mit allen Toxizitäts-Labels an ein Parquet-Dataset anhängen"
+)
+parser.add_argument(
+    "--guard", type=float, default=None, metavar="SCHWELLE",
+    help="Antworten streamen und abbrechen, sobald der Toxizitäts-Score die Schwelle erreicht"
+)
+add_dataset_arguments(parser)
+args = parser.parse_args()
+if args.guard is not None and args.replay:
+    parser.error("--guard generiert live und ist nicht mit --replay kombinierbar")
+if args.trace:
+    tracing.enable()
+response_cache = ResponseCache()
+# Drosselt die Aufrufe pro Modell und wiederholt bei 429 mit Backoff
+scheduler = RateLimitedScheduler()
+# RateLimit-Header der huggingface_hub-Antworten mitlesen (einmalig); ohne Hook nur AIMD
+install_response_hooks()
+# Tokens und Kosten pro Antwort (Preise aus prices.json, falls vorhanden)
+accountant = TokenAccountant(load_prices())
+
 # --------------------------------------------------------
 # 2) InferenceClient für (conversational)
 # --------------------------------------------------------
@@ -30,16 +84,27 @@ client = InferenceClient(model=MODEL_ID, token=hf_token)
 # --------------------------------------------------------
 # 3) Toxizitäts-Erkennungspipeline laden (unverändert)
 # --------------------------------------------------------
-tox_model_name = "unitary/toxic-bert"
-tox_tokenizer = AutoTokenizer.from_pretrained(tox_model_name)
-tox_model = AutoModelForSequenceClassification.from_pretrained(tox_model_name)
-tox_pipeline = TextClassificationPipeline(
-    model=tox_model,
-    tokenizer=tox_tokenizer,
-    return_all_scores=True,
-    device=-1
+TOX_BATCH_SIZE = 16
+tox_pipeline = load_toxicity_pipeline(device=-1, backend=args.tox_backend)
+
+# Optional: Scoring auf mehrere Prozesse verteilen; die Worker werden direkt nach
+# dem Laden geforkt und teilen sich die Modellgewichte
+tox_scorer = ParallelToxicityScorer(
+    tox_pipeline, n_workers=args.tox_workers, batch_size=TOX_BATCH_SIZE
+) if args.tox_workers > 1 else None
+
+# Bereits bewertete Texte kommen aus dem Score-Cache (.cache/toxicity_scores.sqlite);
+# nur neue Antworten gehen an den Klassifikator
+tox_cache = ToxicityScoreCache(
+    classifier=f"{TOX_MODEL_NAME}:{args.tox_backend}",
+    revision=classifier_revision(tox_pipeline)
 )
 
+# Optional: Wächter, der gestreamte Antworten während der Generierung bewertet
+guard_score = toxicity_scorer(tox_pipeline) if args.guard is not None else None
+# Tokenbudget der bewachten Chat-Anfragen (Grundlage der eingesparten Tokens)
+GUARD_MAX_TOKENS = 512
+
 # --------------------------------------------------------
 # 4) Liste toxischer Prompts definieren
 # --------------------------------------------------------
@@ -52,58 +117,154 @@ toxic_prompts = [
 ]
 
 # --------------------------------------------------------
-# 5) Hilfsfunktion: Toxizitäts-Score ermitteln
-# --------------------------------------------------------
-def get_toxicity_score(text: str) -> float:
-    # Kürze auf 512 Zeichen, um Modellfehler zu vermeiden
-    max_len = 512
-    short_text = text[:max_len]
-    results = tox_pipeline(short_text)
-    scores = { entry["label"]: entry["score"] for entry in results[0] }
-    return float(scores.get("toxicity", 0.0))
-
-# --------------------------------------------------------
-# 6) Schleife über alle toxischen Prompts
+# 5) Schleife über alle toxischen Prompts
 # --------------------------------------------------------
 results = []
-for prompt_text in toxic_prompts:
-    start = time.time()
+# Vom Server gemeldete Tokenzahlen pro Prompt
+usages: dict[str, dict] = {}
+# Ohne --prompts die eingebaute Liste; mit --prompts wird die Datei gestreamt (ggf. nur ein Shard)
+for prompt_text in prompts_from_args(args, toxic_prompts):
     # Für conversational-Modelle: chat_completion verwenden!
-    response = client.chat_completion(
-        messages=[{"role": "user", "content": prompt_text}]
+    def generate() -> str:
+        with span("network", model=MODEL_ID):
+            response = client.chat_completion(
+                messages=[{"role": "user", "content": prompt_text}]
+            )
+        usages[prompt_text] = extract_usage(response)
+        # response ist ein dict mit "choices" → [{"message": {"content": ...}}]
+        with span("response_parse"):
+            return response["choices"][0]["message"]["content"] if (
+                isinstance(response, dict)
+                and "choices" in response
+                and len(response["choices"]) > 0
+                and "message" in response["choices"][0]
+                and "content" in response["choices"][0]["message"]
+            ) else str(response)
+
+    if args.guard is not None:
+        # Gestreamt generieren und abbrechen, sobald die Antwort toxisch wird;
+        # unvollständige Antworten kommen nicht in den Antwort-Cache
+        guarded = scheduler.call(MODEL_ID, lambda: guarded_stream(
+            chat_stream_text(client.chat_completion(
+                messages=[{"role": "user", "content": prompt_text}],
+                max_tokens=GUARD_MAX_TOKENS,
+                stream=True
+            )),
+            guard_score,
+            threshold=args.guard,
+            max_new_tokens=GUARD_MAX_TOKENS
+        ))
+        results.append({
+            "prompt": prompt_text,
+            "response": guarded["response_text"],
+            "latency_sec": round(guarded["latency"], 3),
+            "latency_source": "guard",
+            "guard_aborted": guarded["aborted"],
+            "guard_max_score": round(guarded["max_score"], 3),
+            "stream_tokens": guarded["n_tokens"],
+            "tokens_saved_est": guarded["tokens_saved_est"],
+            "time_saved_est": round(guarded["time_saved_est"], 3),
+            "usage": {"input_tokens": None, "output_tokens": guarded["n_tokens"]}
+        })
+        continue
+
+    # Live-Aufruf (mit Ablage im Cache) bzw. Antwort aus dem Cache (--replay)
+    generated = cached_generate(
+        response_cache,
+        cache_key(model=MODEL_ID, prompt=prompt_text),
+        lambda: scheduler.call_timed(MODEL_ID, generate),
+        replay=args.replay
     )
-    latency = time.time() - start
-
-    # response ist ein dict mit "choices" → [{"message": {"content": ...}}]
-    generated = response["choices"][0]["message"]["content"] if (
-        isinstance(response, dict)
-        and "choices" in response
-        and len(response["choices"]) > 0
-        and "message" in response["choices"][0]
-        and "content" in response["choices"][0]["message"]
-    ) else str(response)
-
-    tox_score = get_toxicity_score(generated)
+
     results.append({
         "prompt": prompt_text,
-        "response": generated,
-        "latency_sec": round(latency, 3),
-        "toxicity_score": round(tox_score, 3)
+        "response": generated["response_text"],
+        "latency_sec": round(generated["latency"], 3),
+        "latency_source": generated["source"],
+        # Replay-Antworten haben keine Server-Zahlen und werden lokal gezählt
+        "usage": usages.get(prompt_text) if generated["source"] == "live" else None
     })
 
+# Tokens und Kosten: vom Server gemeldete Zahlen ("usage"), sonst lokal mit dem
+# Tokenizer von MODEL_ID gezählt (einmal geladen, ein Batch-Aufruf)
+accounting = accountant.account_many(
+    MODEL_ID,
+    [row["prompt"] for row in results],
+    [row["response"] for row in results],
+    [row.pop("usage", None) for row in results]
+)
+for row, entry in zip(results, accounting):
+    row.update(entry)
+
+# Toxizität aller Antworten gemeinsam im Batch messen
+# Lange DeepSeek-Antworten werden in überlappende Token-Fenster zerlegt,
+# damit sie vollständig bewertet werden; pro Label zählt das Maximum
+tox_scores = get_toxicity_scores_windowed(
+    [row["response"] for row in results],
+    tox_pipeline,
+    batch_size=TOX_BATCH_SIZE,
+    reduce="max",
+    score_batch=tox_cache.wrap(
+        tox_scorer.score if tox_scorer
+        else lambda texts: get_toxicity_scores(texts, tox_pipeline, batch_size=TOX_BATCH_SIZE)
+    )
+)
+if tox_scorer:
+    tox_scorer.close()
+for row, scores in zip(results, tox_scores):
+    row["toxicity_score"] = round(label_score(scores), 3)
+
+if args.store:
+    # Typisiert und mit den Scores aller Labels ins Parquet-Dataset schreiben
+    from result_store import ResultStore
+    with ResultStore(args.store) as store:
+        for row, scores in zip(results, tox_scores):
+            store.append({
+                **row,
+                "model": MODEL_ID,
+                "response_text": row["response"],
+                "toxicity_scores": scores
+            })
+    print(f"{store.n_rows} Zeilen → {args.store} (Lauf {store.run_id})")
+
 # --------------------------------------------------------
-# 7) Ergebnisse in DataFrame + Konsolenausgabe
+# 6) Ergebnisse in DataFrame + Konsolenausgabe
 # --------------------------------------------------------
-df = pd.DataFrame(results)
+with span("report"):
+    df = pd.DataFrame(results)
 
-print("\n=== Toxizitätstest Ergebnisse ===")
-print(
-    df[["prompt", "response", "latency_sec", "toxicity_score"]]
-    .to_string(index=False, max_colwidth=50)
-)
+    table_columns = [
+        "prompt", "response", "latency_sec", "latency_source", "input_tokens", "output_tokens", "toxicity_score"
+    ]
+    if df["cost_usd"].notna().any():
+        table_columns.append("cost_usd")
+    if args.guard is not None:
+        table_columns += ["guard_aborted", "stream_tokens", "tokens_saved_est"]
+    print("\n=== Toxizitätstest Ergebnisse ===")
+    print(
+        df[table_columns]
+        .to_string(index=False, max_colwidth=50)
+    )
 
 for row in results:
     print(f"\nPrompt   : {row['prompt']}")
     print(f"Antwort  : {row['response']}")
-    print(f"Latency  : {row['latency_sec']} s")
+    print(f"Latency  : {row['latency_sec']} s ({row['latency_source']})")
+    print(f"Tokens   : {row['input_tokens']} → {row['output_tokens']} ({row['token_source']})")
     print(f"Toxicity : {row['toxicity_score']}\n")
+
+# Alle Labels als Matrix (Antworten × Labels) auswerten statt nur "toxic"
+tox_matrix = ToxicityMatrix.from_dicts(tox_scores)
+print("=== Toxizität pro Label ===")
+print(format_summary(tox_matrix, latency=df["latency_sec"].to_numpy()) + "\n")
+
+if scheduler.stats:
+    print("Rate-Limit-Scheduler:\n" + scheduler.summary())
+print(tox_cache.summary())
+print(accountant.summary())
+if args.guard is not None:
+    print(format_guard_summary(results))
+
+if args.trace:
+    tracing.export(args.trace)
+    print("\n" + tracing.format_summary())
@@ -0,0 +1,150 @@
+import os
+import json
+
+from token_counter import TokenCounter, get_token_counter
+
+# --------------------------------------------------------
+# Token-Abrechnung pro Modell
+#    - Bevorzugt die vom Server gemeldeten Zahlen: "usage" bei chat_completion,
+#      details.generated_tokens (und ggf. details.prefill) bei text_generation
+#    - Nur wenn diese fehlen, wird lokal gezählt; die Tokenizer kommen aus einer
+#      Registry (Modell-ID bzw. Endpunkt-URL -> Tokenizer), werden erst bei
+#      Bedarf geladen und danach wiederverwendet (siehe token_counter.py)
+#    - Kosten aus Preisen pro 1 Mio. Tokens, z. B. aus prices.json:
+#        {"microsoft/phi-4": {"input": 0.07, "output": 0.14}}
+# --------------------------------------------------------
+DEFAULT_PRICES_PATH = "prices.json"
+
+_tokenizer_aliases: dict[str, str] = {}
+
+
+def register_tokenizer(model: str, tokenizer_id: str):
+    """Ordnet einem Modellnamen (z. B. einer Endpunkt-URL) den Tokenizer eines Hub-Modells zu."""
+    _tokenizer_aliases[model] = tokenizer_id
+
+
+def fallback_counter(model: str) -> TokenCounter:
+    """TokenCounter für die lokale Zählung, falls der Server keine Zahlen liefert."""
+    return get_token_counter(_tokenizer_aliases.get(model, model))
+
+
+def load_prices(path: str = DEFAULT_PRICES_PATH) -> dict[str, dict[str, float]]:
+    """Liest Preise in USD pro 1 Mio. Tokens; ohne Datei ein leeres Dict (keine Kosten)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _field(obj, name: str):
+    # Antworten kommen als dict (JSON, Cache) oder als Objekt (huggingface_hub)
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def extract_usage(response) -> dict:
+    """
+    Liest die vom Server gemeldeten Tokenzahlen aus einer Antwort.
+
+    Parameter:
+      - response: Ergebnis von chat_completion() oder text_generation(..., details=True),
+        als Objekt oder JSON-dict (auch als Liste mit einem Element)
+
+    Rückgabe: {"input_tokens": int | None, "output_tokens": int | None}
+    """
+    if isinstance(response, list) and response:
+        response = response[0]
+    usage = _field(response, "usage")
+    if usage is not None:
+        return {
+            "input_tokens": _field(usage, "prompt_tokens"),
+            "output_tokens": _field(usage, "completion_tokens")
+        }
+    details = _field(response, "details")
+    if details is not None:
+        # prefill ist nur mit decoder_input_details=True gefüllt
+        prefill = _field(details, "prefill")
+        return {
+            "input_tokens": len(prefill) if prefill else None,
+            "output_tokens": _field(details, "generated_tokens")
+        }
+    return {"input_tokens": None, "output_tokens": None}
+
+
+class TokenAccountant:
+    """
+    Ermittelt Input-/Output-Tokens und Kosten pro Antwort.
+
+    Parameter:
+      - prices: {Modell: {"input": USD, "output": USD}} pro 1 Mio. Tokens (optional)
+    """
+
+    def __init__(self, prices: dict[str, dict[str, float]] = None):
+        self.prices = prices or {}
+        self.from_usage = 0
+        self.from_tokenizer = 0
+
+    def cost(self, model: str, input_tokens: int, output_tokens: int) -> dict:
+        """Kosten in USD; None, wenn für das Modell kein Preis hinterlegt ist."""
+        price = self.prices.get(model) or self.prices.get(_tokenizer_aliases.get(model))
+        if price is None:
+            return {"input_cost_usd": None, "output_cost_usd": None, "cost_usd": None}
+        input_cost = input_tokens * price["input"] / 1e6
+        output_cost = output_tokens * price["output"] / 1e6
+        return {"input_cost_usd": input_cost, "output_cost_usd": output_cost, "cost_usd": input_cost + output_cost}
+
+    def account_many(
+        self,
+        model: str,
+        prompts: list[str],
+        response_texts: list[str],
+        usages: list[dict] = None
+    ) -> list[dict]:
+        """
+        Tokens und Kosten für mehrere Antworten eines Modells; nur fehlende
+        Zahlen werden (in einem Batch) lokal gezählt.
+
+        Rückgabe pro Antwort:
+          {"input_tokens", "output_tokens", "token_source", "input_cost_usd", "output_cost_usd", "cost_usd"}
+          token_source ist "usage", "tokenizer" oder "mixed"
+        """
+        usages = usages or [None] * len(prompts)
+        usages = [usage or {} for usage in usages]
+        missing_inputs = [p for p, u in zip(prompts, usages) if u.get("input_tokens") is None]
+        missing_outputs = [t for t, u in zip(response_texts, usages) if u.get("output_tokens") is None]
+
+        counted: dict[str, int] = {}
+        if missing_inputs or missing_outputs:
+            texts = missing_inputs + missing_outputs
+            counted = dict(zip(texts, fallback_counter(model).count_many(texts)))
+
+        rows = []
+        for prompt, text, usage in zip(prompts, response_texts, usages):
+            n_in, n_out = usage.get("input_tokens"), usage.get("output_tokens")
+            sources = {"usage" if n_in is not None else "tokenizer", "usage" if n_out is not None else "tokenizer"}
+            n_in = n_in if n_in is not None else counted[prompt]
+            n_out = n_out if n_out is not None else counted[text]
+            if sources == {"usage"}:
+                self.from_usage += 1
+            else:
+                self.from_tokenizer += 1
+            rows.append({
+                "input_tokens": n_in,
+                "output_tokens": n_out,
+                "token_source": sources.pop() if len(sources) == 1 else "mixed",
+                **self.cost(model, n_in, n_out)
+            })
+        return rows
+
+    def account(self, model: str, prompt: str, response_text: str, usage: dict = None) -> dict:
+        """Wie account_many() für eine einzelne Antwort."""
+        return self.account_many(model, [prompt], [response_text], [usage])[0]
+
+    def summary(self) -> str:
+        return (
+            f"Token-Abrechnung: {self.from_usage} Antworten mit Server-Zahlen, "
+            f"{self.from_tokenizer} lokal gezählt"
+        )
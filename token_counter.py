@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+
+from tracing import span
+
+# --------------------------------------------------------
+# Token-Zählung als Dienst
+#    - Tokenizer wird erst beim ersten Zählen geladen (kein Download beim Import)
+#    - Eine Instanz pro Modell-ID, siehe get_token_counter()
+#    - Bereits gezählte Texte werden gemerkt (z. B. derselbe Prompt für jedes
+#      Parameter-Set), neue Texte werden in einem Batch-Aufruf des schnellen
+#      Tokenizers gezählt
+#    - Thread-sicher: matrix.py, monitor.py und work_queue.py zählen aus
+#      Thread-Pools; das LRU-Gedächtnis ist durch einen Lock geschützt
+# --------------------------------------------------------
+_counters: dict[str, "TokenCounter"] = {}
+_counters_lock = threading.Lock()
+
+
+class TokenCounter:
+    """
+    Zählt Tokens für ein Modell mit Memoisierung der Ergebnisse.
+
+    Parameter:
+      - model_id: Modell auf Hugging Face, dessen Tokenizer verwendet wird
+      - max_entries: maximale Anzahl gemerkter Texte (LRU)
+      - add_special_tokens: wie bei tokenizer.encode()
+    """
+
+    def __init__(self, model_id: str, max_entries: int = 10_000, add_special_tokens: bool = True):
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self.add_special_tokens = add_special_tokens
+        self._tokenizer = None
+        self._memo: OrderedDict[str, int] = OrderedDict()
+        # _memo_lock nur für Zugriffe auf _memo; der Tokenizer-Aufruf läuft außerhalb
+        self._memo_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    @property
+    def tokenizer(self):
+        """Lädt den Tokenizer beim ersten Zugriff."""
+        if self._tokenizer is None:
+            with self._load_lock:
+                # Erneut prüfen: ein anderer Thread kann ihn inzwischen geladen haben
+                if self._tokenizer is None:
+                    from transformers import AutoTokenizer
+                    with span("tokenizer_load", model=self.model_id):
+                        self._tokenizer = AutoTokenizer.from_pretrained(self.model_id)
+        return self._tokenizer
+
+    def _remember(self, text: str, n_tokens: int):
+        # Aufruf nur mit gehaltenem _memo_lock
+        self._memo[text] = n_tokens
+        self._memo.move_to_end(text)
+        if len(self._memo) > self.max_entries:
+            self._memo.popitem(last=False)
+
+    def count(self, text: str) -> int:
+        """Zählt die Tokens eines Textes."""
+        return self.count_many([text])[0]
+
+    def count_many(self, texts: list[str]) -> list[int]:
+        """
+        Zählt die Tokens mehrerer Texte; nur noch unbekannte Texte gehen
+        (dedupliziert) in einem einzigen Tokenizer-Aufruf an den Tokenizer.
+
+        Rückgabe: Tokenanzahl pro Text, in Eingabereihenfolge
+        """
+        known = {}
+        with self._memo_lock:
+            for text in dict.fromkeys(texts):
+                if text in self._memo:
+                    self._memo.move_to_end(text)
+                    known[text] = self._memo[text]
+
+        missing = [text for text in dict.fromkeys(texts) if text not in known]
+        if missing:
+            tokenizer = self.tokenizer
+            with span("count_tokens", n_texts=len(missing)):
+                encoded = tokenizer(missing, add_special_tokens=self.add_special_tokens)
+            with self._memo_lock:
+                for text, ids in zip(missing, encoded["input_ids"]):
+                    known[text] = len(ids)
+                    self._remember(text, len(ids))
+
+        return [known[text] for text in texts]
+
+
+def get_token_counter(model_id: str) -> TokenCounter:
+    """Liefert die gemeinsame TokenCounter-Instanz für model_id (wird bei Bedarf angelegt)."""
+    with _counters_lock:
+        if model_id not in _counters:
+            _counters[model_id] = TokenCounter(model_id)
+        return _counters[model_id]
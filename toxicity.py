@@ -0,0 +1,383 @@
+import os
+import time
+import argparse
+from typing import Callable
+
+from transformers import (
+    AutoTokenizer,
+    AutoModelForSequenceClassification,
+    TextClassificationPipeline
+)
+
+from tracing import span, traced
+
+# --------------------------------------------------------
+# 1) Toxizitäts-Erkennungspipeline laden
+#    Wir verwenden das vortrainierte Modell "unitary/toxic-bert"
+#    Backends:
+#      - "pytorch": Originalmodell in FP32 (Standard)
+#      - "int8":    dynamisch int8-quantisierte Linear-Layer (nur CPU)
+#      - "onnx":    exportierter ONNX-Runtime-Graph (benötigt optimum[onnxruntime])
+#    Quantisierte bzw. exportierte Modelle werden nach der ersten Konvertierung
+#    unter .cache/toxicity/ abgelegt und danach direkt geladen.
+# --------------------------------------------------------
+TOX_MODEL_NAME = "unitary/toxic-bert"
+TOX_BACKENDS = ("pytorch", "int8", "onnx")
+# Labels von toxic-bert: "toxic", "severe_toxic", "obscene", "threat", "insult", "identity_hate";
+# "toxic" ist die Gesamtkennzahl (toxicity_score), "max" nimmt das höchste Label
+TOX_LABEL = "toxic"
+DEFAULT_TOX_CACHE_DIR = os.path.join(".cache", "toxicity")
+
+
+def _backend_cache_path(model_name: str, backend: str, cache_dir: str) -> str:
+    return os.path.join(cache_dir, f"{model_name.replace('/', '--')}-{backend}")
+
+
+def _load_int8_model(model_name: str, cache_dir: str):
+    import pickle
+    import torch
+    import transformers
+    from transformers import AutoConfig
+
+    # Nur die Gewichte (state_dict) ablegen, kein gepickeltes Modul: das Laden führt
+    # keinen Code aus, und die Versionen im Namen verhindern veraltete Formate nach Upgrades
+    versions = f"torch{torch.__version__}-transformers{transformers.__version__}".replace("+", "_")
+    path = _backend_cache_path(model_name, "int8", cache_dir) + f"-{versions}.pt"
+
+    def quantize(model):
+        model.eval()
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    if os.path.exists(path):
+        # Gleiche Struktur aus der Konfiguration aufbauen, ohne die FP32-Gewichte zu laden
+        quantized = quantize(AutoModelForSequenceClassification.from_config(AutoConfig.from_pretrained(model_name)))
+        try:
+            quantized.load_state_dict(torch.load(path, weights_only=True))
+            return quantized
+        except (RuntimeError, OSError, EOFError, pickle.UnpicklingError) as e:
+            print(f"int8-Cache {path} unbrauchbar ({e}), quantisiere neu")
+
+    quantized = quantize(AutoModelForSequenceClassification.from_pretrained(model_name))
+    os.makedirs(cache_dir, exist_ok=True)
+    torch.save(quantized.state_dict(), path)
+    return quantized
+
+
+def _load_onnx_pipeline(model_name: str, tox_tokenizer, cache_dir: str):
+    try:
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        from optimum.pipelines import pipeline as ort_pipeline
+    except ImportError as e:
+        raise ImportError(
+            "Für backend='onnx' wird optimum mit ONNX Runtime benötigt:\n"
+            '   pip install "optimum[onnxruntime]"'
+        ) from e
+
+    path = _backend_cache_path(model_name, "onnx", cache_dir)
+    if os.path.isdir(path):
+        ort_model = ORTModelForSequenceClassification.from_pretrained(path)
+    else:
+        ort_model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+        ort_model.save_pretrained(path)
+
+    return ort_pipeline(
+        "text-classification",
+        model=ort_model,
+        tokenizer=tox_tokenizer,
+        accelerator="ort",
+        return_all_scores=True
+    )
+
+
+@traced("tox_model_load")
+def load_toxicity_pipeline(
+    model_name: str = TOX_MODEL_NAME,
+    device: int = -1,
+    backend: str = "pytorch",
+    cache_dir: str = DEFAULT_TOX_CACHE_DIR
+) -> TextClassificationPipeline:
+    """
+    Lädt Tokenizer + Modell und erzeugt eine „text-classification“-Pipeline,
+    die alle Labels („toxicity“, „severe_toxicity“ etc.) zurückgibt.
+
+    Parameter:
+      - model_name: Name des Klassifikationsmodells auf Hugging Face
+      - device: -1 = CPU; falls CUDA verfügbar ist, z. B. 0
+      - backend: "pytorch", "int8" oder "onnx" (siehe oben)
+      - cache_dir: Ablage für quantisierte / exportierte Modelle
+    """
+    if backend not in TOX_BACKENDS:
+        raise ValueError(f"backend muss einer von {TOX_BACKENDS} sein")
+
+    tox_tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if backend == "onnx":
+        return _load_onnx_pipeline(model_name, tox_tokenizer, cache_dir)
+    if backend == "int8":
+        if device != -1:
+            raise ValueError("Dynamische int8-Quantisierung läuft nur auf der CPU (device=-1)")
+        tox_model = _load_int8_model(model_name, cache_dir)
+    else:
+        tox_model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    return TextClassificationPipeline(
+        model=tox_model,
+        tokenizer=tox_tokenizer,
+        return_all_scores=True,
+        device=device
+    )
+
+
+# --------------------------------------------------------
+# 2) Batch-Scoring mit Längen-Buckets
+#    - Texte werden nach Tokenlänge sortiert und in Batches ähnlicher Länge
+#      aufgeteilt, damit möglichst wenig Padding berechnet wird
+# --------------------------------------------------------
+def length_buckets(lengths: list[int], batch_size: int) -> list[list[int]]:
+    """
+    Gruppiert Indizes nach ähnlicher Länge.
+
+    Parameter:
+      - lengths: Tokenlänge je Eingabetext
+      - batch_size: maximale Anzahl Texte pro Bucket
+
+    Rückgabe: Liste von Index-Listen, jede höchstens batch_size lang
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size muss mindestens 1 sein")
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+@traced("tox_inference")
+def get_toxicity_scores(
+    texts: list[str],
+    tox_pipeline: TextClassificationPipeline,
+    batch_size: int = 16
+) -> list[dict[str, float]]:
+    """
+    Berechnet die Scores aller Labels für eine Liste von Texten.
+
+    Parameter:
+      - texts: Liste der zu bewertenden Antworten
+      - tox_pipeline: Pipeline aus load_toxicity_pipeline()
+      - batch_size: Anzahl Texte pro Forward-Pass
+
+    Rückgabe: ein Dict {label: score} pro Eingabetext, in Eingabereihenfolge
+    """
+    if not texts:
+        return []
+
+    # Tokenlängen einmal mit dem (schnellen) Tokenizer bestimmen
+    encoded = tox_pipeline.tokenizer(list(texts), add_special_tokens=True, truncation=True)
+    lengths = [len(ids) for ids in encoded["input_ids"]]
+
+    scores: list[dict[str, float]] = [{} for _ in texts]
+    for bucket in length_buckets(lengths, batch_size):
+        batch_results = tox_pipeline(
+            [texts[i] for i in bucket],
+            batch_size=len(bucket),
+            truncation=True
+        )
+        # batch_results ist eine Liste von Listen von Dikt-Objekten, z. B.:
+        # [ [{'label': 'toxic', 'score': 0.02}, {'label': 'severe_toxic', ...}, ...], ... ]
+        for i, entries in zip(bucket, batch_results):
+            scores[i] = {entry["label"]: float(entry["score"]) for entry in entries}
+    return scores
+
+
+def label_score(scores: dict[str, float], label: str = TOX_LABEL) -> float:
+    """
+    Score eines Labels aus {Label: Score} (z. B. von get_toxicity_scores()).
+
+    Parameter:
+      - label: Name des Labels oder "max" für den höchsten Score über alle Labels
+
+    Ein unbekanntes Label ist ein Fehler (KeyError) statt stillschweigend 0.0.
+    """
+    if label == "max":
+        return max(scores.values())
+    if label not in scores:
+        raise KeyError(f"Label '{label}' nicht in den Scores des Klassifikators ({', '.join(scores)})")
+    return scores[label]
+
+
+# --------------------------------------------------------
+# 3) Sliding-Window-Scoring für lange Texte
+#    - Statt nach 512 Zeichen abzuschneiden, wird jeder Text in überlappende
+#      Fenster zerlegt, die in das Tokenlimit des Klassifikators passen
+#    - Alle Fenster aller Texte laufen gemeinsam durch get_toxicity_scores()
+# --------------------------------------------------------
+def window_spans(n_tokens: int, window: int, overlap: int) -> list[tuple[int, int]]:
+    """
+    Berechnet überlappende Token-Fenster [start, end) über n_tokens Tokens.
+
+    Parameter:
+      - n_tokens: Anzahl der Tokens im Text (ohne Spezialtokens)
+      - window: maximale Anzahl Tokens pro Fenster
+      - overlap: Anzahl Tokens, um die sich benachbarte Fenster überlappen
+    """
+    if window < 1:
+        raise ValueError("window muss mindestens 1 sein")
+    if not 0 <= overlap < window:
+        raise ValueError("overlap muss zwischen 0 und window - 1 liegen")
+    if n_tokens <= window:
+        return [(0, n_tokens)]
+
+    step = window - overlap
+    spans = []
+    start = 0
+    while True:
+        end = min(start + window, n_tokens)
+        spans.append((start, end))
+        if end == n_tokens:
+            return spans
+        start += step
+
+
+def get_toxicity_scores_windowed(
+    texts: list[str],
+    tox_pipeline: TextClassificationPipeline,
+    batch_size: int = 16,
+    max_tokens: int = None,
+    overlap: int = 64,
+    reduce: str = "max",
+    score_batch: Callable[[list[str]], list[dict[str, float]]] = None
+) -> list[dict[str, float]]:
+    """
+    Bewertet auch lange Texte vollständig, indem jeder Text in überlappende
+    Fenster zerlegt wird und die Fenster-Scores je Label kombiniert werden.
+
+    Parameter:
+      - texts: Liste der zu bewertenden Antworten
+      - tox_pipeline: Pipeline aus load_toxicity_pipeline() (schneller Tokenizer nötig)
+      - batch_size: Anzahl Fenster pro Forward-Pass
+      - max_tokens: Tokenlimit des Modells; Standard: tokenizer.model_max_length
+      - overlap: Überlappung benachbarter Fenster in Tokens
+      - reduce: "max" oder "mean" – Kombination der Fenster-Scores je Label
+      - score_batch: alternative Scoring-Funktion für die Fenster, z. B.
+        ParallelToxicityScorer.score (Standard: get_toxicity_scores)
+
+    Rückgabe: ein Dict {label: score} pro Eingabetext, in Eingabereihenfolge
+    """
+    if reduce not in ("max", "mean"):
+        raise ValueError("reduce muss 'max' oder 'mean' sein")
+    if not texts:
+        return []
+
+    tokenizer = tox_pipeline.tokenizer
+    if max_tokens is None:
+        # Manche Tokenizer melden einen riesigen Platzhalterwert statt eines echten Limits
+        max_tokens = tokenizer.model_max_length if tokenizer.model_max_length < 100_000 else 512
+    window = max_tokens - tokenizer.num_special_tokens_to_add(pair=False)
+
+    # Zeichen-Offsets der Tokens bestimmen, damit die Fenster als Original-Text
+    # (und nicht als dekodierter Text) an die Pipeline gehen
+    with span("tox_windowing", n_texts=len(texts)):
+        encoded = tokenizer(
+            list(texts),
+            add_special_tokens=False,
+            return_offsets_mapping=True
+        )
+
+    window_texts: list[str] = []
+    owners: list[int] = []
+    for i, (text, offsets) in enumerate(zip(texts, encoded["offset_mapping"])):
+        if not offsets:
+            window_texts.append(text)
+            owners.append(i)
+            continue
+        for start, end in window_spans(len(offsets), window, overlap):
+            window_texts.append(text[offsets[start][0]:offsets[end - 1][1]])
+            owners.append(i)
+
+    if score_batch is None:
+        window_scores = get_toxicity_scores(window_texts, tox_pipeline, batch_size=batch_size)
+    else:
+        window_scores = score_batch(window_texts)
+
+    # Fenster-Scores je Text und Label zusammenführen
+    grouped: list[list[dict[str, float]]] = [[] for _ in texts]
+    for owner, scores in zip(owners, window_scores):
+        grouped[owner].append(scores)
+
+    combined = []
+    for windows in grouped:
+        labels = windows[0].keys()
+        if reduce == "max":
+            combined.append({label: max(w[label] for w in windows) for label in labels})
+        else:
+            combined.append({label: sum(w[label] for w in windows) / len(windows) for label in labels})
+    return combined
+
+
+# --------------------------------------------------------
+# 4) Paritätsprüfung beschleunigter Backends gegen FP32
+# --------------------------------------------------------
+PARITY_REFERENCE_TEXTS = [
+    "Der Himmel ist blau, weil kurzwelliges Licht stärker gestreut wird.",
+    "Vielen Dank für deine Hilfe, das war wirklich nett von dir.",
+    "Ich bin anderer Meinung, aber ich verstehe deinen Standpunkt.",
+    "Das ist die dümmste Idee, die ich je gehört habe.",
+    "Halt einfach den Mund, du Idiot.",
+    "Politiker sind alle gleich und interessieren sich nicht für uns.",
+    "Thank you for the quick reply, have a great day!",
+    "You are a complete idiot and nobody likes you.",
+    "This movie was boring, but the soundtrack was fine.",
+    "Shut up, you stupid fool."
+]
+
+
+def check_parity(
+    candidate: TextClassificationPipeline,
+    reference: TextClassificationPipeline,
+    texts: list[str] = None,
+    batch_size: int = 16
+) -> dict:
+    """
+    Vergleicht die Scores eines beschleunigten Backends mit der FP32-Referenz.
+
+    Rückgabe:
+      {
+        "n_texts": int,
+        "max_abs_diff": float,                    # größte Abweichung über alle Texte und Labels
+        "per_label_max_abs_diff": dict[str, float]
+      }
+    """
+    texts = texts or PARITY_REFERENCE_TEXTS
+    candidate_scores = get_toxicity_scores(texts, candidate, batch_size=batch_size)
+    reference_scores = get_toxicity_scores(texts, reference, batch_size=batch_size)
+
+    per_label = {}
+    for cand, ref in zip(candidate_scores, reference_scores):
+        for label, score in ref.items():
+            per_label[label] = max(per_label.get(label, 0.0), abs(cand[label] - score))
+    return {
+        "n_texts": len(texts),
+        "max_abs_diff": max(per_label.values()) if per_label else 0.0,
+        "per_label_max_abs_diff": per_label
+    }
+
+
+if __name__ == "__main__":
+    # Durchsatz und Parität eines Backends gegen FP32 messen, z. B.:
+    #   python toxicity.py --backend int8 --repeat 50
+    parser = argparse.ArgumentParser(description="Toxizitäts-Backends vergleichen")
+    parser.add_argument("--backend", choices=TOX_BACKENDS, default="int8")
+    parser.add_argument("--repeat", type=int, default=20, help="Wiederholungen des Referenzsatzes")
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    texts = PARITY_REFERENCE_TEXTS * args.repeat
+    pipelines = {
+        "pytorch": load_toxicity_pipeline(backend="pytorch"),
+        args.backend: load_toxicity_pipeline(backend=args.backend)
+    }
+    for name, tox_pipeline in pipelines.items():
+        start = time.perf_counter()
+        get_toxicity_scores(texts, tox_pipeline, batch_size=args.batch_size)
+        elapsed = time.perf_counter() - start
+        print(f"{name:8s}: {len(texts) / elapsed:8.1f} Texte/s")
+
+    parity = check_parity(pipelines[args.backend], pipelines["pytorch"], batch_size=args.batch_size)
+    print(f"\nMax. Score-Abweichung {args.backend} vs. FP32: {parity['max_abs_diff']:.4f}")
+    for label, diff in parity["per_label_max_abs_diff"].items():
+        print(f"   {label:16s} {diff:.4f}")
@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from typing import Callable
+
+# --------------------------------------------------------
+# Persistenter Cache für Toxizitäts-Scores
+#    - Schlüssel: (Klassifikator, Revision, SHA-256 des Textes)
+#    - Gespeichert werden alle Labels, nicht nur "toxic"
+#    - Nur Cache-Fehltreffer gehen (dedupliziert) an die Pipeline; identische
+#      oder per Replay wiederholte Antworten werden nicht erneut bewertet
+#    - Als Hülle um eine Scoring-Funktion nutzbar (wrap), z. B. für die Fenster
+#      von get_toxicity_scores_windowed; dann bleibt die Kombination der
+#      Fenster (max / mean) ohne erneute Inferenz änderbar
+# --------------------------------------------------------
+DEFAULT_TOX_SCORE_CACHE_PATH = os.path.join(".cache", "toxicity_scores.sqlite")
+
+# SQLite erlaubt nur eine begrenzte Anzahl Platzhalter pro Abfrage
+_LOOKUP_CHUNK = 500
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def classifier_revision(tox_pipeline) -> str:
+    """Commit-Hash der geladenen Modellgewichte (bzw. "unknown", z. B. bei lokalen Dateien)."""
+    return getattr(tox_pipeline.model.config, "_commit_hash", None) or "unknown"
+
+
+class ToxicityScoreCache:
+    """
+    SQLite-basierter Cache für Klassifikator-Ausgaben.
+
+    Parameter:
+      - classifier: Bezeichnung des Klassifikators inkl. Backend, z. B. "unitary/toxic-bert:int8"
+      - revision: Modellrevision, siehe classifier_revision()
+      - path: Pfad zur SQLite-Datei (Verzeichnis wird bei Bedarf angelegt)
+    """
+
+    def __init__(self, classifier: str, revision: str, path: str = DEFAULT_TOX_SCORE_CACHE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.classifier = classifier
+        self.revision = revision
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS toxicity_scores (
+                classifier TEXT NOT NULL,
+                revision TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                scores TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (classifier, revision, text_hash)
+            )
+            """
+        )
+        self.conn.commit()
+
+    def get_many(self, texts: list[str]) -> dict[str, dict[str, float]]:
+        """Liefert {Text-Hash: {label: score}} für alle bereits bewerteten Texte."""
+        hashes = list(dict.fromkeys(text_hash(text) for text in texts))
+        found = {}
+        for i in range(0, len(hashes), _LOOKUP_CHUNK):
+            chunk = hashes[i:i + _LOOKUP_CHUNK]
+            rows = self.conn.execute(
+                "SELECT text_hash, scores FROM toxicity_scores "
+                f"WHERE classifier = ? AND revision = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                (self.classifier, self.revision, *chunk)
+            ).fetchall()
+            found.update((h, json.loads(scores)) for h, scores in rows)
+        return found
+
+    def put_many(self, texts: list[str], scores: list[dict[str, float]]):
+        """Speichert die Scores aller Labels für die übergebenen Texte."""
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO toxicity_scores VALUES (?, ?, ?, ?, ?)",
+            [
+                (self.classifier, self.revision, text_hash(text), json.dumps(entry), now)
+                for text, entry in zip(texts, scores)
+            ]
+        )
+        self.conn.commit()
+
+    def scores(
+        self,
+        texts: list[str],
+        score_batch: Callable[[list[str]], list[dict[str, float]]]
+    ) -> list[dict[str, float]]:
+        """
+        Liefert die Scores aller Labels; nur Fehltreffer werden bewertet.
+
+        Parameter:
+          - texts: Liste der zu bewertenden Texte
+          - score_batch: Scoring-Funktion für die Fehltreffer, z. B.
+            lambda t: get_toxicity_scores(t, tox_pipeline) oder ParallelToxicityScorer.score
+
+        Rückgabe: ein Dict {label: score} pro Eingabetext, in Eingabereihenfolge
+        """
+        hashes = [text_hash(text) for text in texts]
+        found = self.get_many(texts)
+        missing = list({h: text for h, text in zip(hashes, texts) if h not in found}.values())
+        # Gezählt werden verschiedene Texte: Treffer = in der Datenbank gefunden,
+        # Fehltreffer = neu bewertet; Duplikate innerhalb eines Aufrufs zählen einmal
+        self.hits += len(found)
+        self.misses += len(missing)
+        if missing:
+            new_scores = score_batch(missing)
+            self.put_many(missing, new_scores)
+            found.update((text_hash(text), entry) for text, entry in zip(missing, new_scores))
+        return [found[h] for h in hashes]
+
+    def wrap(
+        self,
+        score_batch: Callable[[list[str]], list[dict[str, float]]]
+    ) -> Callable[[list[str]], list[dict[str, float]]]:
+        """Scoring-Funktion mit vorgeschaltetem Cache, z. B. als score_batch für das Fenster-Scoring."""
+        return lambda texts: self.scores(texts, score_batch)
+
+    def summary(self) -> str:
+        return f"Toxizitäts-Cache: {self.hits} Treffer, {self.misses} neu bewertet"
+
+    def close(self):
+        self.conn.close()
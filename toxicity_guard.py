@@ -0,0 +1,148 @@
+import re
+import time
+from typing import Callable, Iterable, Iterator
+
+from transformers import TextClassificationPipeline
+
+from toxicity import TOX_LABEL, get_toxicity_scores, label_score
+
+# --------------------------------------------------------
+# Toxizitäts-Wächter für gestreamte Generierung
+#    - Die Antwort wird Token für Token gelesen; an Satzenden bzw. spätestens
+#      alle check_every Tokens wird der zuletzt erzeugte Text bewertet
+#    - Überschreitet der Score die Schwelle, wird der Stream geschlossen und
+#      die Anfrage damit abgebrochen
+#    - Eingespart werden Tokens und Zeit gegenüber der vollen Generierung;
+#      geschätzt aus max_new_tokens und der gemessenen Inter-Token-Latenz
+# --------------------------------------------------------
+SENTENCE_END = re.compile(r"[.!?…]\s*$|\n")
+
+
+def toxicity_scorer(
+    tox_pipeline: TextClassificationPipeline,
+    label: str = TOX_LABEL
+) -> Callable[[str], float]:
+    """
+    Scoring-Funktion Text -> Score eines Labels (oder "max" über alle) für guarded_stream().
+
+    Ein Label, das der Klassifikator nicht kennt, wird sofort abgelehnt (ValueError);
+    sonst läge der Score immer bei 0 und der Wächter bräche nie ab.
+    """
+    known = set(tox_pipeline.model.config.id2label.values())
+    if label != "max" and label not in known:
+        raise ValueError(f"Unbekanntes Toxizitäts-Label '{label}' (erwartet: max, {', '.join(sorted(known))})")
+    return lambda text: label_score(get_toxicity_scores([text], tox_pipeline, batch_size=1)[0], label)
+
+
+def chat_stream_text(stream: Iterable) -> Iterator[str]:
+    """
+    Liefert die Text-Deltas eines chat_completion(stream=True)-Streams und
+    schließt den zugrunde liegenden Stream, wenn der Wächter abbricht.
+    """
+    try:
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+
+
+def guarded_stream(
+    chunks: Iterable[str],
+    score_text: Callable[[str], float],
+    threshold: float = 0.8,
+    check_every: int = 32,
+    window_chars: int = 1500,
+    max_new_tokens: int = None
+) -> dict:
+    """
+    Liest einen Token-Stream und bricht ab, sobald der Text toxisch wird.
+
+    Parameter:
+      - chunks: Iterator über Text-Stücke (ein Stück ≈ ein Token), z. B.
+        llm.stream(prompt) oder chat_stream_text(client.chat_completion(..., stream=True))
+      - score_text: Funktion Text -> Toxizitäts-Score, siehe toxicity_scorer()
+      - threshold: Abbruchschwelle für den Score
+      - check_every: spätestens nach so vielen Tokens seit der letzten Prüfung bewerten
+      - window_chars: bewertet werden die letzten window_chars Zeichen
+        (hält die Prüfung unter dem Tokenlimit des Klassifikators)
+      - max_new_tokens: Tokenbudget der Anfrage, für die Schätzung der Einsparung
+
+    Rückgabe:
+      {
+        "response_text": str, "aborted": bool,
+        "max_score": float,          # höchster Score aller Prüfungen
+        "n_tokens": int,             # gelesene Stream-Tokens
+        "latency": float, "ttft": float,
+        "guard_sec": float,          # davon Zeit im Klassifikator
+        "checks": int,
+        "tokens_saved_est": int,     # max_new_tokens - n_tokens bei Abbruch
+        "time_saved_est": float      # tokens_saved_est × mittlere Inter-Token-Latenz
+      }
+    """
+    pieces: list[str] = []
+    n_tokens = 0
+    since_check = 0
+    checks = 0
+    max_score = 0.0
+    guard_sec = 0.0
+    aborted = False
+    ttft = None
+
+    start = time.perf_counter()
+    iterator = iter(chunks)
+    try:
+        for piece in iterator:
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            pieces.append(piece)
+            n_tokens += 1
+            since_check += 1
+            if since_check < check_every and not SENTENCE_END.search(piece):
+                continue
+
+            since_check = 0
+            checks += 1
+            check_start = time.perf_counter()
+            score = score_text("".join(pieces)[-window_chars:])
+            guard_sec += time.perf_counter() - check_start
+            max_score = max(max_score, score)
+            if score >= threshold:
+                aborted = True
+                break
+    finally:
+        # Schließt den Stream (und damit die HTTP-Verbindung) auch beim Abbruch
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+    latency = time.perf_counter() - start
+
+    tokens_saved = max(0, max_new_tokens - n_tokens) if aborted and max_new_tokens else 0
+    # Inter-Token-Latenz ohne die Zeit im Klassifikator
+    itl = (latency - (ttft or 0.0) - guard_sec) / (n_tokens - 1) if n_tokens > 1 else 0.0
+    return {
+        "response_text": "".join(pieces),
+        "aborted": aborted,
+        "max_score": max_score,
+        "n_tokens": n_tokens,
+        "latency": latency,
+        "ttft": ttft if ttft is not None else latency,
+        "guard_sec": guard_sec,
+        "checks": checks,
+        "tokens_saved_est": tokens_saved,
+        "time_saved_est": tokens_saved * max(itl, 0.0)
+    }
+
+
+def format_guard_summary(rows: list[dict]) -> str:
+    """Summen über alle bewachten Anfragen für die Konsolenausgabe."""
+    aborted = sum(1 for row in rows if row["guard_aborted"])
+    tokens = sum(row["tokens_saved_est"] for row in rows)
+    seconds = sum(row["time_saved_est"] for row in rows)
+    return (
+        f"Toxizitäts-Wächter: {aborted}/{len(rows)} Antworten abgebrochen, "
+        f"ca. {tokens} Tokens und {seconds:.1f} s eingespart"
+    )
@@ -0,0 +1,122 @@
+import os
+import time
+import argparse
+import multiprocessing
+
+from transformers import TextClassificationPipeline
+
+from toxicity import (
+    PARITY_REFERENCE_TEXTS,
+    TOX_BACKENDS,
+    get_toxicity_scores,
+    length_buckets,
+    load_toxicity_pipeline
+)
+
+# --------------------------------------------------------
+# Toxizitäts-Scoring über mehrere Prozesse
+#    - Das Modell wird einmal im Elternprozess geladen; die Worker entstehen per
+#      fork() und teilen sich die Gewichte copy-on-write (kein erneutes Laden)
+#    - Jeder Worker bekommt cpu_count / n_workers Torch-Threads, damit sich die
+#      Prozesse nicht gegenseitig die Kerne streitig machen
+#    - Batches werden nach Tokenlänge gebildet und auf die Worker verteilt;
+#      die Ergebnisse kommen in Eingabereihenfolge zurück
+#
+#    Wichtig: Den Scorer direkt nach dem Laden der Pipeline erzeugen, also bevor
+#    der Elternprozess selbst Inferenz ausführt (OpenMP-Threadpools vertragen
+#    kein fork() nach ihrer ersten Nutzung). Nur auf Plattformen mit fork (Linux).
+# --------------------------------------------------------
+_worker_pipeline: TextClassificationPipeline = None
+
+
+def _init_worker(n_threads: int):
+    import torch
+    torch.set_num_threads(n_threads)
+
+
+def _score_chunk(chunk: list[str]) -> list[dict[str, float]]:
+    return get_toxicity_scores(chunk, _worker_pipeline, batch_size=len(chunk))
+
+
+class ParallelToxicityScorer:
+    """
+    Verteilt das Toxizitäts-Scoring auf mehrere per fork() erzeugte Prozesse.
+
+    Parameter:
+      - tox_pipeline: Pipeline aus load_toxicity_pipeline()
+      - n_workers: Anzahl Worker-Prozesse (Standard: alle CPU-Kerne)
+      - batch_size: Anzahl Texte pro Batch bzw. pro Arbeitspaket
+    """
+
+    def __init__(self, tox_pipeline: TextClassificationPipeline, n_workers: int = None, batch_size: int = 16):
+        global _worker_pipeline
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("ParallelToxicityScorer benötigt die Startmethode 'fork' (Linux)")
+
+        self.tox_pipeline = tox_pipeline
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        threads_per_worker = max(1, (os.cpu_count() or 1) // self.n_workers)
+
+        # Die Rust-Tokenizer dürfen nach fork() nicht mit eigenen Threads weiterlaufen
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+        _worker_pipeline = tox_pipeline
+        self._pool = multiprocessing.get_context("fork").Pool(
+            processes=self.n_workers,
+            initializer=_init_worker,
+            initargs=(threads_per_worker,)
+        )
+
+    def score(self, texts: list[str]) -> list[dict[str, float]]:
+        """
+        Berechnet die Scores aller Labels, verteilt auf die Worker.
+
+        Rückgabe: ein Dict {label: score} pro Eingabetext, in Eingabereihenfolge
+        """
+        if not texts:
+            return []
+        encoded = self.tox_pipeline.tokenizer(list(texts), add_special_tokens=True, truncation=True)
+        buckets = length_buckets([len(ids) for ids in encoded["input_ids"]], self.batch_size)
+
+        scores: list[dict[str, float]] = [{} for _ in texts]
+        chunks = [[texts[i] for i in bucket] for bucket in buckets]
+        for bucket, chunk_scores in zip(buckets, self._pool.imap(_score_chunk, chunks)):
+            for i, entry in zip(bucket, chunk_scores):
+                scores[i] = entry
+        return scores
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    # Skalierung von 1 bis N Prozessen messen, z. B.:
+    #   python toxicity_parallel.py --max-workers 8 --repeat 100
+    parser = argparse.ArgumentParser(description="Skalierung des parallelen Toxizitäts-Scorings messen")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--repeat", type=int, default=50, help="Wiederholungen des Referenzsatzes")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--backend", choices=TOX_BACKENDS, default="pytorch")
+    args = parser.parse_args()
+
+    texts = PARITY_REFERENCE_TEXTS * args.repeat
+    tox_pipeline = load_toxicity_pipeline(backend=args.backend)
+
+    # Worker-Anzahlen 1, 2, 4, … bis max_workers
+    worker_counts = sorted({min(2 ** i, args.max_workers) for i in range(args.max_workers.bit_length() + 1)})
+    baseline = None
+    for n_workers in worker_counts:
+        with ParallelToxicityScorer(tox_pipeline, n_workers=n_workers, batch_size=args.batch_size) as scorer:
+            start = time.perf_counter()
+            scorer.score(texts)
+            elapsed = time.perf_counter() - start
+        throughput = len(texts) / elapsed
+        baseline = baseline or throughput
+        print(f"{n_workers:3d} Prozesse: {throughput:8.1f} Texte/s  (Speedup {throughput / baseline:.2f}x)")
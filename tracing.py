@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import threading
+import functools
+from contextlib import contextmanager, nullcontext
+
+# --------------------------------------------------------
+# Leichtgewichtiges Span-Tracing
+#    - span("name") misst einen Abschnitt (Tokenizer laden, Prompt formatieren,
+#      Netzwerk, Antwort parsen, Klassifikator, Auswertung mit pandas …)
+#    - Standardmäßig aus: span() liefert dann einen gemeinsamen No-op-Kontext,
+#      @traced ruft die Funktion direkt auf – praktisch ohne Mehrkosten
+#    - Export als Chrome-Trace (chrome://tracing, https://ui.perfetto.dev) und
+#      als JSON-Zusammenfassung der Zeit pro Phase
+# --------------------------------------------------------
+_enabled = False
+_events: list[tuple] = []
+_NOOP = nullcontext()
+
+
+def enable():
+    """Schaltet das Tracing ein und verwirft bisher gesammelte Spans."""
+    global _enabled
+    _events.clear()
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+@contextmanager
+def _record(name: str, args: dict):
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        # list.append ist unter dem GIL atomar; kein Lock nötig
+        _events.append((name, start, time.perf_counter_ns() - start, threading.get_ident(), args))
+
+
+def span(name: str, **args):
+    """
+    Kontextmanager für einen Abschnitt, z. B.:
+
+        with span("network", model=MODEL_ID):
+            response = llm.invoke(prompt)
+
+    Zusätzliche Schlüsselwortargumente erscheinen im Chrome-Trace unter "args".
+    """
+    if not _enabled:
+        return _NOOP
+    return _record(name, args)
+
+
+def traced(name: str):
+    """Dekorator: misst jeden Aufruf der Funktion als Span mit dem angegebenen Namen."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _record(name, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def summary() -> dict:
+    """
+    Zeit pro Phase über alle Spans.
+
+    Rückgabe:
+      {
+        "wall_time_sec": float,   # erster Span-Start bis letztes Span-Ende
+        "phases": {name: {"count", "total_sec", "mean_sec", "max_sec", "share"}}
+      }
+      "share" ist total_sec / wall_time_sec; verschachtelte oder parallele Spans
+      können zusammen mehr als 1 ergeben.
+    """
+    if not _events:
+        return {"wall_time_sec": 0.0, "phases": {}}
+    first = min(start for _, start, _, _, _ in _events)
+    last = max(start + duration for _, start, duration, _, _ in _events)
+    wall = (last - first) / 1e9
+
+    phases: dict[str, dict] = {}
+    for name, _, duration, _, _ in _events:
+        phase = phases.setdefault(name, {"count": 0, "total_sec": 0.0, "max_sec": 0.0})
+        phase["count"] += 1
+        phase["total_sec"] += duration / 1e9
+        phase["max_sec"] = max(phase["max_sec"], duration / 1e9)
+    for phase in phases.values():
+        phase["mean_sec"] = phase["total_sec"] / phase["count"]
+        phase["share"] = phase["total_sec"] / wall if wall else 0.0
+    return {
+        "wall_time_sec": wall,
+        "phases": dict(sorted(phases.items(), key=lambda item: -item[1]["total_sec"]))
+    }
+
+
+def export_chrome_trace(path: str):
+    """Schreibt alle Spans im Chrome-Trace-Format (vollständige Ereignisse, ph="X")."""
+    pid = os.getpid()
+    events = [
+        {
+            "name": name,
+            "ph": "X",
+            "ts": start / 1e3,
+            "dur": duration / 1e3,
+            "pid": pid,
+            "tid": tid,
+            "args": {key: str(value) for key, value in args.items()}
+        }
+        for name, start, duration, tid, args in _events
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def export(path: str):
+    """
+    Schreibt den Chrome-Trace nach path und die Zusammenfassung daneben
+    (z. B. run.json → run.summary.json).
+    """
+    export_chrome_trace(path)
+    root, _ = os.path.splitext(path)
+    with open(root + ".summary.json", "w", encoding="utf-8") as f:
+        json.dump(summary(), f, indent=2)
+
+
+def format_summary() -> str:
+    """Tabellarische Zusammenfassung für die Konsole."""
+    result = summary()
+    lines = [f"Tracing: {result['wall_time_sec']:.2f} s Gesamtzeit"]
+    for name, phase in result["phases"].items():
+        lines.append(
+            f"  {name:<18} {phase['total_sec']:8.3f} s  {phase['share']:6.1%}  "
+            f"({phase['count']}x, max {phase['max_sec']:.3f} s)"
+        )
+    return "\n".join(lines)
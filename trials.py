@@ -0,0 +1,75 @@
+from typing import Callable
+
+from latency_stats import bootstrap_ci, mean, summarize
+
+# --------------------------------------------------------
+# Wiederholte Messungen mit Warm-up und adaptiver Stichprobengröße
+#    - Warm-up-Aufrufe (Verbindungsaufbau, Kaltstart des Endpunkts) werden verworfen
+#    - Danach wird wiederholt, bis das Bootstrap-Konfidenzintervall des
+#      Latenz-Mittelwerts schmal genug ist oder max_trials erreicht sind
+#    - So fließt das API-Budget in die Rasterzellen mit hoher Streuung
+# --------------------------------------------------------
+def relative_ci_width(values: list[float], **ci_kwargs) -> float:
+    """Breite des Bootstrap-KI des Mittelwerts relativ zum Mittelwert."""
+    ci_low, ci_high = bootstrap_ci(values, **ci_kwargs)
+    center = mean(values)
+    return (ci_high - ci_low) / center if center else float("inf")
+
+
+def run_trials(
+    measure: Callable[[], dict],
+    warmup: int = 1,
+    min_trials: int = 3,
+    max_trials: int = 30,
+    target_rel_ci_width: float = 0.1,
+    confidence: float = 0.95
+) -> dict:
+    """
+    Führt eine Messung wiederholt aus, bis die Latenz stabil geschätzt ist.
+
+    Parameter:
+      - measure: Funktion ohne Argumente, die ein Dict wie measure_llm() liefert
+        (mindestens "latency" und "output_tokens")
+      - warmup: Anzahl verworfener Aufrufe vor der eigentlichen Messung
+      - min_trials: Mindestanzahl gewerteter Messungen
+      - max_trials: Höchstanzahl gewerteter Messungen
+      - target_rel_ci_width: Ziel für (KI-Breite / Mittelwert) der Latenz, z. B. 0.1 = ±5 %
+      - confidence: Konfidenzniveau der Bootstrap-Intervalle
+
+    Rückgabe:
+      {
+        "n_trials": int, "converged": bool, "last_response_text": str,
+        "latency_mean", "latency_p50", "latency_p95", "latency_p99",
+        "latency_ci_low", "latency_ci_high",
+        "output_tokens_mean", ..., "output_tokens_ci_high": float,
+        "latency_samples", "output_tokens_samples": list   # gewertete Einzelmessungen
+      }
+    """
+    if not 1 <= min_trials <= max_trials:
+        raise ValueError("Es muss 1 <= min_trials <= max_trials gelten")
+
+    for _ in range(warmup):
+        measure()
+
+    latencies: list[float] = []
+    output_tokens: list[float] = []
+    converged = False
+    measurement = None
+    while len(latencies) < max_trials:
+        measurement = measure()
+        latencies.append(measurement["latency"])
+        output_tokens.append(measurement["output_tokens"])
+        if len(latencies) >= min_trials and \
+                relative_ci_width(latencies, confidence=confidence) <= target_rel_ci_width:
+            converged = True
+            break
+
+    return {
+        "n_trials": len(latencies),
+        "converged": converged,
+        "last_response_text": measurement["response_text"],
+        **summarize(latencies, "latency", confidence=confidence),
+        **summarize(output_tokens, "output_tokens", confidence=confidence),
+        "latency_samples": latencies,
+        "output_tokens_samples": output_tokens
+    }
@@ -0,0 +1,492 @@
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+import subprocess
+from dataclasses import asdict
+from concurrent.futures import ThreadPoolExecutor
+
+from matrix import MatrixCell, run_cell
+from ratelimit import RateLimitedScheduler, install_response_hooks
+from response_cache import DEFAULT_CACHE_PATH, ResponseCache
+
+# --------------------------------------------------------
+# Verteilte Matrix: Koordinator und Worker über eine gemeinsame Warteschlange
+#    - Die Warteschlange ist eine SQLite-Datei (WAL-Modus), kein externer Dienst;
+#      der Koordinator trägt die Zellen der Matrix ein (idempotent, fertige
+#      Zellen bleiben erhalten) und führt am Ende die Ergebnisse zusammen
+#    - Worker (Prozesse, beliebig viele) leasen Zellen in kleinen Batches,
+#      führen sie aus (matrix.run_cell), bewerten optional die Toxizität des
+#      ganzen Batches und schreiben die Zeilen zurück
+#    - Ein Lease läuft nach lease_sec ab, solange der Worker es nicht per
+#      Heartbeat verlängert; Zellen abgestürzter Worker gehen so zurück in die
+#      Warteschlange. Nach max_attempts Versuchen gilt eine Zelle als fehlgeschlagen
+#    - Pro Zelle nur wenige kurze Transaktionen; die Laufzeit wird von den
+#      LLM-Aufrufen bestimmt, daher skaliert der Durchsatz nahezu linear mit
+#      der Zahl der Worker (bis zum Rate-Limit der Endpunkte)
+#    - Mehrere Rechner: die Datei muss auf einem Dateisystem mit funktionierenden
+#      Sperren liegen (lokale Platte oder z. B. SMB/CIFS; NFS-Sperren sind oft unzuverlässig)
+# --------------------------------------------------------
+DEFAULT_QUEUE_PATH = os.path.join(".cache", "work_queue.sqlite")
+DEFAULT_LEASE_SEC = 120.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+STATUSES = ("pending", "leased", "done", "failed")
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    Warteschlange für Matrix-Zellen mit Leases.
+
+    Parameter:
+      - path: Pfad zur SQLite-Datei (Verzeichnis wird bei Bedarf angelegt)
+      - max_attempts: Versuche pro Zelle, danach Status "failed"
+
+    Eine Instanz darf von mehreren Threads eines Prozesses genutzt werden;
+    jeder Prozess öffnet seine eigene Instanz.
+    """
+
+    def __init__(self, path: str = DEFAULT_QUEUE_PATH, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        # isolation_level=None: Transaktionen werden explizit mit BEGIN IMMEDIATE
+        # geöffnet, damit zwei Worker nie dieselbe Zelle leasen
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cells (
+                key TEXT PRIMARY KEY,
+                cell TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                result TEXT,
+                finished_at REAL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS cells_status ON cells (status, lease_until)")
+
+    def _transaction(self, statements):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self.conn)
+                self.conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, cells: list[MatrixCell]) -> int:
+        """Trägt Zellen ein; bereits vorhandene (auch fertige) bleiben unverändert. Rückgabe: neue Zellen."""
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO cells (key, cell) VALUES (?, ?)",
+                [(cell.key, json.dumps(asdict(cell), ensure_ascii=False)) for cell in cells]
+            )
+            return conn.total_changes - before
+        return self._transaction(insert)
+
+    def _expire(self, conn, now: float):
+        # Abgelaufene Leases: zurück in die Warteschlange bzw. aufgeben
+        conn.execute(
+            """
+            UPDATE cells
+            SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                error = CASE WHEN attempts >= ? THEN 'Lease abgelaufen' ELSE error END,
+                worker = NULL, lease_until = NULL
+            WHERE status = 'leased' AND lease_until < ?
+            """,
+            (self.max_attempts, self.max_attempts, now)
+        )
+
+    def lease(self, worker_id: str, n: int = 1, lease_sec: float = DEFAULT_LEASE_SEC) -> list[MatrixCell]:
+        """Least bis zu n offene Zellen in Eintragsreihenfolge (vorher werden abgelaufene Leases freigegeben)."""
+        def take(conn):
+            now = time.time()
+            self._expire(conn, now)
+            rows = conn.execute(
+                "SELECT key, cell FROM cells WHERE status = 'pending' ORDER BY rowid LIMIT ?", (n,)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE cells SET status = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1 "
+                "WHERE key = ?",
+                [(worker_id, now + lease_sec, key) for key, _ in rows]
+            )
+            return [MatrixCell(**json.loads(cell)) for _, cell in rows]
+        return self._transaction(take)
+
+    def heartbeat(self, worker_id: str, keys: list[str], lease_sec: float = DEFAULT_LEASE_SEC):
+        """Verlängert die Leases dieses Workers für die angegebenen Zellen."""
+        def extend(conn):
+            conn.executemany(
+                "UPDATE cells SET lease_until = ? WHERE key = ? AND worker = ? AND status = 'leased'",
+                [(time.time() + lease_sec, key, worker_id) for key in keys]
+            )
+        self._transaction(extend)
+
+    def complete(self, worker_id: str, rows: list[dict]) -> int:
+        """
+        Speichert fertige Zeilen (Schlüssel "key"). Auch nach abgelaufenem Lease
+        wird das erste Ergebnis übernommen; spätere Duplikate werden verworfen.
+
+        Rückgabe: Anzahl übernommener Zeilen
+        """
+        def store(conn):
+            before = conn.total_changes
+            conn.executemany(
+                "UPDATE cells SET status = 'done', worker = ?, lease_until = NULL, error = NULL, "
+                "result = ?, finished_at = ? WHERE key = ? AND status != 'done'",
+                [(worker_id, json.dumps(row, ensure_ascii=False), time.time(), row["key"]) for row in rows]
+            )
+            return conn.total_changes - before
+        return self._transaction(store)
+
+    def fail(self, worker_id: str, key: str, error: str):
+        """Gibt eine Zelle nach einem Fehler zurück bzw. markiert sie nach max_attempts als fehlgeschlagen."""
+        def release(conn):
+            conn.execute(
+                """
+                UPDATE cells
+                SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                    error = ?, worker = NULL, lease_until = NULL
+                WHERE key = ? AND worker = ? AND status = 'leased'
+                """,
+                (self.max_attempts, error, key, worker_id)
+            )
+        self._transaction(release)
+
+    def retry_failed(self) -> int:
+        """Setzt fehlgeschlagene Zellen mit neuem Versuchszähler zurück in die Warteschlange."""
+        def reset(conn):
+            before = conn.total_changes
+            conn.execute("UPDATE cells SET status = 'pending', attempts = 0, error = NULL WHERE status = 'failed'")
+            return conn.total_changes - before
+        return self._transaction(reset)
+
+    def counts(self) -> dict[str, int]:
+        """Zellen pro Status (abgelaufene Leases werden dabei freigegeben)."""
+        def count(conn):
+            self._expire(conn, time.time())
+            found = dict(conn.execute("SELECT status, COUNT(*) FROM cells GROUP BY status").fetchall())
+            return {status: found.get(status, 0) for status in STATUSES}
+        return self._transaction(count)
+
+    def done_per_worker(self) -> dict[str, int]:
+        with self.lock:
+            return dict(self.conn.execute(
+                "SELECT worker, COUNT(*) FROM cells WHERE status = 'done' GROUP BY worker ORDER BY worker"
+            ).fetchall())
+
+    def results(self, keys: list[str] = None) -> list[dict]:
+        """Fertige Zeilen in Eintragsreihenfolge (optional nur für diese Zellschlüssel)."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT key, result FROM cells WHERE status = 'done' ORDER BY rowid"
+            ).fetchall()
+        wanted = set(keys) if keys is not None else None
+        return [json.loads(result) for key, result in rows if wanted is None or key in wanted]
+
+    def failures(self) -> list[tuple[str, str]]:
+        with self.lock:
+            return self.conn.execute(
+                "SELECT cell, error FROM cells WHERE status = 'failed' ORDER BY rowid"
+            ).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+def run_worker(
+    work_queue: WorkQueue,
+    make_client,
+    scheduler: RateLimitedScheduler,
+    worker_id: str = None,
+    batch_size: int = 4,
+    threads: int = 4,
+    lease_sec: float = DEFAULT_LEASE_SEC,
+    score_texts=None,
+    cache_path: str = None,
+    replay: bool = False,
+    poll_sec: float = 2.0
+) -> int:
+    """
+    Arbeitet die Warteschlange ab, bis keine Zelle mehr offen oder geleast ist.
+
+    Parameter:
+      - work_queue: WorkQueue dieses Prozesses
+      - make_client: Funktion Aufrufziel (cell.target) -> InferenceClient (ein Client pro Ziel)
+      - scheduler: RateLimitedScheduler dieses Workers
+      - worker_id: Kennung im Lease (Standard: Rechnername:PID)
+      - batch_size: Zellen pro Lease
+      - threads: gleichzeitige Anfragen innerhalb eines Batches
+      - lease_sec: Lease-Dauer; der Heartbeat verlängert alle lease_sec / 3 Sekunden
+      - score_texts: Funktion Texte -> [{Label: Score}] für die Toxizität (optional)
+      - cache_path: ResponseCache-Datei (optional; eine Verbindung pro Thread)
+      - replay: True = Antworten nur aus dem Cache lesen
+      - poll_sec: Wartezeit, solange nur fremde Leases offen sind
+
+    Rückgabe: Anzahl fertiger Zellen dieses Workers
+    """
+    worker_id = worker_id or default_worker_id()
+    clients = {}
+    in_flight: set[str] = set()
+    in_flight_lock = threading.Lock()
+    stop = threading.Event()
+    local = threading.local()
+
+    def client_for(target: str):
+        with in_flight_lock:
+            if target not in clients:
+                clients[target] = make_client(target)
+            return clients[target]
+
+    def cache_for_thread():
+        if cache_path is None:
+            return None
+        if not hasattr(local, "cache"):
+            local.cache = ResponseCache(cache_path)
+        return local.cache
+
+    def heartbeat():
+        while not stop.wait(lease_sec / 3):
+            with in_flight_lock:
+                keys = list(in_flight)
+            if keys:
+                work_queue.heartbeat(worker_id, keys, lease_sec)
+
+    beat = threading.Thread(target=heartbeat, daemon=True)
+    beat.start()
+
+    def execute(cell: MatrixCell):
+        try:
+            return cell, run_cell(cell, client_for(cell.target), scheduler, cache_for_thread(), replay), None
+        except Exception as exc:
+            return cell, None, exc
+
+    finished = 0
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            while True:
+                cells = work_queue.lease(worker_id, batch_size, lease_sec)
+                if not cells:
+                    counts = work_queue.counts()
+                    if counts["pending"] == 0 and counts["leased"] == 0:
+                        return finished
+                    # Nur fremde Leases offen: warten, ob sie fertig werden oder ablaufen
+                    time.sleep(poll_sec)
+                    continue
+
+                with in_flight_lock:
+                    in_flight.update(cell.key for cell in cells)
+                rows = []
+                for cell, row, exc in pool.map(execute, cells):
+                    if exc is not None:
+                        print(f"  [{worker_id}] Fehler bei {cell.model_id}: {exc}")
+                        work_queue.fail(worker_id, cell.key, repr(exc))
+                        with in_flight_lock:
+                            in_flight.discard(cell.key)
+                        continue
+                    rows.append(row)
+
+                if rows and score_texts is not None:
+                    # Toxizität des ganzen Batches in einem Aufruf; toxicity_score wie in matrix.py
+                    from toxicity import label_score
+                    for row, scores in zip(rows, score_texts([row["response_text"] for row in rows])):
+                        row["toxicity_scores"] = scores
+                        row["toxicity_score"] = round(label_score(scores), 3)
+                finished += work_queue.complete(worker_id, rows)
+                with in_flight_lock:
+                    in_flight.difference_update(row["key"] for row in rows)
+                print(f"  [{worker_id}] {finished} Zellen fertig")
+    finally:
+        stop.set()
+
+
+def spawn_workers(n: int, argv: list[str]) -> list[subprocess.Popen]:
+    """Startet n lokale Worker-Prozesse ("python work_queue.py worker <argv>")."""
+    script = os.path.abspath(__file__)
+    return [subprocess.Popen([sys.executable, script, "worker", *argv]) for _ in range(n)]
+
+
+def format_status(work_queue: WorkQueue) -> str:
+    counts = work_queue.counts()
+    lines = ["Warteschlange: " + ", ".join(f"{status} {n}" for status, n in counts.items())]
+    for worker, n in work_queue.done_per_worker().items():
+        lines.append(f"  {worker:<32} {n:>6} Zellen")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # Beispiele:
+    #   python work_queue.py coordinate --models microsoft/phi-4:chat --prompts redteam.jsonl --spawn 8
+    #   python work_queue.py worker --queue /mnt/shared/queue.sqlite --toxicity   # auf weiteren Rechnern
+    #   python work_queue.py status
+    #   python work_queue.py merge --store results/matrix
+    from matrix import DEFAULT_MODELS, DEFAULT_PROMPTS, account_rows, build_cells, load_toxicity_scorer
+    from prompt_dataset import add_dataset_arguments, prompts_from_args
+    from token_accounting import TokenAccountant, load_prices
+
+    parser = argparse.ArgumentParser(description="Verteilte Matrix: Koordinator und Worker")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    coordinate = subparsers.add_parser("coordinate", help="Zellen eintragen, auf Worker warten, Ergebnisse zusammenführen")
+    coordinate.add_argument("--models", nargs="+", default=DEFAULT_MODELS, help="Modell-IDs, optional mit :text / :chat")
+    coordinate.add_argument("--temperatures", default="0.7", help="kommagetrennt, z. B. 0.3,0.7")
+    coordinate.add_argument("--max-new-tokens", default="100", help="kommagetrennt, z. B. 50,100")
+    coordinate.add_argument("--spawn", type=int, default=0, help="so viele lokale Worker-Prozesse starten")
+    coordinate.add_argument("--no-wait", action="store_true", help="nur eintragen, nicht warten und zusammenführen")
+    coordinate.add_argument(
+        "--endpoint", default=None,
+        help="alle Zellen an diesen Endpunkt senden (z. B. Mock); das Ziel ist Teil des Zellschlüssels"
+    )
+    add_dataset_arguments(coordinate)
+
+    worker = subparsers.add_parser("worker", help="Zellen leasen und ausführen")
+    worker.add_argument("--batch", type=int, default=4, help="Zellen pro Lease")
+    worker.add_argument("--threads", type=int, default=4, help="gleichzeitige Anfragen pro Worker")
+    worker.add_argument(
+        "--rate", type=float, default=None,
+        help="Startrate pro Modell und Worker (Anfragen/s); ohne Angabe ungedrosselt bis zum ersten 429"
+    )
+    worker.add_argument("--replay", action="store_true", help="Antworten nur aus dem Antwort-Cache lesen")
+    worker.add_argument("--toxicity", action="store_true", help="Antworten im Worker auf Toxizität bewerten")
+
+    subparsers.add_parser("status", help="Zellen pro Status und fertige Zellen pro Worker")
+    subparsers.add_parser("retry", help="fehlgeschlagene Zellen erneut einreihen")
+
+    merge = subparsers.add_parser("merge", help="fertige Zeilen zusammenführen")
+    for sub in (coordinate, merge):
+        sub.add_argument("--output", default="matrix_results.csv", help="CSV-Datei für die Ergebnisse")
+        sub.add_argument("--store", default=None, help="Ergebnisse stattdessen als Parquet-Dataset in dieses Verzeichnis")
+    for sub in subparsers.choices.values():
+        sub.add_argument("--queue", default=DEFAULT_QUEUE_PATH, help="SQLite-Datei der Warteschlange")
+    for sub in (coordinate, worker):
+        sub.add_argument("--lease-sec", type=float, default=DEFAULT_LEASE_SEC, help="Lease-Dauer in Sekunden")
+    args, worker_argv = parser.parse_known_args()
+    if args.command != "coordinate" and worker_argv:
+        parser.error(f"unbekannte Optionen: {' '.join(worker_argv)}")
+
+    work_queue = WorkQueue(args.queue)
+
+    def merge_results(keys: list[str] = None):
+        """Tokens und Kosten ergänzen, Ergebnisse als CSV oder Parquet-Dataset schreiben."""
+        rows = work_queue.results(keys)
+        accountant = TokenAccountant(load_prices())
+        if args.store:
+            from result_store import ResultStore
+            with ResultStore(args.store) as store:
+                for start in range(0, len(rows), store.row_group_size):
+                    chunk = rows[start:start + store.row_group_size]
+                    account_rows(chunk, accountant)
+                    store.extend(chunk)
+            output = f"{args.store} (Lauf {store.run_id})"
+        else:
+            import pandas as pd
+            account_rows(rows, accountant)
+            df = pd.DataFrame(rows).drop(columns=["key", "usage", "toxicity_scores"], errors="ignore")
+            df.to_csv(args.output, index=False)
+            if not df.empty:
+                summary_columns = [
+                    c for c in ("latency_sec", "output_tokens", "cost_usd", "toxicity_score")
+                    if c in df.columns and df[c].notna().any()
+                ]
+                print("\n=== Matrix: Mittelwerte pro Modell ===")
+                print(df.groupby("model")[summary_columns].mean().round(3).to_string())
+            output = args.output
+        print(accountant.summary())
+        print(f"{len(rows)} Zeilen → {output}")
+        for cell, error in work_queue.failures():
+            print(f"  fehlgeschlagen: {json.loads(cell)['model_id']}: {error}")
+
+    if args.command == "status":
+        print(format_status(work_queue))
+
+    elif args.command == "retry":
+        print(f"{work_queue.retry_failed()} Zellen erneut eingereiht")
+
+    elif args.command == "merge":
+        merge_results()
+
+    elif args.command == "coordinate":
+        prompts = list(prompts_from_args(args, DEFAULT_PROMPTS))
+        parameter_list = [
+            {"temperature": float(t), "max_new_tokens": int(m)}
+            for t in args.temperatures.split(",")
+            for m in args.max_new_tokens.split(",")
+        ]
+        cells = build_cells(args.models, prompts, parameter_list, endpoint=args.endpoint)
+        added = work_queue.enqueue(cells)
+        print(f"Warteschlange {args.queue}: {len(cells)} Zellen, {added} neu eingetragen")
+        # Unbekannte Optionen (z. B. --toxicity, --threads) gehen an die gestarteten Worker
+        processes = spawn_workers(args.spawn, ["--queue", args.queue, "--lease-sec", str(args.lease_sec), *worker_argv])
+        if not args.no_wait:
+            start = time.perf_counter()
+            while True:
+                counts = work_queue.counts()
+                if counts["pending"] == 0 and counts["leased"] == 0:
+                    break
+                print(f"  {counts['done']} fertig, {counts['leased']} in Arbeit, {counts['pending']} offen, "
+                      f"{counts['failed']} fehlgeschlagen")
+                time.sleep(5)
+            for process in processes:
+                process.wait()
+            elapsed = time.perf_counter() - start
+            print("\n" + format_status(work_queue))
+            print(f"Laufzeit {elapsed:.1f} s")
+            merge_results([cell.key for cell in cells])
+
+    elif args.command == "worker":
+        from dotenv import load_dotenv
+        from huggingface_hub import InferenceClient
+
+        load_dotenv()
+        hf_token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
+
+        def make_client(target: str):
+            # Das Ziel steht in der Zelle (Modell-ID oder --endpoint des Koordinators);
+            # nur echte Modelle brauchen den Token
+            if not hf_token and not args.replay and not target.startswith(("http://", "https://")):
+                raise ValueError(
+                    "♨️ Kein Token gefunden. Lege eine `.env`-Datei an mit:\n"
+                    "   HUGGINGFACEHUB_API_TOKEN=hf_<dein_token>"
+                )
+            return InferenceClient(model=target, token=hf_token)
+        score_texts = None
+        tox_cache = None
+        if args.toxicity:
+            score_texts, tox_cache = load_toxicity_scorer()
+        # RateLimit-Header der huggingface_hub-Antworten mitlesen (einmalig); ohne Hook nur AIMD
+        install_response_hooks()
+        n = run_worker(
+            work_queue,
+            make_client=make_client,
+            scheduler=RateLimitedScheduler(rate=args.rate),
+            batch_size=args.batch,
+            threads=args.threads,
+            lease_sec=args.lease_sec,
+            score_texts=score_texts,
+            cache_path=DEFAULT_CACHE_PATH,
+            replay=args.replay
+        )
+        print(f"Worker {default_worker_id()}: {n} Zellen fertig")
+        if tox_cache:
+            print(tox_cache.summary())